@@ -0,0 +1,180 @@
+"""
+Explicit context (prefix) caching for Gemini requests.
+Long static prefixes - detector agent instructions with their tool
+declarations, or a contract body shared by every criteria group - are stored
+once as a CachedContent and then referenced by name, so repeated calls stop
+paying input tokens and time-to-first-token for them.
+Modes (LLM_CONTEXT_CACHE):
+- provider: create caches through the Gemini caches API (default)
+- local: keep the prefix in-process and inline it again at send time; a
+  stand-in for offline tests and for API proxies without the caches endpoint
+- off: disabled
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List
+from google.genai import types
+from app.agents.rate_limiter import estimate_tokens
+logger = logging.getLogger(__name__)
+MODE = os.getenv("LLM_CONTEXT_CACHE", "provider").lower()
+CACHE_TTL = int(os.getenv("LLM_CONTEXT_CACHE_TTL", "3600"))
+# Gemini refuses caches below a model-specific minimum prompt size.
+MIN_TOKENS = int(os.getenv("LLM_CONTEXT_CACHE_MIN_TOKENS", "1024"))
+# A prefix must repeat before it is worth a cache; guards against caching one-off prompts.
+MIN_USES = int(os.getenv("LLM_CONTEXT_CACHE_MIN_USES", "2"))
+LOCAL_PREFIX = "local/cachedContents/"
+@dataclass
+class CacheEntry:
+    name: str
+    model: str
+    expires_at: float
+    contents: List[types.Content] = field(default_factory=list)
+    hits: int = 0
+def _texts(system_instruction, contents) -> List[str]:
+    texts = []
+    if isinstance(system_instruction, str):
+        texts.append(system_instruction)
+    elif system_instruction is not None:
+        texts.extend(p.text or "" for p in getattr(system_instruction, "parts", None) or [])
+    for content in contents or []:
+        texts.extend(p.text or "" for p in content.parts or [])
+    return texts
+def _dump(value: Any) -> Any:
+    if value is None:
+        return None
+    if isinstance(value, list):
+        return [_dump(v) for v in value]
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    return value
+class ContextCacheRegistry:
+    """Per-process registry of cached prefixes, keyed by model and prefix hash"""
+    def __init__(self, mode: str = MODE):
+        self.mode = mode
+        self._entries: Dict[str, CacheEntry] = {}
+        self._seen: Dict[str, int] = {}
+        self._failed_until: Dict[str, float] = {}
+        self._pending: Dict[tuple, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.failures = 0
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ("provider", "local")
+    def _key(self, model: str, **parts) -> str:
+        blob = json.dumps({"model": model, **{k: _dump(v) for k, v in parts.items()}}, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+    async def get_or_create(
+        self,
+        client,
+        model: str,
+        *,
+        system_instruction=None,
+        contents: Optional[List[types.Content]] = None,
+        tools=None,
+        tool_config=None,
+        ttl: int = CACHE_TTL,
+        min_uses: int = MIN_USES,
+    ) -> Optional[str]:
+        """Return the cache name for this prefix, creating it once per process when worthwhile"""
+        if not self.enabled:
+            return None
+        if estimate_tokens(*_texts(system_instruction, contents), output_tokens=0) < MIN_TOKENS:
+            return None
+        key = self._key(model, system_instruction=system_instruction, contents=contents, tools=tools, tool_config=tool_config)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry.expires_at - 60 > now:
+                entry.hits += 1
+                return entry.name
+            if self._failed_until.get(key, 0) > now:
+                return None
+            self._seen[key] = self._seen.get(key, 0) + 1
+            if self._seen[key] < min_uses:
+                return None
+        loop = asyncio.get_running_loop()
+        pending_key = (id(loop), key)
+        pending = self._pending.get(pending_key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        pending = self._pending[pending_key] = loop.create_future()
+        name = None
+        try:
+            name = await self._create(client, model, key, system_instruction, contents, tools, tool_config, ttl)
+        except Exception as ex:
+            self.failures += 1
+            self._failed_until[key] = now + ttl
+            logger.info("Context cache for %s not created: %r", model, ex)
+        finally:
+            pending.set_result(name)
+            self._pending.pop(pending_key, None)
+        return name
+    async def _create(self, client, model, key, system_instruction, contents, tools, tool_config, ttl) -> str:
+        if self.mode == "local":
+            name = f"{LOCAL_PREFIX}{key[:24]}"
+        else:
+            cached = await client.aio.caches.create(
+                model=model,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=system_instruction,
+                    contents=contents or None,
+                    tools=tools or None,
+                    tool_config=tool_config,
+                    ttl=f"{ttl}s",
+                ),
+            )
+            name = cached.name
+        with self._lock:
+            self._entries[key] = CacheEntry(
+                name=name, model=model, expires_at=time.time() + ttl, contents=list(contents or []),
+            )
+            self.created += 1
+        return name
+    def _entry_by_name(self, name: str) -> Optional[CacheEntry]:
+        return next((e for e in self._entries.values() if e.name == name), None)
+    def config_for(self, name: Optional[str], config: types.GenerateContentConfig) -> types.GenerateContentConfig:
+        """Reference the cache from a request config; the cached parts must then be left out"""
+        if not name or self.mode != "provider":
+            return config
+        return config.model_copy(update={
+            "cached_content": name, "system_instruction": None, "tools": None, "tool_config": None,
+        })
+    def contents_for(self, name: Optional[str], contents: List[types.Content]) -> List[types.Content]:
+        """In local mode the cached contents are put back in front of the request contents"""
+        if not name or self.mode != "local":
+            return contents
+        entry = self._entry_by_name(name)
+        return (entry.contents if entry else []) + list(contents)
+    async def release(self, client, name: Optional[str]) -> None:
+        if not name:
+            return
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if e.name == name]:
+                self._entries.pop(key, None)
+                self._seen.pop(key, None)
+        if self.mode == "provider":
+            try:
+                await client.aio.caches.delete(name=name)
+            except Exception as ex:
+                logger.debug("Context cache %s not deleted: %r", name, ex)
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "live": len(self._entries),
+            "created": self.created,
+            "failures": self.failures,
+            "hits": sum(e.hits for e in self._entries.values()),
+        }
+_registry: Optional[ContextCacheRegistry] = None
+def get_context_cache() -> ContextCacheRegistry:
+    global _registry
+    if _registry is None:
+        _registry = ContextCacheRegistry()
+    return _registry
@@ -1,16 +1,29 @@
-from app.agents.dynamic_agent.agent import root_agent
 __all__ = ["root_agent", "analyze_website"]
-def analyze_website(url: str, goal: str = "Analyze website for dark patterns and transparency issues"):
-    from app.agents.dynamic_agent.agents.
-    from google.adk.agents import SequentialAgent
-    pipeline = SequentialAgent(
-        name="website_analysis_pipeline",
-        description="Analyze website for dark patterns",
-        sub_agents=[
-            ingest_agent,
-            browser_loop,
-        ],
-    )
+def __getattr__(name):
+    if name == "root_agent":
+        from app.agents.dynamic_agent.agent import root_agent
+        return root_agent
+    raise AttributeError(name)
+_pipeline = None
+def _website_pipeline():
+    # Sub-agents can only have one parent, so the pipeline is built once per process.
+    global _pipeline
+    if _pipeline is None:
+        from app.agents.dynamic_agent.agents.browser_agent import ingest_agent, browser_loop
+        from google.adk.agents import SequentialAgent
+        _pipeline = SequentialAgent(
+            name="website_analysis_pipeline",
+            description="Analyze website for dark patterns",
+            sub_agents=[
+                ingest_agent,
+                browser_loop,
+            ],
+        )
+    return _pipeline
+def analyze_website(url: str, goal: str = "Analyze website for dark patterns and transparency issues", should_stop=None, progress_channel=None, budget=None, timeout=None):
+    from app.agents.dynamic_agent.runner import AGENT_RUN_TIMEOUT, run_agent
+    from app.agents.dynamic_agent.utils.cancellation import ScanCancelled
+    pipeline = _website_pipeline()
     initial_state = {
         "url": url,
         "goal": goal,
@@ -22,10 +35,13 @@ def analyze_website(url: str, goal: str = "Analyze website for dark patterns and
         ]
     }
     try:
-        result = pipeline.run(state=initial_state)
-        final_data = result.state.get("final_data", {})
-        final_summary = result.state.get("final_summary", "Analysis completed")
-        parsed_data = result.state.get("parsed", {})
+        state = run_agent(
+            pipeline, initial_state, message=goal, timeout=AGENT_RUN_TIMEOUT if timeout is None else timeout,
+            should_stop=should_stop, progress_channel=progress_channel, budget=budget,
+        )
+        final_data = state.get("final_data", {})
+        final_summary = state.get("final_summary", "Analysis completed")
+        parsed_data = state.get("parsed", {})
         dark_patterns = final_data.get("dark_patterns", []) if isinstance(final_data, dict) else []
         if isinstance(dark_patterns, str):
             dark_patterns = []
@@ -38,6 +54,8 @@ def analyze_website(url: str, goal: str = "Analyze website for dark patterns and
             'detailed_findings': parsed_data,
             'status': 'completed'
         }
+    except ScanCancelled:
+        raise
     except Exception as e:
         return {
             'url': url,
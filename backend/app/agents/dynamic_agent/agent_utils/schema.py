@@ -2,7 +2,7 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import List
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Dict, Any, Literal
 class BlogProfileOut(BaseModel):
     topic_primary: str = Field(..., description="Короткая формулировка основной темы блога (1–4 слова).")
     topic_secondary: List[str] = Field(default_factory=list, description="2–6 подтем, релевантных блогу.")
@@ -59,3 +59,13 @@ class QuerySeeds(BaseModel):
     notes: str = Field(default="", description="Короткая стратегия выбора семян и источники (1–3 предложения).")
 class QuerySeedsOut(BaseModel):
     query_seeds: QuerySeeds
+class DeciderOut(BaseModel):
+    next_step: Literal["navigate", "act", "parse", "finish"] = Field(..., description="Следующий шаг цикла.")
+    action_instructions: str = Field(default="", description="Прямые инструкции для navigator/form_filler/parser.")
+    current_phase: Optional[str] = Field(default=None, description="Текущая фаза проверки паттерна.")
+class ParserOut(BaseModel):
+    extracted: Dict[str, Any] = Field(default_factory=dict, description="Извлечённые метрики паттерна.")
+    notes: str = Field(default="", description="Краткие пояснения к извлечённым данным.")
+class CriticOut(BaseModel):
+    done: bool = Field(default=False, description="Достаточно ли данных для вывода.")
+    reason: str = Field(default="", description="Чего не хватает или почему анализ завершён.")
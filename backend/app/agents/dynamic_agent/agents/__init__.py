@@ -1,17 +1,16 @@
-"""Subpackage with the orchestrating agents used by the dynamic ADK pipeline."""
-from .roach_motel_agent import roach_motel_root_agent
-from .fake_urgency_agent import fake_urgency_root_agent
-from .fake_scarcity_agent import fake_scarcity_root_agent
-from .drip_pricing_agent import drip_pricing_root_agent
-from .hidden_subscription_agent import hidden_subscription_root_agent
-from .sneak_into_basket_agent import sneak_into_basket_root_agent
-from .bait_and_switch_agent import bait_and_switch_root_agent
-from .confirmshaming_agent import confirmshaming_root_agent
-from .forced_actions_agent import forced_actions_root_agent
-from .nagging_agent import nagging_root_agent
-from .navigation_obstacles_agent import navigation_obstacles_root_agent
-from .currency_manipulation_agent import currency_manipulation_root_agent
-from .browser_agent import ingest_agent, browser_loop
+"""Subpackage with the orchestrating agents used by the dynamic ADK pipeline.
+Root agents are resolved lazily through `app.agents.dynamic_agent.registry`;
+importing the package does not build any agent graph.
+"""
+import importlib
+from app.agents.dynamic_agent.registry import DETECTORS, root_agent
+_BROWSER_AGENTS = ("ingest_agent", "browser_loop")
+def __getattr__(name):
+    if name.endswith("_root_agent") and name[: -len("_root_agent")] in DETECTORS:
+        return root_agent(name[: -len("_root_agent")])
+    if name in _BROWSER_AGENTS:
+        return getattr(importlib.import_module(".browser_agent", __name__), name)
+    raise AttributeError(name)
 __all__ = [
     "pipeline",
     "browser_agent",
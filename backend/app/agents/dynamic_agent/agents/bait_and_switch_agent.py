@@ -5,21 +5,13 @@ from typing import Optional, Any, Dict
 from google.adk.agents import Agent, SequentialAgent, LoopAgent
 from google.adk.agents.callback_context import CallbackContext
 from google.genai import types
-from google.adk.tools.mcp_tool.mcp_toolset import (
-    MCPToolset,
-    StreamableHTTPConnectionParams,
-)
 from google.adk.tools.tool_context import ToolContext
-from app.utils.llmproxy import GeminiLLM
-LLM = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))        
-LLM_FLASH = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-LLM_LITE = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-MCP_SSE_URL = os.getenv("BROWSER_MCP", "localhost")
-toolset = MCPToolset(
-    connection_params=StreamableHTTPConnectionParams(
-        url=MCP_SSE_URL,
-    )
-)
+from app.agents.dynamic_agent.utils.model_router import model_for
+from app.agents.dynamic_agent.utils.structured_output import JSON_RESPONSE
+from app.agents.dynamic_agent.agent_utils.schema import DeciderOut, CriticOut
+from app.agents.dynamic_agent.utils.callbacks import instrument
+from app.agents.dynamic_agent.utils.mcp_pool import mcp_toolset
+toolset = mcp_toolset()
 MAX_LOOP_ITERS = int(os.getenv("BROWSER_PIPELINE_ITERS", "14"))
 def finish(
     summary: Optional[str] = None,
@@ -38,7 +30,7 @@ def finish(
     return {"status": "ok", "escalated": True}
 bait_and_switch_ingest_agent = Agent(
     name="bait_and_switch_ingest_agent",
-    model=LLM,
+    model=model_for("ingest"),
     description="Нормализует запрос для детектирования паттерна 'Bait & Switch' - подмены заманивающих предложений.",
     instruction=(
         "Ты — Ingest агент для детектирования BAIT & SWITCH паттерна. Создай план тестирования подмены предложений.\n\n"
@@ -81,7 +73,8 @@ bait_and_switch_ingest_agent = Agent(
 )
 bait_and_switch_decider_agent = Agent(
     name="bait_and_switch_decider_agent",
-    model=LLM_LITE,
+    model=model_for("decider"),
+    output_schema=DeciderOut,
     tools=[finish],
     description="Определяет следующий шаг для детектирования Bait & Switch паттерна.",
     instruction=(
@@ -111,7 +104,7 @@ bait_and_switch_decider_agent = Agent(
 )
 bait_and_switch_navigator_agent = Agent(
     name="bait_and_switch_navigator_agent",
-    model=LLM_FLASH,
+    model=model_for("navigator"),
     tools=[toolset],
     description="Навигация для поиска рекламируемых предложений и тестирования их доступности.",
     instruction=(
@@ -148,7 +141,7 @@ bait_and_switch_navigator_agent = Agent(
 )
 bait_and_switch_form_filler_agent = Agent(
     name="bait_and_switch_form_filler_agent",
-    model=LLM_FLASH,
+    model=model_for("form_filler"),
     tools=[toolset],
     description="Документирует рекламные предложения и тестирует их реальную доступность.",
     instruction=(
@@ -190,7 +183,8 @@ bait_and_switch_form_filler_agent = Agent(
 )
 bait_and_switch_parser_agent = Agent(
     name="bait_and_switch_parser_agent",
-    model=LLM_FLASH,
+    model=model_for("parser"),
+    generate_content_config=JSON_RESPONSE,
     description="Анализирует соответствие рекламируемых и доступных предложений.",
     instruction=(
         "Ты — парсер для BAIT & SWITCH анализа.\n"
@@ -241,7 +235,8 @@ bait_and_switch_parser_agent = Agent(
 )
 bait_and_switch_critic_agent = Agent(
     name="bait_and_switch_critic_agent",
-    model=LLM,
+    model=model_for("critic"),
+    output_schema=CriticOut,
     tools=[finish],
     description="Проверяет завершенность Bait & Switch анализа.",
     instruction=(
@@ -269,7 +264,7 @@ bait_and_switch_critic_agent = Agent(
 )
 bait_and_switch_result_agent = Agent(
     name="bait_and_switch_result_agent",
-    model=LLM,
+    model=model_for("result"),
     tools=[finish],
     description="Подводит итоги Bait & Switch анализа.",
     instruction=(
@@ -359,11 +354,11 @@ bait_and_switch_browser_loop = LoopAgent(
     max_iterations=MAX_LOOP_ITERS,
     after_agent_callback=bait_and_switch_after_loop_callback,
 )
-bait_and_switch_root_agent = SequentialAgent(
+bait_and_switch_root_agent = instrument(SequentialAgent(
     name="bait_and_switch_pipeline",
     description="Полный пайплайн для детектирования Bait & Switch паттерна (подмена заманивающих предложений).",
     sub_agents=[
         bait_and_switch_ingest_agent,
         bait_and_switch_browser_loop,
     ],
-)
\ No newline at end of file
+))
\ No newline at end of file
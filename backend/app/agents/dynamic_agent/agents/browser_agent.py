@@ -5,21 +5,13 @@ from typing import Optional, Any, Dict
 from google.adk.agents import Agent, SequentialAgent, LoopAgent
 from google.adk.agents.callback_context import CallbackContext
 from google.genai import types
-from google.adk.tools.mcp_tool.mcp_toolset import (
-    MCPToolset,
-    StreamableHTTPConnectionParams,
-)
 from google.adk.tools.tool_context import ToolContext
-from app.agents.dynamic_agent.utils.llmproxy import GeminiLLM
-LLM = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))        # планирование/критика/итоги
-LLM_FLASH = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-LLM_LITE = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-MCP_SSE_URL = os.getenv("BROWSER_MCP", "localhost")
-toolset = MCPToolset(
-    connection_params=StreamableHTTPConnectionParams(
-        url=MCP_SSE_URL,
-    )
-)
+from app.agents.dynamic_agent.utils.model_router import model_for
+from app.agents.dynamic_agent.utils.structured_output import JSON_RESPONSE
+from app.agents.dynamic_agent.agent_utils.schema import DeciderOut, CriticOut
+from app.agents.dynamic_agent.utils.callbacks import instrument
+from app.agents.dynamic_agent.utils.mcp_pool import mcp_toolset
+toolset = mcp_toolset()
 MAX_LOOP_ITERS = int(os.getenv("BROWSER_PIPELINE_ITERS", "12"))
 def finish(
     summary: Optional[str] = None,
@@ -38,7 +30,7 @@ def finish(
     return {"status": "ok", "escalated": True}
 ingest_agent = Agent(
     name="ingest_agent",
-    model=LLM,
+    model=model_for("ingest"),
     description="Нормализует запрос пользователя в BrowsingPlan.",
     instruction=(
         "Ты — Entry/Ingest агент. На основе ПОСЛЕДНЕГО запроса пользователя верни ТОЛЬКО JSON по схеме BrowsingPlan.\n\n"
@@ -63,7 +55,8 @@ ingest_agent = Agent(
 )
 decider_agent = Agent(
     name="decider_agent",
-    model=LLM_LITE,
+    model=model_for("decider"),
+    output_schema=DeciderOut,
     tools=[finish],  # раннее завершение по плану/критериям
     description="Определяет следующий шаг и выдаёт ПРЯМЫЕ инструкции другим агентам.",
     instruction=(
@@ -105,7 +98,7 @@ decider_agent = Agent(
 )
 navigator_agent = Agent(
     name="navigator_agent",
-    model=LLM_FLASH,
+    model=model_for("navigator"),
     tools=[toolset],
     description="Навигация по вебу с MCP. Всегда синхронизирует состояние через частые snapshots.",
     instruction=(
@@ -136,7 +129,7 @@ navigator_agent = Agent(
 )
 form_filler_agent = Agent(
     name="form_filler_agent",
-    model=LLM_FLASH,
+    model=model_for("form_filler"),
     tools=[toolset],
     description="Действия на странице через MCP. Всегда синхронизирует состояние через частые snapshots.",
     instruction=(
@@ -166,7 +159,8 @@ form_filler_agent = Agent(
 )
 parser_agent = Agent(
     name="parser_agent",
-    model=LLM_FLASH,
+    model=model_for("parser"),
+    generate_content_config=JSON_RESPONSE,
     description="Извлекает данные из свежего снимка страницы.",
     instruction=(
         "Ты — агент извлечения.\n"
@@ -183,7 +177,8 @@ parser_agent = Agent(
 )
 critic_agent = Agent(
     name="critic_agent",
-    model=LLM,
+    model=model_for("critic"),
+    output_schema=CriticOut,
     tools=[finish],
     description="Проверяет success_criteria; при выполнении — завершает.",
     instruction=(
@@ -203,7 +198,7 @@ critic_agent = Agent(
 )
 result_agent = Agent(
     name="result_agent",
-    model=LLM,
+    model=model_for("result"),
     tools=[finish],
     description="Подводит итог; решает завершать или рекомендовать повтор.",
     instruction=(
@@ -267,3 +262,5 @@ browser_loop = LoopAgent(
     max_iterations=MAX_LOOP_ITERS,
     after_agent_callback=after_loop_callback,
 )
+instrument(ingest_agent)
+instrument(browser_loop)
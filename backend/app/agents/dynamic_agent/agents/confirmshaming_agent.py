@@ -5,21 +5,13 @@ from typing import Optional, Any, Dict
 from google.adk.agents import Agent, SequentialAgent, LoopAgent
 from google.adk.agents.callback_context import CallbackContext
 from google.genai import types
-from google.adk.tools.mcp_tool.mcp_toolset import (
-    MCPToolset,
-    StreamableHTTPConnectionParams,
-)
 from google.adk.tools.tool_context import ToolContext
-from app.utils.llmproxy import GeminiLLM
-LLM = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))        
-LLM_FLASH = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-LLM_LITE = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-MCP_SSE_URL = os.getenv("BROWSER_MCP", "localhost")
-toolset = MCPToolset(
-    connection_params=StreamableHTTPConnectionParams(
-        url=MCP_SSE_URL,
-    )
-)
+from app.agents.dynamic_agent.utils.model_router import model_for
+from app.agents.dynamic_agent.utils.structured_output import JSON_RESPONSE
+from app.agents.dynamic_agent.agent_utils.schema import DeciderOut, CriticOut
+from app.agents.dynamic_agent.utils.callbacks import instrument
+from app.agents.dynamic_agent.utils.mcp_pool import mcp_toolset
+toolset = mcp_toolset()
 MAX_LOOP_ITERS = int(os.getenv("BROWSER_PIPELINE_ITERS", "12"))
 def finish(
     summary: Optional[str] = None,
@@ -38,7 +30,7 @@ def finish(
     return {"status": "ok", "escalated": True}
 confirmshaming_ingest_agent = Agent(
     name="confirmshaming_ingest_agent",
-    model=LLM,
+    model=model_for("ingest"),
     description="Нормализует запрос для детектирования паттерна 'Confirmshaming' - манипулятивных подтверждений.",
     instruction=(
         "Ты — Ingest агент для детектирования CONFIRMSHAMING паттерна. Создай план поиска манипулятивных CTA.\n\n"
@@ -80,7 +72,8 @@ confirmshaming_ingest_agent = Agent(
 )
 confirmshaming_decider_agent = Agent(
     name="confirmshaming_decider_agent",
-    model=LLM_LITE,
+    model=model_for("decider"),
+    output_schema=DeciderOut,
     tools=[finish],
     description="Определяет следующий шаг для детектирования Confirmshaming паттерна.",
     instruction=(
@@ -110,7 +103,7 @@ confirmshaming_decider_agent = Agent(
 )
 confirmshaming_navigator_agent = Agent(
     name="confirmshaming_navigator_agent",
-    model=LLM_FLASH,
+    model=model_for("navigator"),
     tools=[toolset],
     description="Навигация для поиска confirmation dialogs и CTA элементов.",
     instruction=(
@@ -148,7 +141,7 @@ confirmshaming_navigator_agent = Agent(
 )
 confirmshaming_form_filler_agent = Agent(
     name="confirmshaming_form_filler_agent",
-    model=LLM_FLASH,
+    model=model_for("form_filler"),
     tools=[toolset],
     description="Триггерит и анализирует confirmation dialogs на предмет manipulative language.",
     instruction=(
@@ -191,7 +184,8 @@ confirmshaming_form_filler_agent = Agent(
 )
 confirmshaming_parser_agent = Agent(
     name="confirmshaming_parser_agent",
-    model=LLM_FLASH,
+    model=model_for("parser"),
+    generate_content_config=JSON_RESPONSE,
     description="Анализирует manipulative patterns в confirmation dialogs и CTAs.",
     instruction=(
         "Ты — парсер для CONFIRMSHAMING анализа.\n"
@@ -244,7 +238,8 @@ confirmshaming_parser_agent = Agent(
 )
 confirmshaming_critic_agent = Agent(
     name="confirmshaming_critic_agent",
-    model=LLM,
+    model=model_for("critic"),
+    output_schema=CriticOut,
     tools=[finish],
     description="Проверяет завершенность Confirmshaming анализа.",
     instruction=(
@@ -272,7 +267,7 @@ confirmshaming_critic_agent = Agent(
 )
 confirmshaming_result_agent = Agent(
     name="confirmshaming_result_agent",
-    model=LLM,
+    model=model_for("result"),
     tools=[finish],
     description="Подводит итоги Confirmshaming анализа.",
     instruction=(
@@ -376,11 +371,11 @@ confirmshaming_browser_loop = LoopAgent(
     max_iterations=MAX_LOOP_ITERS,
     after_agent_callback=confirmshaming_after_loop_callback,
 )
-confirmshaming_root_agent = SequentialAgent(
+confirmshaming_root_agent = instrument(SequentialAgent(
     name="confirmshaming_pipeline",
     description="Полный пайплайн для детектирования Confirmshaming паттерна (манипулятивные подтверждения).",
     sub_agents=[
         confirmshaming_ingest_agent,
         confirmshaming_browser_loop,
     ],
-)
\ No newline at end of file
+))
\ No newline at end of file
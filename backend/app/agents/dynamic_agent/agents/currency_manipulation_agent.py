@@ -5,21 +5,13 @@ from typing import Optional, Any, Dict
 from google.adk.agents import Agent, SequentialAgent, LoopAgent
 from google.adk.agents.callback_context import CallbackContext
 from google.genai import types
-from google.adk.tools.mcp_tool.mcp_toolset import (
-    MCPToolset,
-    StreamableHTTPConnectionParams,
-)
 from google.adk.tools.tool_context import ToolContext
-from app.utils.llmproxy import GeminiLLM
-LLM = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))        
-LLM_FLASH = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-LLM_LITE = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-MCP_SSE_URL = os.getenv("BROWSER_MCP", "localhost")
-toolset = MCPToolset(
-    connection_params=StreamableHTTPConnectionParams(
-        url=MCP_SSE_URL,
-    )
-)
+from app.agents.dynamic_agent.utils.model_router import model_for
+from app.agents.dynamic_agent.utils.structured_output import JSON_RESPONSE
+from app.agents.dynamic_agent.agent_utils.schema import DeciderOut, CriticOut
+from app.agents.dynamic_agent.utils.callbacks import instrument
+from app.agents.dynamic_agent.utils.mcp_pool import mcp_toolset
+toolset = mcp_toolset()
 MAX_LOOP_ITERS = int(os.getenv("BROWSER_PIPELINE_ITERS", "16"))
 def finish(
     summary: Optional[str] = None,
@@ -38,7 +30,7 @@ def finish(
     return {"status": "ok", "escalated": True}
 currency_manipulation_ingest_agent = Agent(
     name="currency_manipulation_ingest_agent",
-    model=LLM,
+    model=model_for("ingest"),
     description="Нормализует запрос для детектирования паттерна 'Currency Manipulation' - введение в заблуждение единицами.",
     instruction=(
         "Ты — Ingest агент для детектирования CURRENCY MANIPULATION паттерна. Создай план поиска manipulative pricing units.\n\n"
@@ -81,7 +73,8 @@ currency_manipulation_ingest_agent = Agent(
 )
 currency_manipulation_decider_agent = Agent(
     name="currency_manipulation_decider_agent",
-    model=LLM_LITE,
+    model=model_for("decider"),
+    output_schema=DeciderOut,
     tools=[finish],
     description="Определяет следующий шаг для детектирования Currency Manipulation паттерна.",
     instruction=(
@@ -111,7 +104,7 @@ currency_manipulation_decider_agent = Agent(
 )
 currency_manipulation_navigator_agent = Agent(
     name="currency_manipulation_navigator_agent",
-    model=LLM_FLASH,
+    model=model_for("navigator"),
     tools=[toolset],
     description="Навигация для поиска pricing и currency information.",
     instruction=(
@@ -155,7 +148,7 @@ currency_manipulation_navigator_agent = Agent(
 )
 currency_manipulation_form_filler_agent = Agent(
     name="currency_manipulation_form_filler_agent",
-    model=LLM_FLASH,
+    model=model_for("form_filler"),
     tools=[toolset],
     description="Тестирует currency switching и анализирует rate presentations.",
     instruction=(
@@ -203,7 +196,8 @@ currency_manipulation_form_filler_agent = Agent(
 )
 currency_manipulation_parser_agent = Agent(
     name="currency_manipulation_parser_agent",
-    model=LLM_FLASH,
+    model=model_for("parser"),
+    generate_content_config=JSON_RESPONSE,
     description="Анализирует manipulative currency и unit presentations.",
     instruction=(
         "Ты — парсер для CURRENCY MANIPULATION анализа.\n"
@@ -258,7 +252,8 @@ currency_manipulation_parser_agent = Agent(
 )
 currency_manipulation_critic_agent = Agent(
     name="currency_manipulation_critic_agent",
-    model=LLM,
+    model=model_for("critic"),
+    output_schema=CriticOut,
     tools=[finish],
     description="Проверяет завершенность Currency Manipulation анализа.",
     instruction=(
@@ -286,7 +281,7 @@ currency_manipulation_critic_agent = Agent(
 )
 currency_manipulation_result_agent = Agent(
     name="currency_manipulation_result_agent",
-    model=LLM,
+    model=model_for("result"),
     tools=[finish],
     description="Подводит итоги Currency Manipulation анализа.",
     instruction=(
@@ -390,11 +385,11 @@ currency_manipulation_browser_loop = LoopAgent(
     max_iterations=MAX_LOOP_ITERS,
     after_agent_callback=currency_manipulation_after_loop_callback,
 )
-currency_manipulation_root_agent = SequentialAgent(
+currency_manipulation_root_agent = instrument(SequentialAgent(
     name="currency_manipulation_pipeline",
     description="Полный пайплайн для детектирования Currency Manipulation паттерна (manipulative currency/unit presentations).",
     sub_agents=[
         currency_manipulation_ingest_agent,
         currency_manipulation_browser_loop,
     ],
-)
\ No newline at end of file
+))
\ No newline at end of file
@@ -5,21 +5,13 @@ from typing import Optional, Any, Dict
 from google.adk.agents import Agent, SequentialAgent, LoopAgent
 from google.adk.agents.callback_context import CallbackContext
 from google.genai import types
-from google.adk.tools.mcp_tool.mcp_toolset import (
-    MCPToolset,
-    StreamableHTTPConnectionParams,
-)
 from google.adk.tools.tool_context import ToolContext
-from app.utils.llmproxy import GeminiLLM
-LLM = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))        
-LLM_FLASH = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-LLM_LITE = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-MCP_SSE_URL = os.getenv("BROWSER_MCP", "localhost")
-toolset = MCPToolset(
-    connection_params=StreamableHTTPConnectionParams(
-        url=MCP_SSE_URL,
-    )
-)
+from app.agents.dynamic_agent.utils.model_router import model_for
+from app.agents.dynamic_agent.utils.structured_output import JSON_RESPONSE
+from app.agents.dynamic_agent.agent_utils.schema import DeciderOut, CriticOut
+from app.agents.dynamic_agent.utils.callbacks import instrument
+from app.agents.dynamic_agent.utils.mcp_pool import mcp_toolset
+toolset = mcp_toolset()
 MAX_LOOP_ITERS = int(os.getenv("BROWSER_PIPELINE_ITERS", "18"))
 def finish(
     summary: Optional[str] = None,
@@ -38,7 +30,7 @@ def finish(
     return {"status": "ok", "escalated": True}
 drip_pricing_ingest_agent = Agent(
     name="drip_pricing_ingest_agent",
-    model=LLM,
+    model=model_for("ingest"),
     description="Нормализует запрос для детектирования паттерна 'Drip Pricing' - скрытых комиссий и доплат.",
     instruction=(
         "Ты — Ingest агент для детектирования DRIP PRICING паттерна. Создай план тестирования скрытых комиссий.\n\n"
@@ -82,7 +74,8 @@ drip_pricing_ingest_agent = Agent(
 )
 drip_pricing_decider_agent = Agent(
     name="drip_pricing_decider_agent",
-    model=LLM_LITE,
+    model=model_for("decider"),
+    output_schema=DeciderOut,
     tools=[finish],
     description="Определяет следующий шаг для детектирования Drip Pricing паттерна.",
     instruction=(
@@ -112,7 +105,7 @@ drip_pricing_decider_agent = Agent(
 )
 drip_pricing_navigator_agent = Agent(
     name="drip_pricing_navigator_agent",
-    model=LLM_FLASH,
+    model=model_for("navigator"),
     tools=[toolset],
     description="Навигация через чекаут для отслеживания Drip Pricing.",
     instruction=(
@@ -142,7 +135,7 @@ drip_pricing_navigator_agent = Agent(
 )
 drip_pricing_form_filler_agent = Agent(
     name="drip_pricing_form_filler_agent",
-    model=LLM_FLASH,
+    model=model_for("form_filler"),
     tools=[toolset],
     description="Заполняет формы чекаута и отслеживает изменения цен.",
     instruction=(
@@ -180,7 +173,8 @@ drip_pricing_form_filler_agent = Agent(
 )
 drip_pricing_parser_agent = Agent(
     name="drip_pricing_parser_agent",
-    model=LLM_FLASH,
+    model=model_for("parser"),
+    generate_content_config=JSON_RESPONSE,
     description="Анализирует прогрессию цен и скрытые комиссии.",
     instruction=(
         "Ты — парсер для DRIP PRICING анализа.\n"
@@ -224,7 +218,8 @@ drip_pricing_parser_agent = Agent(
 )
 drip_pricing_critic_agent = Agent(
     name="drip_pricing_critic_agent",
-    model=LLM,
+    model=model_for("critic"),
+    output_schema=CriticOut,
     tools=[finish],
     description="Проверяет завершенность Drip Pricing анализа.",
     instruction=(
@@ -251,7 +246,7 @@ drip_pricing_critic_agent = Agent(
 )
 drip_pricing_result_agent = Agent(
     name="drip_pricing_result_agent",
-    model=LLM,
+    model=model_for("result"),
     tools=[finish],
     description="Подводит итоги Drip Pricing анализа.",
     instruction=(
@@ -336,11 +331,11 @@ drip_pricing_browser_loop = LoopAgent(
     max_iterations=MAX_LOOP_ITERS,
     after_agent_callback=drip_pricing_after_loop_callback,
 )
-drip_pricing_root_agent = SequentialAgent(
+drip_pricing_root_agent = instrument(SequentialAgent(
     name="drip_pricing_pipeline",
     description="Полный пайплайн для детектирования Drip Pricing паттерна (скрытые поздние комиссии).",
     sub_agents=[
         drip_pricing_ingest_agent,
         drip_pricing_browser_loop,
     ],
-)
\ No newline at end of file
+))
\ No newline at end of file
@@ -5,21 +5,13 @@ from typing import Optional, Any, Dict
 from google.adk.agents import Agent, SequentialAgent, LoopAgent
 from google.adk.agents.callback_context import CallbackContext
 from google.genai import types
-from google.adk.tools.mcp_tool.mcp_toolset import (
-    MCPToolset,
-    StreamableHTTPConnectionParams,
-)
 from google.adk.tools.tool_context import ToolContext
-from app.utils.llmproxy import GeminiLLM
-LLM = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))        
-LLM_FLASH = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-LLM_LITE = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-MCP_SSE_URL = os.getenv("BROWSER_MCP", "localhost")
-toolset = MCPToolset(
-    connection_params=StreamableHTTPConnectionParams(
-        url=MCP_SSE_URL,
-    )
-)
+from app.agents.dynamic_agent.utils.model_router import model_for
+from app.agents.dynamic_agent.utils.structured_output import JSON_RESPONSE
+from app.agents.dynamic_agent.agent_utils.schema import DeciderOut, CriticOut
+from app.agents.dynamic_agent.utils.callbacks import instrument
+from app.agents.dynamic_agent.utils.mcp_pool import mcp_toolset
+toolset = mcp_toolset()
 MAX_LOOP_ITERS = int(os.getenv("BROWSER_PIPELINE_ITERS", "18"))
 def finish(
     summary: Optional[str] = None,
@@ -38,7 +30,7 @@ def finish(
     return {"status": "ok", "escalated": True}
 fake_scarcity_ingest_agent = Agent(
     name="fake_scarcity_ingest_agent",
-    model=LLM,
+    model=model_for("ingest"),
     description="Нормализует запрос для детектирования паттерна 'Fake Scarcity' - ложных индикаторов дефицита.",
     instruction=(
         "Ты — Ingest агент для детектирования FAKE SCARCITY паттерна. Создай план тестирования ложных индикаторов дефицита.\n\n"
@@ -80,7 +72,8 @@ fake_scarcity_ingest_agent = Agent(
 )
 fake_scarcity_decider_agent = Agent(
     name="fake_scarcity_decider_agent",
-    model=LLM_LITE,
+    model=model_for("decider"),
+    output_schema=DeciderOut,
     tools=[finish],
     description="Определяет следующий шаг для детектирования Fake Scarcity паттерна.",
     instruction=(
@@ -110,7 +103,7 @@ fake_scarcity_decider_agent = Agent(
 )
 fake_scarcity_navigator_agent = Agent(
     name="fake_scarcity_navigator_agent",
-    model=LLM_FLASH,
+    model=model_for("navigator"),
     tools=[toolset],
     description="Навигация для поиска и анализа индикаторов дефицита.",
     instruction=(
@@ -146,7 +139,7 @@ fake_scarcity_navigator_agent = Agent(
 )
 fake_scarcity_form_filler_agent = Agent(
     name="fake_scarcity_form_filler_agent",
-    model=LLM_FLASH,
+    model=model_for("form_filler"),
     tools=[toolset],
     description="Отслеживает и тестирует изменения индикаторов дефицита.",
     instruction=(
@@ -186,7 +179,8 @@ fake_scarcity_form_filler_agent = Agent(
 )
 fake_scarcity_parser_agent = Agent(
     name="fake_scarcity_parser_agent",
-    model=LLM_FLASH,
+    model=model_for("parser"),
+    generate_content_config=JSON_RESPONSE,
     description="Анализирует аутентичность индикаторов дефицита и социальных доказательств.",
     instruction=(
         "Ты — парсер для FAKE SCARCITY анализа.\n"
@@ -237,7 +231,8 @@ fake_scarcity_parser_agent = Agent(
 )
 fake_scarcity_critic_agent = Agent(
     name="fake_scarcity_critic_agent",
-    model=LLM,
+    model=model_for("critic"),
+    output_schema=CriticOut,
     tools=[finish],
     description="Проверяет завершенность Fake Scarcity анализа.",
     instruction=(
@@ -265,7 +260,7 @@ fake_scarcity_critic_agent = Agent(
 )
 fake_scarcity_result_agent = Agent(
     name="fake_scarcity_result_agent",
-    model=LLM,
+    model=model_for("result"),
     tools=[finish],
     description="Подводит итоги Fake Scarcity анализа.",
     instruction=(
@@ -360,11 +355,11 @@ fake_scarcity_browser_loop = LoopAgent(
     max_iterations=MAX_LOOP_ITERS,
     after_agent_callback=fake_scarcity_after_loop_callback,
 )
-fake_scarcity_root_agent = SequentialAgent(
+fake_scarcity_root_agent = instrument(SequentialAgent(
     name="fake_scarcity_pipeline",
     description="Полный пайплайн для детектирования Fake Scarcity паттерна (ложные индикаторы дефицита).",
     sub_agents=[
         fake_scarcity_ingest_agent,
         fake_scarcity_browser_loop,
     ],
-)
\ No newline at end of file
+))
\ No newline at end of file
@@ -5,21 +5,13 @@ from typing import Optional, Any, Dict
 from google.adk.agents import Agent, SequentialAgent, LoopAgent
 from google.adk.agents.callback_context import CallbackContext
 from google.genai import types
-from google.adk.tools.mcp_tool.mcp_toolset import (
-    MCPToolset,
-    StreamableHTTPConnectionParams,
-)
 from google.adk.tools.tool_context import ToolContext
-from app.utils.llmproxy import GeminiLLM
-LLM = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))        
-LLM_FLASH = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-LLM_LITE = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-MCP_SSE_URL = os.getenv("BROWSER_MCP", "localhost")
-toolset = MCPToolset(
-    connection_params=StreamableHTTPConnectionParams(
-        url=MCP_SSE_URL,
-    )
-)
+from app.agents.dynamic_agent.utils.model_router import model_for
+from app.agents.dynamic_agent.utils.structured_output import JSON_RESPONSE
+from app.agents.dynamic_agent.agent_utils.schema import DeciderOut, CriticOut
+from app.agents.dynamic_agent.utils.callbacks import instrument
+from app.agents.dynamic_agent.utils.mcp_pool import mcp_toolset
+toolset = mcp_toolset()
 MAX_LOOP_ITERS = int(os.getenv("BROWSER_PIPELINE_ITERS", "20"))
 def finish(
     summary: Optional[str] = None,
@@ -38,7 +30,7 @@ def finish(
     return {"status": "ok", "escalated": True}
 fake_urgency_ingest_agent = Agent(
     name="fake_urgency_ingest_agent",
-    model=LLM,
+    model=model_for("ingest"),
     description="Нормализует запрос для детектирования паттерна 'Fake Urgency' - ложных таймеров и срочности.",
     instruction=(
         "Ты — Ingest агент для детектирования FAKE URGENCY паттерна. Создай план тестирования ложных таймеров.\n\n"
@@ -80,7 +72,8 @@ fake_urgency_ingest_agent = Agent(
 )
 fake_urgency_decider_agent = Agent(
     name="fake_urgency_decider_agent",
-    model=LLM_LITE,
+    model=model_for("decider"),
+    output_schema=DeciderOut,
     tools=[finish],
     description="Определяет следующий шаг для детектирования Fake Urgency паттерна.",
     instruction=(
@@ -110,7 +103,7 @@ fake_urgency_decider_agent = Agent(
 )
 fake_urgency_navigator_agent = Agent(
     name="fake_urgency_navigator_agent",
-    model=LLM_FLASH,
+    model=model_for("navigator"),
     tools=[toolset],
     description="Навигация для поиска и тестирования таймеров срочности.",
     instruction=(
@@ -146,7 +139,7 @@ fake_urgency_navigator_agent = Agent(
 )
 fake_urgency_form_filler_agent = Agent(
     name="fake_urgency_form_filler_agent",
-    model=LLM_FLASH,
+    model=model_for("form_filler"),
     tools=[toolset],
     description="Выполняет тесты перезагрузки и новых сессий для проверки таймеров.",
     instruction=(
@@ -186,7 +179,8 @@ fake_urgency_form_filler_agent = Agent(
 )
 fake_urgency_parser_agent = Agent(
     name="fake_urgency_parser_agent",
-    model=LLM_FLASH,
+    model=model_for("parser"),
+    generate_content_config=JSON_RESPONSE,
     description="Анализирует аутентичность таймеров и urgency элементов.",
     instruction=(
         "Ты — парсер для FAKE URGENCY анализа.\n"
@@ -231,7 +225,8 @@ fake_urgency_parser_agent = Agent(
 )
 fake_urgency_critic_agent = Agent(
     name="fake_urgency_critic_agent",
-    model=LLM,
+    model=model_for("critic"),
+    output_schema=CriticOut,
     tools=[finish],
     description="Проверяет завершенность Fake Urgency анализа.",
     instruction=(
@@ -259,7 +254,7 @@ fake_urgency_critic_agent = Agent(
 )
 fake_urgency_result_agent = Agent(
     name="fake_urgency_result_agent",
-    model=LLM,
+    model=model_for("result"),
     tools=[finish],
     description="Подводит итоги Fake Urgency анализа.",
     instruction=(
@@ -348,11 +343,11 @@ fake_urgency_browser_loop = LoopAgent(
     max_iterations=MAX_LOOP_ITERS,
     after_agent_callback=fake_urgency_after_loop_callback,
 )
-fake_urgency_root_agent = SequentialAgent(
+fake_urgency_root_agent = instrument(SequentialAgent(
     name="fake_urgency_pipeline",
     description="Полный пайплайн для детектирования Fake Urgency паттерна (поддельные таймеры срочности).",
     sub_agents=[
         fake_urgency_ingest_agent,
         fake_urgency_browser_loop,
     ],
-)
\ No newline at end of file
+))
\ No newline at end of file
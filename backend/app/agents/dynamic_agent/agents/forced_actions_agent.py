@@ -5,21 +5,13 @@ from typing import Optional, Any, Dict
 from google.adk.agents import Agent, SequentialAgent, LoopAgent
 from google.adk.agents.callback_context import CallbackContext
 from google.genai import types
-from google.adk.tools.mcp_tool.mcp_toolset import (
-    MCPToolset,
-    StreamableHTTPConnectionParams,
-)
 from google.adk.tools.tool_context import ToolContext
-from app.utils.llmproxy import GeminiLLM
-LLM = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))        
-LLM_FLASH = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-LLM_LITE = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-MCP_SSE_URL = os.getenv("BROWSER_MCP", "localhost")
-toolset = MCPToolset(
-    connection_params=StreamableHTTPConnectionParams(
-        url=MCP_SSE_URL,
-    )
-)
+from app.agents.dynamic_agent.utils.model_router import model_for
+from app.agents.dynamic_agent.utils.structured_output import JSON_RESPONSE
+from app.agents.dynamic_agent.agent_utils.schema import DeciderOut, CriticOut
+from app.agents.dynamic_agent.utils.callbacks import instrument
+from app.agents.dynamic_agent.utils.mcp_pool import mcp_toolset
+toolset = mcp_toolset()
 MAX_LOOP_ITERS = int(os.getenv("BROWSER_PIPELINE_ITERS", "14"))
 def finish(
     summary: Optional[str] = None,
@@ -38,7 +30,7 @@ def finish(
     return {"status": "ok", "escalated": True}
 forced_actions_ingest_agent = Agent(
     name="forced_actions_ingest_agent",
-    model=LLM,
+    model=model_for("ingest"),
     description="Нормализует запрос для детектирования паттерна 'Forced Actions' - принудительных действий для базовых функций.",
     instruction=(
         "Ты — Ingest агент для детектирования FORCED ACTIONS паттерна. Создай план тестирования блокирующих пэйволлов.\n\n"
@@ -80,7 +72,8 @@ forced_actions_ingest_agent = Agent(
 )
 forced_actions_decider_agent = Agent(
     name="forced_actions_decider_agent",
-    model=LLM_LITE,
+    model=model_for("decider"),
+    output_schema=DeciderOut,
     tools=[finish],
     description="Определяет следующий шаг для детектирования Forced Actions паттерна.",
     instruction=(
@@ -110,7 +103,7 @@ forced_actions_decider_agent = Agent(
 )
 forced_actions_navigator_agent = Agent(
     name="forced_actions_navigator_agent",
-    model=LLM_FLASH,
+    model=model_for("navigator"),
     tools=[toolset],
     description="Навигация для исследования core функций и их доступности.",
     instruction=(
@@ -148,7 +141,7 @@ forced_actions_navigator_agent = Agent(
 )
 forced_actions_form_filler_agent = Agent(
     name="forced_actions_form_filler_agent",
-    model=LLM_FLASH,
+    model=model_for("form_filler"),
     tools=[toolset],
     description="Тестирует доступность функций и анализирует блокировки.",
     instruction=(
@@ -190,7 +183,8 @@ forced_actions_form_filler_agent = Agent(
 )
 forced_actions_parser_agent = Agent(
     name="forced_actions_parser_agent",
-    model=LLM_FLASH,
+    model=model_for("parser"),
+    generate_content_config=JSON_RESPONSE,
     description="Анализирует обоснованность блокировок core функций.",
     instruction=(
         "Ты — парсер для FORCED ACTIONS анализа.\n"
@@ -239,7 +233,8 @@ forced_actions_parser_agent = Agent(
 )
 forced_actions_critic_agent = Agent(
     name="forced_actions_critic_agent",
-    model=LLM,
+    model=model_for("critic"),
+    output_schema=CriticOut,
     tools=[finish],
     description="Проверяет завершенность Forced Actions анализа.",
     instruction=(
@@ -267,7 +262,7 @@ forced_actions_critic_agent = Agent(
 )
 forced_actions_result_agent = Agent(
     name="forced_actions_result_agent",
-    model=LLM,
+    model=model_for("result"),
     tools=[finish],
     description="Подводит итоги Forced Actions анализа.",
     instruction=(
@@ -361,11 +356,11 @@ forced_actions_browser_loop = LoopAgent(
     max_iterations=MAX_LOOP_ITERS,
     after_agent_callback=forced_actions_after_loop_callback,
 )
-forced_actions_root_agent = SequentialAgent(
+forced_actions_root_agent = instrument(SequentialAgent(
     name="forced_actions_pipeline",
     description="Полный пайплайн для детектирования Forced Actions паттерна (принудительные блокировки базовых функций).",
     sub_agents=[
         forced_actions_ingest_agent,
         forced_actions_browser_loop,
     ],
-)
\ No newline at end of file
+))
\ No newline at end of file
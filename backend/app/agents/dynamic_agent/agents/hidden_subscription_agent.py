@@ -5,21 +5,13 @@ from typing import Optional, Any, Dict
 from google.adk.agents import Agent, SequentialAgent, LoopAgent
 from google.adk.agents.callback_context import CallbackContext
 from google.genai import types
-from google.adk.tools.mcp_tool.mcp_toolset import (
-    MCPToolset,
-    StreamableHTTPConnectionParams,
-)
 from google.adk.tools.tool_context import ToolContext
-from app.utils.llmproxy import GeminiLLM
-LLM = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))        
-LLM_FLASH = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-LLM_LITE = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-MCP_SSE_URL = os.getenv("BROWSER_MCP", "localhost")
-toolset = MCPToolset(
-    connection_params=StreamableHTTPConnectionParams(
-        url=MCP_SSE_URL,
-    )
-)
+from app.agents.dynamic_agent.utils.model_router import model_for
+from app.agents.dynamic_agent.utils.structured_output import JSON_RESPONSE
+from app.agents.dynamic_agent.agent_utils.schema import DeciderOut, CriticOut
+from app.agents.dynamic_agent.utils.callbacks import instrument
+from app.agents.dynamic_agent.utils.mcp_pool import mcp_toolset
+toolset = mcp_toolset()
 MAX_LOOP_ITERS = int(os.getenv("BROWSER_PIPELINE_ITERS", "16"))
 def finish(
     summary: Optional[str] = None,
@@ -38,7 +30,7 @@ def finish(
     return {"status": "ok", "escalated": True}
 hidden_subscription_ingest_agent = Agent(
     name="hidden_subscription_ingest_agent",
-    model=LLM,
+    model=model_for("ingest"),
     description="Нормализует запрос для детектирования паттерна 'Hidden Subscription' - скрытых подписок и автопродлений.",
     instruction=(
         "Ты — Ingest агент для детектирования HIDDEN SUBSCRIPTION паттерна. Создай план тестирования скрытых автоподписок.\n\n"
@@ -82,7 +74,8 @@ hidden_subscription_ingest_agent = Agent(
 )
 hidden_subscription_decider_agent = Agent(
     name="hidden_subscription_decider_agent",
-    model=LLM_LITE,
+    model=model_for("decider"),
+    output_schema=DeciderOut,
     tools=[finish],
     description="Определяет следующий шаг для детектирования Hidden Subscription паттерна.",
     instruction=(
@@ -112,7 +105,7 @@ hidden_subscription_decider_agent = Agent(
 )
 hidden_subscription_navigator_agent = Agent(
     name="hidden_subscription_navigator_agent",
-    model=LLM_FLASH,
+    model=model_for("navigator"),
     tools=[toolset],
     description="Навигация для поиска подписок и тестирования их прозрачности.",
     instruction=(
@@ -149,7 +142,7 @@ hidden_subscription_navigator_agent = Agent(
 )
 hidden_subscription_form_filler_agent = Agent(
     name="hidden_subscription_form_filler_agent",
-    model=LLM_FLASH,
+    model=model_for("form_filler"),
     tools=[toolset],
     description="Анализирует процесс подписки и настройки автопродления.",
     instruction=(
@@ -193,7 +186,8 @@ hidden_subscription_form_filler_agent = Agent(
 )
 hidden_subscription_parser_agent = Agent(
     name="hidden_subscription_parser_agent",
-    model=LLM_FLASH,
+    model=model_for("parser"),
+    generate_content_config=JSON_RESPONSE,
     description="Анализирует прозрачность подписочных практик и автопродления.",
     instruction=(
         "Ты — парсер для HIDDEN SUBSCRIPTION анализа.\n"
@@ -245,7 +239,8 @@ hidden_subscription_parser_agent = Agent(
 )
 hidden_subscription_critic_agent = Agent(
     name="hidden_subscription_critic_agent",
-    model=LLM,
+    model=model_for("critic"),
+    output_schema=CriticOut,
     tools=[finish],
     description="Проверяет завершенность Hidden Subscription анализа.",
     instruction=(
@@ -273,7 +268,7 @@ hidden_subscription_critic_agent = Agent(
 )
 hidden_subscription_result_agent = Agent(
     name="hidden_subscription_result_agent",
-    model=LLM,
+    model=model_for("result"),
     tools=[finish],
     description="Подводит итоги Hidden Subscription анализа.",
     instruction=(
@@ -378,11 +373,11 @@ hidden_subscription_browser_loop = LoopAgent(
     max_iterations=MAX_LOOP_ITERS,
     after_agent_callback=hidden_subscription_after_loop_callback,
 )
-hidden_subscription_root_agent = SequentialAgent(
+hidden_subscription_root_agent = instrument(SequentialAgent(
     name="hidden_subscription_pipeline",
     description="Полный пайплайн для детектирования Hidden Subscription паттерна (скрытые подписки и автопродление).",
     sub_agents=[
         hidden_subscription_ingest_agent,
         hidden_subscription_browser_loop,
     ],
-)
\ No newline at end of file
+))
\ No newline at end of file
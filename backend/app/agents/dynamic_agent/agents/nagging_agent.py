@@ -5,21 +5,13 @@ from typing import Optional, Any, Dict
 from google.adk.agents import Agent, SequentialAgent, LoopAgent
 from google.adk.agents.callback_context import CallbackContext
 from google.genai import types
-from google.adk.tools.mcp_tool.mcp_toolset import (
-    MCPToolset,
-    StreamableHTTPConnectionParams,
-)
 from google.adk.tools.tool_context import ToolContext
-from app.utils.llmproxy import GeminiLLM
-LLM = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))        
-LLM_FLASH = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-LLM_LITE = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-MCP_SSE_URL = os.getenv("BROWSER_MCP", "localhost")
-toolset = MCPToolset(
-    connection_params=StreamableHTTPConnectionParams(
-        url=MCP_SSE_URL,
-    )
-)
+from app.agents.dynamic_agent.utils.model_router import model_for
+from app.agents.dynamic_agent.utils.structured_output import JSON_RESPONSE
+from app.agents.dynamic_agent.agent_utils.schema import DeciderOut, CriticOut
+from app.agents.dynamic_agent.utils.callbacks import instrument
+from app.agents.dynamic_agent.utils.mcp_pool import mcp_toolset
+toolset = mcp_toolset()
 MAX_LOOP_ITERS = int(os.getenv("BROWSER_PIPELINE_ITERS", "20"))  # Больше итераций для отслеживания повторов
 def finish(
     summary: Optional[str] = None,
@@ -38,7 +30,7 @@ def finish(
     return {"status": "ok", "escalated": True}
 nagging_ingest_agent = Agent(
     name="nagging_ingest_agent",
-    model=LLM,
+    model=model_for("ingest"),
     description="Нормализует запрос для детектирования паттерна 'Nagging' - назойливых повторяющихся попапов.",
     instruction=(
         "Ты — Ingest агент для детектирования NAGGING паттерна. Создай план тестирования повторяющихся интерстициалов.\n\n"
@@ -80,7 +72,8 @@ nagging_ingest_agent = Agent(
 )
 nagging_decider_agent = Agent(
     name="nagging_decider_agent",
-    model=LLM_LITE,
+    model=model_for("decider"),
+    output_schema=DeciderOut,
     tools=[finish],
     description="Определяет следующий шаг для детектирования Nagging паттерна.",
     instruction=(
@@ -109,7 +102,7 @@ nagging_decider_agent = Agent(
 )
 nagging_navigator_agent = Agent(
     name="nagging_navigator_agent",
-    model=LLM_FLASH,
+    model=model_for("navigator"),
     tools=[toolset],
     description="Навигация для провокации и тестирования Nagging паттерна.",
     instruction=(
@@ -140,7 +133,7 @@ nagging_navigator_agent = Agent(
 )
 nagging_form_filler_agent = Agent(
     name="nagging_form_filler_agent",
-    model=LLM_FLASH,
+    model=model_for("form_filler"),
     tools=[toolset],
     description="Взаимодействует с попапами для тестирования Nagging паттерна.",
     instruction=(
@@ -173,7 +166,8 @@ nagging_form_filler_agent = Agent(
 )
 nagging_parser_agent = Agent(
     name="nagging_parser_agent",
-    model=LLM_FLASH,
+    model=model_for("parser"),
+    generate_content_config=JSON_RESPONSE,
     description="Анализирует паттерны назойливости попапов.",
     instruction=(
         "Ты — парсер для NAGGING анализа.\n"
@@ -217,7 +211,8 @@ nagging_parser_agent = Agent(
 )
 nagging_critic_agent = Agent(
     name="nagging_critic_agent",
-    model=LLM,
+    model=model_for("critic"),
+    output_schema=CriticOut,
     tools=[finish],
     description="Проверяет завершенность Nagging анализа.",
     instruction=(
@@ -242,7 +237,7 @@ nagging_critic_agent = Agent(
 )
 nagging_result_agent = Agent(
     name="nagging_result_agent",
-    model=LLM,
+    model=model_for("result"),
     tools=[finish],
     description="Подводит итоги Nagging анализа.",
     instruction=(
@@ -325,11 +320,11 @@ nagging_browser_loop = LoopAgent(
     max_iterations=MAX_LOOP_ITERS,
     after_agent_callback=nagging_after_loop_callback,
 )
-nagging_root_agent = SequentialAgent(
+nagging_root_agent = instrument(SequentialAgent(
     name="nagging_pipeline",
     description="Полный пайплайн для детектирования Nagging паттерна (назойливые интерстициалы).",
     sub_agents=[
         nagging_ingest_agent,
         nagging_browser_loop,
     ],
-)
\ No newline at end of file
+))
\ No newline at end of file
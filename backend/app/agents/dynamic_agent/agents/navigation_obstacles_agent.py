@@ -5,21 +5,13 @@ from typing import Optional, Any, Dict
 from google.adk.agents import Agent, SequentialAgent, LoopAgent
 from google.adk.agents.callback_context import CallbackContext
 from google.genai import types
-from google.adk.tools.mcp_tool.mcp_toolset import (
-    MCPToolset,
-    StreamableHTTPConnectionParams,
-)
 from google.adk.tools.tool_context import ToolContext
-from app.utils.llmproxy import GeminiLLM
-LLM = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))        
-LLM_FLASH = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-LLM_LITE = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-MCP_SSE_URL = os.getenv("BROWSER_MCP", "localhost")
-toolset = MCPToolset(
-    connection_params=StreamableHTTPConnectionParams(
-        url=MCP_SSE_URL,
-    )
-)
+from app.agents.dynamic_agent.utils.model_router import model_for
+from app.agents.dynamic_agent.utils.structured_output import JSON_RESPONSE
+from app.agents.dynamic_agent.agent_utils.schema import DeciderOut, CriticOut
+from app.agents.dynamic_agent.utils.callbacks import instrument
+from app.agents.dynamic_agent.utils.mcp_pool import mcp_toolset
+toolset = mcp_toolset()
 MAX_LOOP_ITERS = int(os.getenv("BROWSER_PIPELINE_ITERS", "14"))
 def finish(
     summary: Optional[str] = None,
@@ -38,7 +30,7 @@ def finish(
     return {"status": "ok", "escalated": True}
 navigation_obstacles_ingest_agent = Agent(
     name="navigation_obstacles_ingest_agent",
-    model=LLM,
+    model=model_for("ingest"),
     description="Нормализует запрос для детектирования паттерна 'Navigation Obstacles' - препятствий для сравнения.",
     instruction=(
         "Ты — Ingest агент для детектирования NAVIGATION OBSTACLES паттерна. Создай план тестирования препятствий сравнения.\n\n"
@@ -81,7 +73,8 @@ navigation_obstacles_ingest_agent = Agent(
 )
 navigation_obstacles_decider_agent = Agent(
     name="navigation_obstacles_decider_agent",
-    model=LLM_LITE,
+    model=model_for("decider"),
+    output_schema=DeciderOut,
     tools=[finish],
     description="Определяет следующий шаг для детектирования Navigation Obstacles паттерна.",
     instruction=(
@@ -111,7 +104,7 @@ navigation_obstacles_decider_agent = Agent(
 )
 navigation_obstacles_navigator_agent = Agent(
     name="navigation_obstacles_navigator_agent",
-    model=LLM_FLASH,
+    model=model_for("navigator"),
     tools=[toolset],
     description="Навигация для поиска и тестирования информационных барьеров.",
     instruction=(
@@ -154,7 +147,7 @@ navigation_obstacles_navigator_agent = Agent(
 )
 navigation_obstacles_form_filler_agent = Agent(
     name="navigation_obstacles_form_filler_agent",
-    model=LLM_FLASH,
+    model=model_for("form_filler"),
     tools=[toolset],
     description="Тестирует различные navigation scenarios и accessibility barriers.",
     instruction=(
@@ -202,7 +195,8 @@ navigation_obstacles_form_filler_agent = Agent(
 )
 navigation_obstacles_parser_agent = Agent(
     name="navigation_obstacles_parser_agent",
-    model=LLM_FLASH,
+    model=model_for("parser"),
+    generate_content_config=JSON_RESPONSE,
     description="Анализирует препятствия для доступа к информации и сравнения.",
     instruction=(
         "Ты — парсер для NAVIGATION OBSTACLES анализа.\n"
@@ -254,7 +248,8 @@ navigation_obstacles_parser_agent = Agent(
 )
 navigation_obstacles_critic_agent = Agent(
     name="navigation_obstacles_critic_agent",
-    model=LLM,
+    model=model_for("critic"),
+    output_schema=CriticOut,
     tools=[finish],
     description="Проверяет завершенность Navigation Obstacles анализа.",
     instruction=(
@@ -282,7 +277,7 @@ navigation_obstacles_critic_agent = Agent(
 )
 navigation_obstacles_result_agent = Agent(
     name="navigation_obstacles_result_agent",
-    model=LLM,
+    model=model_for("result"),
     tools=[finish],
     description="Подводит итоги Navigation Obstacles анализа.",
     instruction=(
@@ -388,11 +383,11 @@ navigation_obstacles_browser_loop = LoopAgent(
     max_iterations=MAX_LOOP_ITERS,
     after_agent_callback=navigation_obstacles_after_loop_callback,
 )
-navigation_obstacles_root_agent = SequentialAgent(
+navigation_obstacles_root_agent = instrument(SequentialAgent(
     name="navigation_obstacles_pipeline",
     description="Полный пайплайн для детектирования Navigation Obstacles паттерна (препятствия для сравнения).",
     sub_agents=[
         navigation_obstacles_ingest_agent,
         navigation_obstacles_browser_loop,
     ],
-)
\ No newline at end of file
+))
\ No newline at end of file
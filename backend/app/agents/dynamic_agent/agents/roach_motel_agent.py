@@ -5,21 +5,13 @@ from typing import Optional, Any, Dict
 from google.adk.agents import Agent, SequentialAgent, LoopAgent
 from google.adk.agents.callback_context import CallbackContext
 from google.genai import types
-from google.adk.tools.mcp_tool.mcp_toolset import (
-    MCPToolset,
-    StreamableHTTPConnectionParams,
-)
 from google.adk.tools.tool_context import ToolContext
-from app.utils.llmproxy import GeminiLLM
-LLM = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))        # планирование/критика/итоги
-LLM_FLASH = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-LLM_LITE = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-MCP_SSE_URL = os.getenv("BROWSER_MCP", "localhost")
-toolset = MCPToolset(
-    connection_params=StreamableHTTPConnectionParams(
-        url=MCP_SSE_URL,
-    )
-)
+from app.agents.dynamic_agent.utils.model_router import model_for
+from app.agents.dynamic_agent.utils.structured_output import JSON_RESPONSE
+from app.agents.dynamic_agent.agent_utils.schema import DeciderOut, CriticOut
+from app.agents.dynamic_agent.utils.callbacks import instrument
+from app.agents.dynamic_agent.utils.mcp_pool import mcp_toolset
+toolset = mcp_toolset()
 MAX_LOOP_ITERS = int(os.getenv("BROWSER_PIPELINE_ITERS", "15"))
 def finish(
     summary: Optional[str] = None,
@@ -38,7 +30,7 @@ def finish(
     return {"status": "ok", "escalated": True}
 roach_motel_ingest_agent = Agent(
     name="roach_motel_ingest_agent",
-    model=LLM,
+    model=model_for("ingest"),
     description="Нормализует запрос для детектирования паттерна 'Roach Motel' - асимметрии между подпиской и отменой.",
     instruction=(
         "Ты — Ingest агент для детектирования паттерна ROACH MOTEL. На основе запроса пользователя создай план тестирования асимметрии действий.\n\n"
@@ -80,7 +72,8 @@ roach_motel_ingest_agent = Agent(
 )
 roach_motel_decider_agent = Agent(
     name="roach_motel_decider_agent",
-    model=LLM_LITE,
+    model=model_for("decider"),
+    output_schema=DeciderOut,
     tools=[finish],
     description="Определяет следующий шаг для детектирования Roach Motel паттерна.",
     instruction=(
@@ -109,7 +102,7 @@ roach_motel_decider_agent = Agent(
 )
 roach_motel_navigator_agent = Agent(
     name="roach_motel_navigator_agent",
-    model=LLM_FLASH,
+    model=model_for("navigator"),
     tools=[toolset],
     description="Навигация для тестирования Roach Motel паттерна.",
     instruction=(
@@ -132,7 +125,7 @@ roach_motel_navigator_agent = Agent(
 )
 roach_motel_form_filler_agent = Agent(
     name="roach_motel_form_filler_agent",
-    model=LLM_FLASH,
+    model=model_for("form_filler"),
     tools=[toolset],
     description="Выполняет действия для тестирования Roach Motel паттерна, считает шаги.",
     instruction=(
@@ -161,7 +154,8 @@ roach_motel_form_filler_agent = Agent(
 )
 roach_motel_parser_agent = Agent(
     name="roach_motel_parser_agent",
-    model=LLM_FLASH,
+    model=model_for("parser"),
+    generate_content_config=JSON_RESPONSE,
     description="Извлекает и рассчитывает метрики Roach Motel паттерна.",
     instruction=(
         "Ты — парсер для ROACH MOTEL анализа.\n"
@@ -194,7 +188,8 @@ roach_motel_parser_agent = Agent(
 )
 roach_motel_critic_agent = Agent(
     name="roach_motel_critic_agent",
-    model=LLM,
+    model=model_for("critic"),
+    output_schema=CriticOut,
     tools=[finish],
     description="Проверяет завершенность Roach Motel анализа.",
     instruction=(
@@ -216,7 +211,7 @@ roach_motel_critic_agent = Agent(
 )
 roach_motel_result_agent = Agent(
     name="roach_motel_result_agent",
-    model=LLM,
+    model=model_for("result"),
     tools=[finish],
     description="Подводит итоги Roach Motel анализа.",
     instruction=(
@@ -290,11 +285,11 @@ roach_motel_browser_loop = LoopAgent(
     max_iterations=MAX_LOOP_ITERS,
     after_agent_callback=roach_motel_after_loop_callback,
 )
-roach_motel_root_agent = SequentialAgent(
+roach_motel_root_agent = instrument(SequentialAgent(
     name="roach_motel_pipeline",
     description="Полный пайплайн для детектирования Roach Motel паттерна (асимметрия подписка/отмена).",
     sub_agents=[
         roach_motel_ingest_agent,
         roach_motel_browser_loop,
     ],
-)
\ No newline at end of file
+))
\ No newline at end of file
@@ -5,21 +5,13 @@ from typing import Optional, Any, Dict
 from google.adk.agents import Agent, SequentialAgent, LoopAgent
 from google.adk.agents.callback_context import CallbackContext
 from google.genai import types
-from google.adk.tools.mcp_tool.mcp_toolset import (
-    MCPToolset,
-    StreamableHTTPConnectionParams,
-)
 from google.adk.tools.tool_context import ToolContext
-from app.utils.llmproxy import GeminiLLM
-LLM = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))        
-LLM_FLASH = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-LLM_LITE = GeminiLLM(model=os.getenv("BROWSER_LLM", "gemini-2.5-pro"))
-MCP_SSE_URL = os.getenv("BROWSER_MCP", "localhost")
-toolset = MCPToolset(
-    connection_params=StreamableHTTPConnectionParams(
-        url=MCP_SSE_URL,
-    )
-)
+from app.agents.dynamic_agent.utils.model_router import model_for
+from app.agents.dynamic_agent.utils.structured_output import JSON_RESPONSE
+from app.agents.dynamic_agent.agent_utils.schema import DeciderOut, CriticOut
+from app.agents.dynamic_agent.utils.callbacks import instrument
+from app.agents.dynamic_agent.utils.mcp_pool import mcp_toolset
+toolset = mcp_toolset()
 MAX_LOOP_ITERS = int(os.getenv("BROWSER_PIPELINE_ITERS", "16"))
 def finish(
     summary: Optional[str] = None,
@@ -38,7 +30,7 @@ def finish(
     return {"status": "ok", "escalated": True}
 sneak_into_basket_ingest_agent = Agent(
     name="sneak_into_basket_ingest_agent",
-    model=LLM,
+    model=model_for("ingest"),
     description="Нормализует запрос для детектирования паттерна 'Sneak Into Basket' - предвыбранных платных опций.",
     instruction=(
         "Ты — Ingest агент для детектирования SNEAK INTO BASKET паттерна. Создай план тестирования предварительно выбранных опций.\n\n"
@@ -82,7 +74,8 @@ sneak_into_basket_ingest_agent = Agent(
 )
 sneak_into_basket_decider_agent = Agent(
     name="sneak_into_basket_decider_agent",
-    model=LLM_LITE,
+    model=model_for("decider"),
+    output_schema=DeciderOut,
     tools=[finish],
     description="Определяет следующий шаг для детектирования Sneak Into Basket паттерна.",
     instruction=(
@@ -112,7 +105,7 @@ sneak_into_basket_decider_agent = Agent(
 )
 sneak_into_basket_navigator_agent = Agent(
     name="sneak_into_basket_navigator_agent",
-    model=LLM_FLASH,
+    model=model_for("navigator"),
     tools=[toolset],
     description="Навигация для поиска и анализа предвыбранных опций.",
     instruction=(
@@ -144,7 +137,7 @@ sneak_into_basket_navigator_agent = Agent(
 )
 sneak_into_basket_form_filler_agent = Agent(
     name="sneak_into_basket_form_filler_agent",
-    model=LLM_FLASH,
+    model=model_for("form_filler"),
     tools=[toolset],
     description="Взаимодействует с чекбоксами и опциями для тестирования предварительных выборов.",
     instruction=(
@@ -184,7 +177,8 @@ sneak_into_basket_form_filler_agent = Agent(
 )
 sneak_into_basket_parser_agent = Agent(
     name="sneak_into_basket_parser_agent",
-    model=LLM_FLASH,
+    model=model_for("parser"),
+    generate_content_config=JSON_RESPONSE,
     description="Анализирует предвыбранные опции и их влияние на цену.",
     instruction=(
         "Ты — парсер для SNEAK INTO BASKET анализа.\n"
@@ -229,7 +223,8 @@ sneak_into_basket_parser_agent = Agent(
 )
 sneak_into_basket_critic_agent = Agent(
     name="sneak_into_basket_critic_agent",
-    model=LLM,
+    model=model_for("critic"),
+    output_schema=CriticOut,
     tools=[finish],
     description="Проверяет завершенность Sneak Into Basket анализа.",
     instruction=(
@@ -257,7 +252,7 @@ sneak_into_basket_critic_agent = Agent(
 )
 sneak_into_basket_result_agent = Agent(
     name="sneak_into_basket_result_agent",
-    model=LLM,
+    model=model_for("result"),
     tools=[finish],
     description="Подводит итоги Sneak Into Basket анализа.",
     instruction=(
@@ -343,11 +338,11 @@ sneak_into_basket_browser_loop = LoopAgent(
     max_iterations=MAX_LOOP_ITERS,
     after_agent_callback=sneak_into_basket_after_loop_callback,
 )
-sneak_into_basket_root_agent = SequentialAgent(
+sneak_into_basket_root_agent = instrument(SequentialAgent(
     name="sneak_into_basket_pipeline",
     description="Полный пайплайн для детектирования Sneak Into Basket паттерна (предвыбранные платные опции).",
     sub_agents=[
         sneak_into_basket_ingest_agent,
         sneak_into_basket_browser_loop,
     ],
-)
\ No newline at end of file
+))
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""
+Declarative registry of the dark-pattern detectors.
+Agent graphs are built on first use and memoized per process, so importing
+the registry (the API, Celery task modules) does not construct any of the
+12 pipelines.
+"""
+import importlib
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Tuple, TYPE_CHECKING
+if TYPE_CHECKING:
+    from google.adk.agents import BaseAgent
+@dataclass(frozen=True)
+class Detector:
+    name: str
+    title: str
+    module: str
+    attr: str
+    queue: str = "browser"
+    cost_class: str = "medium"  # low | medium | high: loop length and flow depth
+    signals: Tuple[str, ...] = ()  # triage runs it only if the site shows one of these; () = always
+    def request(self, url: str) -> str:
+        return f"Test {url} for {self.title} pattern"
+def _detector(name: str, title: str, cost_class: str, signals: Tuple[str, ...] = ()) -> Detector:
+    return Detector(
+        name=name,
+        title=title,
+        module=f"app.agents.dynamic_agent.agents.{name}_agent",
+        attr=f"{name}_root_agent",
+        cost_class=cost_class,
+        signals=signals,
+    )
+DETECTORS: Dict[str, Detector] = {d.name: d for d in (
+    _detector("roach_motel", "Roach Motel", "high", ("subscription", "signup", "account", "cancel")),
+    _detector("fake_urgency", "Fake Urgency", "high", ("timer", "cart", "pricing")),
+    _detector("fake_scarcity", "Fake Scarcity", "high", ("scarcity", "cart", "pricing")),
+    _detector("drip_pricing", "Drip Pricing", "high", ("cart", "pricing")),
+    _detector("hidden_subscription", "Hidden Subscription", "medium", ("subscription", "pricing", "signup")),
+    _detector("sneak_into_basket", "Sneak Into Basket", "medium", ("cart",)),
+    _detector("bait_and_switch", "Bait And Switch", "low", ("pricing", "cart")),
+    _detector("confirmshaming", "Confirmshaming", "low", ("forms", "signup", "subscription", "popup")),
+    _detector("forced_actions", "Forced Actions", "low", ("signup", "account", "forms", "cart")),
+    _detector("nagging", "Nagging", "high"),
+    _detector("navigation_obstacles", "Navigation Obstacles", "low"),
+    _detector("currency_manipulation", "Currency Manipulation", "medium", ("currency", "pricing")),
+)}
+_agents: Dict[str, "BaseAgent"] = {}
+_lock = threading.Lock()
+def detector_names() -> List[str]:
+    return list(DETECTORS)
+def get_detector(name: str) -> Detector:
+    try:
+        return DETECTORS[name]
+    except KeyError:
+        raise ValueError(f"Unknown pattern type {name!r}. Available: {', '.join(DETECTORS)}") from None
+def root_agent(name: str) -> "BaseAgent":
+    """The detector's root agent, imported and built on first use"""
+    agent = _agents.get(name)
+    if agent is None:
+        detector = get_detector(name)
+        with _lock:
+            agent = _agents.get(name)
+            if agent is None:
+                agent = _agents[name] = getattr(importlib.import_module(detector.module), detector.attr)
+    return agent
+def loaded() -> List[str]:
+    return list(_agents)
@@ -0,0 +1,121 @@
+"""
+Runs detector pipelines through the ADK async runner.
+`run_agent` is the synchronous entry point for Celery tasks: the scan runs as
+one coroutine on the process-wide runtime loop (`app.agents.runtime`), so a
+worker started with `-P threads -c N` drives up to AGENT_CONCURRENCY scans at
+once instead of blocking a prefork process per scan.
+"""
+import os
+import uuid
+import asyncio
+import logging
+from contextlib import aclosing
+from typing import Any, Callable, Dict, Optional
+from google.genai import types
+from app.agents import runtime
+from app.agents.dynamic_agent.utils import budget as budgets, cancellation, progress
+logger = logging.getLogger(__name__)
+APP_NAME = "apru_transparency"
+USER_ID = "worker"
+AGENT_CONCURRENCY = int(os.getenv("AGENT_CONCURRENCY", "16"))
+AGENT_RUN_TIMEOUT = float(os.getenv("AGENT_RUN_TIMEOUT", "3600"))
+_runners: Dict[str, Any] = {}
+_slots: Optional[asyncio.Semaphore] = None
+_running: set = set()
+def _runner(agent):
+    runner = _runners.get(agent.name)
+    if runner is None:
+        from google.adk.runners import InMemoryRunner
+        runner = _runners[agent.name] = InMemoryRunner(agent=agent, app_name=APP_NAME)
+    return runner
+def _run_slots() -> asyncio.Semaphore:
+    """Process-wide cap on concurrent scans; they all run on the one runtime loop"""
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(AGENT_CONCURRENCY)
+    return _slots
+def is_running(session_id: str) -> bool:
+    """Whether an ADK session is a scan still in progress; its browser must not be taken away"""
+    return session_id in _running
+async def run_agent_async(
+    agent,
+    state: Dict[str, Any],
+    message: Optional[str] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+    progress_channel: Optional[progress.ProgressChannel] = None,
+    budget: Optional[budgets.Budget] = None,
+) -> Dict[str, Any]:
+    """Run one scan to completion and return the final session state.
+    `should_stop` is polled cooperatively (see utils/cancellation.py); when it
+    returns True the run is abandoned and ScanCancelled is raised.
+    `progress_channel` receives per-iteration progress (see utils/progress.py).
+    `budget` bounds tokens, time and browser actions (see utils/budget.py).
+    """
+    runner = _runner(agent)
+    session_id = uuid.uuid4().hex
+    text = message or state.get("request") or "Start"
+    final_state: Dict[str, Any] = dict(state)
+    cancelled = False
+    async with _run_slots():
+        await runner.session_service.create_session(
+            app_name=APP_NAME, user_id=USER_ID, state=dict(state), session_id=session_id,
+        )
+        _running.add(session_id)
+        if should_stop is not None:
+            cancellation.watch(session_id, should_stop)
+        if progress_channel is not None:
+            progress.attach(session_id, progress_channel)
+        if budget is not None:
+            budgets.attach(session_id, budget)
+        try:
+            events = runner.run_async(
+                user_id=USER_ID,
+                session_id=session_id,
+                new_message=types.Content(role="user", parts=[types.Part(text=text)]),
+            )
+            async with aclosing(events):
+                async for event in events:
+                    if event.error_message:
+                        logger.warning("Agent %s reported an error: %s", agent.name, event.error_message)
+                    if should_stop is not None and await cancellation.is_cancelled(session_id):
+                        cancelled = True
+                        break
+            session = await runner.session_service.get_session(
+                app_name=APP_NAME, user_id=USER_ID, session_id=session_id,
+            )
+            if session is not None:
+                final_state = dict(session.state)
+        finally:
+            _running.discard(session_id)
+            cancellation.unwatch(session_id)
+            progress.detach(session_id)
+            budgets.detach(session_id)
+            await _release_scan(session_id, final_state, "cancelled" if cancelled else "finished")
+            await runner.session_service.delete_session(app_name=APP_NAME, user_id=USER_ID, session_id=session_id)
+    if cancelled:
+        raise cancellation.ScanCancelled(f"{agent.name} cancelled")
+    return final_state
+async def _release_scan(session_id: str, state: Dict[str, Any], reason: str) -> None:
+    """Free the scan's browser: its MCP session and any in-process browser context left open"""
+    from app.agents.dynamic_agent.utils.mcp_pool import mcp_toolset
+    try:
+        await mcp_toolset().release(session_id)
+    except Exception as ex:
+        logger.debug("MCP lease for %s not released: %r", session_id, ex)
+    browser_sid = state.get("__browser_sid__")
+    if browser_sid:
+        try:
+            from app.agents.dynamic_agent.tools.browser_tools import _close_session
+            await _close_session(browser_sid, reason)
+        except Exception as ex:
+            logger.debug("Browser session %s not closed: %r", browser_sid, ex)
+def run_agent(
+    agent,
+    state: Dict[str, Any],
+    message: Optional[str] = None,
+    timeout: float = AGENT_RUN_TIMEOUT,
+    should_stop: Optional[Callable[[], bool]] = None,
+    progress_channel: Optional[progress.ProgressChannel] = None,
+    budget: Optional[budgets.Budget] = None,
+) -> Dict[str, Any]:
+    return runtime.run(run_agent_async(agent, state, message, should_stop, progress_channel, budget), timeout=timeout)
@@ -0,0 +1,208 @@
+from __future__ import annotations
+"""
+Процесс-локальный пул заранее запущенных Chromium для browser_tools.
+- Браузеры запускаются один раз (и прогреваются заранее), сессия получает
+  свежий BrowserContext с изолированным хранилищем (cookies, localStorage,
+  кэш) — это десятки миллисекунд вместо секунд на запуск Chromium.
+- На один браузер не больше PLAYWRIGHT_POOL_MAX_CONTEXTS контекстов; когда все
+  заняты и лимит браузеров исчерпан, acquire() ждёт освобождения.
+- После PLAYWRIGHT_POOL_RECYCLE_AFTER выданных контекстов браузер уходит на
+  пересоздание: новых контекстов не получает и закрывается, когда освободится.
+- Упавший/отключившийся браузер исключается из пула при проверке здоровья.
+Объекты Playwright привязаны к event loop, поэтому пул — один на loop.
+"""
+import os
+import time
+import pathlib
+import asyncio
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Any, List
+POOL_BROWSERS = int(os.getenv("PLAYWRIGHT_POOL_BROWSERS", "2"))
+POOL_MAX_CONTEXTS = int(os.getenv("PLAYWRIGHT_POOL_MAX_CONTEXTS", "4"))
+POOL_RECYCLE_AFTER = int(os.getenv("PLAYWRIGHT_POOL_RECYCLE_AFTER", "50"))
+POOL_WARM = int(os.getenv("PLAYWRIGHT_POOL_WARM", "1"))
+POOL_WAIT_SECONDS = float(os.getenv("PLAYWRIGHT_POOL_WAIT", "60"))
+LAUNCH_ARGS = ["--no-sandbox", "--disable-gpu", "--disable-dev-shm-usage", "--window-size=1920,1080"]
+@dataclass
+class PooledBrowser:
+    browser: Any
+    launched_at: float = field(default_factory=time.time)
+    active: int = 0
+    served: int = 0
+    retiring: bool = False
+    @property
+    def healthy(self) -> bool:
+        try:
+            return bool(self.browser.is_connected())
+        except Exception:
+            return False
+class BrowserPool:
+    def __init__(
+        self,
+        headless: bool = True,
+        max_browsers: int = POOL_BROWSERS,
+        max_contexts: int = POOL_MAX_CONTEXTS,
+        recycle_after: int = POOL_RECYCLE_AFTER,
+    ):
+        self.headless = headless
+        self.max_browsers = max(1, max_browsers)
+        self.max_contexts = max(1, max_contexts)
+        self.recycle_after = max(1, recycle_after)
+        self._pw = None
+        self._browsers: List[PooledBrowser] = []
+        self._owners: Dict[int, PooledBrowser] = {}
+        self._cond = asyncio.Condition()
+        self._closed = False
+    async def _playwright(self):
+        if self._pw is None:
+            from playwright.async_api import async_playwright
+            self._pw = await async_playwright().start()
+        return self._pw
+    async def _launch(self) -> PooledBrowser:
+        pw = await self._playwright()
+        browser = await pw.chromium.launch(headless=self.headless, args=LAUNCH_ARGS)
+        pooled = PooledBrowser(browser=browser)
+        self._browsers.append(pooled)
+        return pooled
+    def _drop_unhealthy(self) -> None:
+        for pooled in [b for b in self._browsers if not b.healthy]:
+            self._browsers.remove(pooled)
+    async def warm(self, count: int = POOL_WARM) -> int:
+        """Заранее запускает браузеры, чтобы первая сессия не ждала Chromium"""
+        async with self._cond:
+            self._drop_unhealthy()
+            while len(self._browsers) < min(count, self.max_browsers):
+                await self._launch()
+            return len(self._browsers)
+    def _pick(self) -> Optional[PooledBrowser]:
+        candidates = [b for b in self._browsers if b.healthy and not b.retiring and b.active < self.max_contexts]
+        # Плотнее загружаем уже занятые браузеры — свободные проще пересоздать.
+        return max(candidates, key=lambda b: b.active, default=None)
+    async def acquire(self, **context_options) -> Any:
+        """Возвращает новый изолированный BrowserContext из пула"""
+        deadline = time.monotonic() + POOL_WAIT_SECONDS
+        async with self._cond:
+            if self._closed:
+                raise RuntimeError("browser pool is closed")
+            while True:
+                self._drop_unhealthy()
+                pooled = self._pick()
+                if pooled is None and len(self._browsers) < self.max_browsers:
+                    pooled = await self._launch()
+                if pooled is not None:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"no free browser context within {POOL_WAIT_SECONDS:.0f}s")
+                try:
+                    await asyncio.wait_for(self._cond.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+            pooled.active += 1
+            pooled.served += 1
+            if pooled.served >= self.recycle_after:
+                pooled.retiring = True
+        try:
+            context = await pooled.browser.new_context(**context_options)
+        except Exception:
+            await self._finish(pooled)
+            raise
+        self._owners[id(context)] = pooled
+        return context
+    async def release(self, context: Any) -> None:
+        """Закрывает контекст (вместе с его хранилищем) и возвращает место в пул"""
+        pooled = self._owners.pop(id(context), None)
+        try:
+            await context.close()
+        except Exception:
+            pass
+        if pooled is not None:
+            await self._finish(pooled)
+    async def _finish(self, pooled: PooledBrowser) -> None:
+        async with self._cond:
+            pooled.active = max(0, pooled.active - 1)
+            if (pooled.retiring or not pooled.healthy) and pooled.active == 0:
+                if pooled in self._browsers:
+                    self._browsers.remove(pooled)
+                try:
+                    await pooled.browser.close()
+                except Exception:
+                    pass
+            self._cond.notify_all()
+    async def close(self) -> None:
+        async with self._cond:
+            self._closed = True
+            for pooled in self._browsers:
+                try:
+                    await pooled.browser.close()
+                except Exception:
+                    pass
+            self._browsers.clear()
+            self._owners.clear()
+            if self._pw is not None:
+                try:
+                    await self._pw.stop()
+                except Exception:
+                    pass
+                self._pw = None
+    def stats(self) -> dict:
+        return {
+            "browsers": len(self._browsers),
+            "contexts": sum(b.active for b in self._browsers),
+            "served": sum(b.served for b in self._browsers),
+            "retiring": sum(1 for b in self._browsers if b.retiring),
+        }
+_POOLS: Dict[int, tuple[asyncio.AbstractEventLoop, BrowserPool]] = {}
+def get_pool(headless: bool = True) -> BrowserPool:
+    loop = asyncio.get_running_loop()
+    for key, (owner, _) in list(_POOLS.items()):
+        if owner.is_closed():
+            _POOLS.pop(key, None)
+    entry = _POOLS.get(id(loop))
+    if entry is None or entry[1]._closed:
+        entry = _POOLS[id(loop)] = (loop, BrowserPool(headless=headless))
+    return entry[1]
+def pool_stats() -> List[dict]:
+    return [pool.stats() for owner, pool in _POOLS.values() if not owner.is_closed()]
+def _proc_tree() -> Dict[int, List[int]]:
+    children: Dict[int, List[int]] = {}
+    for stat in pathlib.Path("/proc").glob("[0-9]*/stat"):
+        try:
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        children.setdefault(int(fields[1]), []).append(int(stat.parent.name))
+    return children
+def _rss_mb(pid: int) -> float:
+    try:
+        for line in pathlib.Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+def chromium_rss() -> List[dict]:
+    """
+    RSS (МБ) каждого Chromium, запущенного этим процессом, вместе с его
+    renderer/gpu/utility-процессами. Только Linux (/proc), иначе пусто.
+    """
+    if not pathlib.Path("/proc/self/stat").exists():
+        return []
+    children = _proc_tree()
+    def descendants(pid: int) -> List[int]:
+        out = []
+        for child in children.get(pid, []):
+            out.append(child)
+            out.extend(descendants(child))
+        return out
+    browsers = []
+    for pid in descendants(os.getpid()):
+        try:
+            cmdline = pathlib.Path(f"/proc/{pid}/cmdline").read_bytes().split(b"\0")
+        except OSError:
+            continue
+        name = os.path.basename(cmdline[0].decode(errors="ignore")) if cmdline and cmdline[0] else ""
+        if "chrom" in name and not any(arg.startswith(b"--type=") for arg in cmdline):
+            rss = _rss_mb(pid) + sum(_rss_mb(child) for child in descendants(pid))
+            browsers.append({"pid": pid, "rss_mb": round(rss, 1)})
+    return browsers
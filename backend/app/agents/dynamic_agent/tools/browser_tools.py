@@ -4,8 +4,16 @@ from __future__ import annotations
 с хранением состояния в ToolContext.
 Ключевые отличия:
 - Используется playwright.async_api (полностью async).
-- Экземпляры Playwright/Browser/Context/Page резолвятся через ToolContext
-  и процесс-локальный реестр по session id.
+- Экземпляры Context/Page резолвятся через ToolContext и процесс-локальный
+  реестр по session id; Chromium берётся из пула прогретых браузеров
+  (browser_pool), каждая сессия получает свой изолированный BrowserContext.
+- Реестр ограничен: сессии, простаивающие дольше PLAYWRIGHT_SESSION_IDLE_TTL,
+  закрывает фоновый reaper; при превышении PLAYWRIGHT_MAX_SESSIONS (по
+  умолчанию AGENT_CONCURRENCY) вытесняется давно не использованная (LRU).
+  Сессию идущего прогона не вытесняем никогда — лимит тогда мягкий. Сессии с
+  уже закрытого event loop (упавший/брошенный прогон) выбрасываются из реестра.
+- Тяжёлые ресурсы (медиа, шрифты, картинки, трекеры) отменяются по политике
+  детектора (request_policy); скриншот включает картинки для сессии.
 - В tool_context.state кладём только строковый sid (__browser_sid__), а сами
   объекты живут в процесс-локальном реестре _REGISTRY.
 - Если среда не позволяет поднять браузер, инструменты возвращают
@@ -13,59 +21,155 @@ from __future__ import annotations
 Экспортируемые инструменты (все async):
 - open_url(url, tool_context)
 - get_html(limit=200_000, tool_context)
+- get_page_digest(max_bytes=20_000, tool_context) — компактная выжимка видимого DOM
 - get_current_url(tool_context)
 - scroll_by(pixels=800, tool_context)
 - click_text(text, exact=False, tool_context)
 - click_css(selector, tool_context)
 - type_css(selector, text, clear=True, tool_context)
-- take_screenshot(tool_context)
+- take_screenshot(selector=None, format="jpeg", max_dim=1280, tool_context)
 - browser_shutdown(tool_context)
+Статистика реестра и пула — browser_stats().
 """
 import os
 import time
 import uuid
-import pathlib
 import asyncio
-from dataclasses import dataclass
+from collections import Counter
+from dataclasses import dataclass, field
 from typing import Optional, Dict, Any, Tuple
 from google.adk.tools import ToolContext
 from google.genai.types import Part
+from .browser_pool import BrowserPool, get_pool, pool_stats, chromium_rss
+from .request_policy import RoutingPolicy, RouteStats, policy_for, install_routing, record_page_load, route_stats
+from .page_digest import DIGEST_JS, DEFAULT_LIMITS, fit_to_budget
+from .screenshots import SCREENSHOT_MAX_DIM, SCREENSHOT_QUALITY, capture_type, encode, is_near_duplicate
+from ..runner import AGENT_CONCURRENCY, is_running
+from ..utils.roles import agent_detector
 HEADLESS = os.getenv("PLAYWRIGHT_HEADLESS", "true").strip().lower() in ("1", "true", "yes")
 USER_AGENT = os.getenv("PLAYWRIGHT_UA", "Mozilla/5.0 (compatible; SEOAgent/1.0)")
 VIEWPORT = (1920, 1080)
+SESSION_IDLE_TTL = float(os.getenv("PLAYWRIGHT_SESSION_IDLE_TTL", "600"))
+MAX_SESSIONS = int(os.getenv("PLAYWRIGHT_MAX_SESSIONS", str(AGENT_CONCURRENCY)))
+REAPER_INTERVAL = float(os.getenv("PLAYWRIGHT_REAPER_INTERVAL", "30"))
 @dataclass
 class _BrowserSession:
-    pw: Any
-    browser: Any
     context: Any
     page: Any
+    pool: BrowserPool
+    loop: asyncio.AbstractEventLoop
+    policy: RoutingPolicy = field(default_factory=RoutingPolicy)
+    routing: RouteStats = field(default_factory=RouteStats)
+    created_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+    last_frame: Optional[Tuple[str, str]] = None
+    owner: Optional[str] = None  # id ADK-сессии прогона, которому принадлежит браузер
 _REGISTRY: Dict[str, _BrowserSession] = {}
+_EVICTIONS: Counter = Counter()
+_REAPERS: Dict[int, asyncio.Task] = {}
 def _disabled(reason: str) -> dict:
     return {"status": "disabled", "enabled": False, "message": reason}
+async def _close_session(sid: str, reason: str) -> None:
+    sess = _REGISTRY.pop(sid, None)
+    if sess is None:
+        return
+    if reason != "shutdown":
+        _EVICTIONS[reason] += 1
+    if sess.loop is asyncio.get_running_loop():
+        await sess.pool.release(sess.context)
+def _drop_orphans() -> None:
+    """Сессии закрытых event loop'ов уже не закрыть — только забыть"""
+    for sid, sess in list(_REGISTRY.items()):
+        if sess.loop.is_closed():
+            _REGISTRY.pop(sid, None)
+            _EVICTIONS["orphaned"] += 1
+async def _reap_idle() -> None:
+    _drop_orphans()
+    loop = asyncio.get_running_loop()
+    now = time.time()
+    for sid, sess in list(_REGISTRY.items()):
+        if sess.loop is loop and now - sess.last_used > SESSION_IDLE_TTL:
+            await _close_session(sid, "idle")
+async def _evict_lru() -> None:
+    """Освобождает место под новую сессию, вытесняя давно не использованные"""
+    _drop_orphans()
+    loop = asyncio.get_running_loop()
+    while len(_REGISTRY) >= MAX_SESSIONS:
+        own = [
+            (sess.last_used, sid) for sid, sess in _REGISTRY.items()
+            if sess.loop is loop and not (sess.owner and is_running(sess.owner))
+        ]
+        if not own:
+            break
+        await _close_session(min(own)[1], "lru")
+async def _reaper_loop() -> None:
+    loop = asyncio.get_running_loop()
+    try:
+        while any(sess.loop is loop for sess in _REGISTRY.values()):
+            await asyncio.sleep(REAPER_INTERVAL)
+            await _reap_idle()
+    finally:
+        _REAPERS.pop(id(loop), None)
+def _ensure_reaper() -> None:
+    loop = asyncio.get_running_loop()
+    task = _REAPERS.get(id(loop))
+    if task is None or task.done():
+        _REAPERS[id(loop)] = loop.create_task(_reaper_loop())
+def browser_stats() -> dict:
+    _drop_orphans()
+    now = time.time()
+    return {
+        "live_sessions": len(_REGISTRY),
+        "max_sessions": MAX_SESSIONS,
+        "oldest_idle_seconds": round(max((now - s.last_used for s in _REGISTRY.values()), default=0), 1),
+        "evictions": dict(_EVICTIONS),
+        "pools": pool_stats(),
+        "routing": route_stats(),
+        "browsers_rss_mb": chromium_rss(),
+    }
+def _owner_of(tool_context: ToolContext) -> Optional[str]:
+    try:
+        return tool_context._invocation_context.session.id
+    except AttributeError:
+        return None
 async def _get_or_create_session(tool_context: ToolContext) -> Tuple[Optional[_BrowserSession], dict]:
     """
     Возвращает (session, meta). При невозможности — (None, {"status":"disabled", ...})
     """
     sid = tool_context.state.get("__browser_sid__")
     if sid and sid in _REGISTRY:
-        return _REGISTRY[sid], {"reused": True, "sid": sid}
+        sess = _REGISTRY[sid]
+        if sess.loop is asyncio.get_running_loop():
+            sess.last_used = time.time()
+            return sess, {"reused": True, "sid": sid}
+        _REGISTRY.pop(sid, None)
+        _EVICTIONS["orphaned"] += 1
     try:
         from playwright.async_api import async_playwright
     except Exception as ex:
         return None, _disabled(f"Playwright недоступен: {ex!r}")
     try:
-        pw = await async_playwright().start()
-        args = ["--no-sandbox", "--disable-gpu", "--disable-dev-shm-usage", "--window-size=1920,1080"]
-        browser = await pw.chromium.launch(headless=HEADLESS, args=args)
-        context = await browser.new_context(
+        await _evict_lru()
+        pool = get_pool(headless=HEADLESS)
+        context = await pool.acquire(
             viewport={"width": VIEWPORT[0], "height": VIEWPORT[1]},
             user_agent=USER_AGENT,
             accept_downloads=False,
         )
-        page = await context.new_page()
+        policy, routing = policy_for(agent_detector(getattr(tool_context, "agent_name", ""))), RouteStats()
+        try:
+            await install_routing(context, policy, routing)
+            page = await context.new_page()
+        except Exception:
+            await pool.release(context)
+            raise
         sid = sid or f"br-{uuid.uuid4().hex}"
-        _REGISTRY[sid] = _BrowserSession(pw=pw, browser=browser, context=context, page=page)
+        _REGISTRY[sid] = _BrowserSession(
+            context=context, page=page, pool=pool, loop=asyncio.get_running_loop(), policy=policy, routing=routing,
+            owner=_owner_of(tool_context),
+        )
         tool_context.state["__browser_sid__"] = sid
+        _ensure_reaper()
         return _REGISTRY[sid], {"reused": False, "sid": sid}
     except Exception as ex:
         return None, _disabled(f"Не удалось запустить Chromium: {ex!r}")
@@ -74,8 +178,11 @@ async def open_url(url: str, tool_context: ToolContext) -> dict:
     if not sess:
         return meta  # disabled/error
     try:
+        started = time.monotonic()
         await sess.page.goto(url.strip(), wait_until="domcontentloaded", timeout=30_000)
-        return {"status": "ok", "url": url, **meta}
+        load_ms = (time.monotonic() - started) * 1000
+        record_page_load(sess.routing, load_ms)
+        return {"status": "ok", "url": url, "load_ms": round(load_ms), "blocked": sum(sess.routing.blocked.values()), **meta}
     except Exception as ex:
         return {"status": "error", "message": str(ex), **meta}
 async def get_current_url(tool_context: ToolContext) -> dict:
@@ -93,10 +200,25 @@ async def get_html(limit: int = 200_000, tool_context: ToolContext | None = None
         return meta
     try:
         html = await sess.page.content()
-        if limit and limit > 0:
+        truncated = bool(limit and limit > 0 and len(html) > limit)
+        if truncated:
             html = html[:limit]
-            return {"status": "ok", "html": html, "truncated": True, **meta}
-        return {"status": "ok", "html": html, "truncated": False, **meta}
+        return {"status": "ok", "html": html, "truncated": truncated, **meta}
+    except Exception as ex:
+        return {"status": "error", "message": str(ex), **meta}
+async def get_page_digest(max_bytes: int = 20_000, tool_context: ToolContext | None = None) -> dict:
+    """
+    Структурированная выжимка видимой страницы: текстовые блоки, кликабельные
+    элементы и поля форм с селекторами, цены, оверлеи. Вместо get_html, когда
+    нужен смысл страницы, а не разметка.
+    """
+    assert tool_context is not None, "ToolContext обязателен"
+    sess, meta = await _get_or_create_session(tool_context)
+    if not sess:
+        return meta
+    try:
+        digest = await sess.page.evaluate(DIGEST_JS, DEFAULT_LIMITS)
+        return {"status": "ok", **fit_to_budget(digest, max(1_000, int(max_bytes))), **meta}
     except Exception as ex:
         return {"status": "error", "message": str(ex), **meta}
 async def scroll_by(pixels: int = 800, tool_context: ToolContext | None = None) -> dict:
@@ -159,41 +281,59 @@ async def type_css(selector: str, text: str, clear: bool = True, tool_context: T
         return {"status": "ok", "selector": selector, "typed": len(text), "cleared": bool(clear), **meta}
     except Exception as ex:
         return {"status": "error", "message": str(ex), "selector": selector, **meta}
-async def take_screenshot(tool_context: ToolContext) -> dict:
+async def take_screenshot(
+    selector: Optional[str] = None,
+    format: str = "jpeg",
+    max_dim: int = SCREENSHOT_MAX_DIM,
+    tool_context: ToolContext | None = None,
+) -> dict:
+    """
+    Скриншот видимой области (или элемента по selector) прямо в память:
+    уменьшенный до max_dim, в JPEG/WebP/PNG. Почти одинаковые подряд кадры
+    не сохраняются повторно — возвращается имя предыдущего артефакта.
+    Снимается страница как есть; images_blocked=True — картинки в этой
+    сессии отключены политикой запросов.
+    """
+    assert tool_context is not None
     sess, meta = await _get_or_create_session(tool_context)
     if not sess:
         return meta
     try:
-        out_dir = pathlib.Path("output/screenshots")
-        out_dir.mkdir(parents=True, exist_ok=True)
-        ts = time.strftime("%Y%m%d-%H%M%S")
-        fpath = out_dir / f"screenshot_{ts}.png"
-        await sess.page.screenshot(path=str(fpath), full_page=False)
-        with open(fpath, "rb") as rf:
-            part = Part.from_bytes(data=rf.read(), mime_type="image/png")
-        await tool_context.save_artifact(str(fpath), part)
-        return {"status": "ok", "path": str(fpath), **meta}
+        # Страницу не перезагружаем: это сбросило бы корзину, формы и открытые окна.
+        # Картинок нет, только если "image" в BROWSER_BLOCK_RESOURCES и детектор не в BROWSER_IMAGE_DETECTORS.
+        if sess.policy.block_reason("image", "") == "image":
+            meta = {**meta, "images_blocked": True}
+        kind = capture_type(format)
+        options = {"type": kind, "scale": "css"}
+        if kind == "jpeg":
+            options["quality"] = SCREENSHOT_QUALITY
+        if selector:
+            target = sess.page.locator(selector).first
+            if await target.count() == 0:
+                return {"status": "not_found", "selector": selector, **meta}
+            raw = await target.screenshot(timeout=5_000, **options)
+        else:
+            raw = await sess.page.screenshot(full_page=False, **options)
+        frame = encode(raw, format, max_dim)
+        if sess.last_frame and is_near_duplicate(sess.last_frame[0], frame.fingerprint):
+            return {"status": "ok", "skipped": "duplicate", "artifact": sess.last_frame[1], **meta}
+        name = f"screenshot_{time.strftime('%Y%m%d-%H%M%S')}_{uuid.uuid4().hex[:6]}.{frame.extension}"
+        await tool_context.save_artifact(name, Part.from_bytes(data=frame.data, mime_type=frame.mime_type))
+        sess.last_frame = (frame.fingerprint, name)
+        return {
+            "status": "ok", "artifact": name, "mime_type": frame.mime_type, "bytes": len(frame.data),
+            "width": frame.width, "height": frame.height, **meta,
+        }
     except Exception as ex:
         return {"status": "error", "message": str(ex), **meta}
 async def browser_shutdown(tool_context: ToolContext) -> dict:
     sid = tool_context.state.get("__browser_sid__")
-    sess = _REGISTRY.pop(sid, None) if sid else None
     tool_context.state.pop("__browser_sid__", None)
-    if not sess:
+    if not sid or sid not in _REGISTRY:
         return {"status": "ok", "message": "no active browser", "sid": sid or None}
     try:
-        try:
-            await sess.context.close()
-        except Exception:
-            pass
-        try:
-            await sess.browser.close()
-        except Exception:
-            pass
-        try:
-            await sess.pw.stop()
-        except Exception:
-            pass
-        return {"status": "ok", "message": "browser closed", "sid": sid}
+        # Chromium остаётся в пуле, закрывается только контекст сессии.
+        await _close_session(sid, "shutdown")
+        return {"status": "ok", "message": "browser context released", "sid": sid}
     except Exception as ex:
         return {"status": "error", "message": str(ex), "sid": sid}
@@ -0,0 +1,147 @@
+from __future__ import annotations
+"""
+Компактный дайджест видимой части страницы для get_page_digest.
+Один скрипт в странице собирает только то, с чем работают агенты:
+- видимые текстовые блоки (заголовки, абзацы, пункты списков, ячейки);
+- интерактивные элементы со стабильными селекторами;
+- поля форм с типом, подписью, значением и состоянием checked;
+- строки, похожие на цены;
+- модальные окна и оверлеи, перекрывающие страницу.
+Результат ужимается под бюджет в байтах (fit_to_budget), хвосты самых
+длинных разделов отрезаются первыми.
+"""
+import json
+from typing import Any, Dict
+DIGEST_JS = r"""
+(limits) => {
+  const clip = (s, n) => { s = (s || '').replace(/\s+/g, ' ').trim(); return s.length > n ? s.slice(0, n) + '…' : s; };
+  const visible = (el) => {
+    const st = getComputedStyle(el);
+    if (st.display === 'none' || st.visibility === 'hidden' || Number(st.opacity) === 0) return false;
+    const r = el.getBoundingClientRect();
+    return r.width > 1 && r.height > 1;
+  };
+  const esc = (v) => (window.CSS && CSS.escape) ? CSS.escape(v) : v.replace(/[^\w-]/g, '\\$&');
+  const selector = (el) => {
+    if (el.id && document.querySelectorAll('#' + esc(el.id)).length === 1) return '#' + esc(el.id);
+    for (const attr of ['data-testid', 'data-test', 'data-qa', 'name', 'aria-label']) {
+      const v = el.getAttribute(attr);
+      if (v) {
+        const sel = `${el.tagName.toLowerCase()}[${attr}="${v.replace(/"/g, '\\"')}"]`;
+        if (document.querySelectorAll(sel).length === 1) return sel;
+      }
+    }
+    const path = [];
+    let node = el;
+    while (node && node.nodeType === 1 && path.length < 5) {
+      let part = node.tagName.toLowerCase();
+      if (node.id) { path.unshift('#' + esc(node.id)); break; }
+      const parent = node.parentElement;
+      if (parent) {
+        const same = Array.from(parent.children).filter(c => c.tagName === node.tagName);
+        if (same.length > 1) part += `:nth-of-type(${same.indexOf(node) + 1})`;
+      }
+      path.unshift(part);
+      node = parent;
+    }
+    return path.join(' > ');
+  };
+  const labelFor = (el) => {
+    if (el.labels && el.labels.length) return clip(el.labels[0].innerText, 80);
+    return clip(el.getAttribute('aria-label') || el.getAttribute('placeholder') || el.getAttribute('title') || '', 80);
+  };
+  const texts = [];
+  const seen = new Set();
+  for (const el of document.querySelectorAll('h1,h2,h3,h4,h5,h6,p,li,td,th,dt,dd,label,blockquote,figcaption,[class*="price"],[class*="total"]')) {
+    if (texts.length >= limits.texts) break;
+    if (!visible(el)) continue;
+    const text = clip(el.innerText, limits.text_chars);
+    if (text.length < 2 || seen.has(text)) continue;
+    seen.add(text);
+    texts.push({tag: el.tagName.toLowerCase(), text});
+  }
+  const interactive = [];
+  for (const el of document.querySelectorAll('a[href],button,[role="button"],[role="link"],[role="tab"],[role="menuitem"],input[type="submit"],input[type="button"],summary')) {
+    if (interactive.length >= limits.interactive) break;
+    if (!visible(el)) continue;
+    const text = clip(el.innerText || el.value || el.getAttribute('aria-label') || el.title, 80);
+    if (!text) continue;
+    const item = {tag: el.tagName.toLowerCase(), text, selector: selector(el)};
+    if (el.tagName === 'A') item.href = clip(el.getAttribute('href'), 120);
+    if (el.disabled || el.getAttribute('aria-disabled') === 'true') item.disabled = true;
+    interactive.push(item);
+  }
+  const fields = [];
+  for (const el of document.querySelectorAll('input:not([type="hidden"]):not([type="submit"]):not([type="button"]),select,textarea')) {
+    if (fields.length >= limits.fields) break;
+    if (!visible(el)) continue;
+    const type = (el.getAttribute('type') || el.tagName).toLowerCase();
+    const item = {type, label: labelFor(el), name: el.name || null, selector: selector(el)};
+    if (type === 'checkbox' || type === 'radio') item.checked = el.checked;
+    else if (el.tagName === 'SELECT') item.value = clip(el.selectedOptions[0] ? el.selectedOptions[0].text : '', 60);
+    else if (type !== 'password') item.value = clip(el.value, 60);
+    if (el.required) item.required = true;
+    fields.push(item);
+  }
+  const priceRe = /(?:[$€£¥₽฿₹]\s?\d[\d\s.,]*\d|\d[\d\s.,]*\d?\s?(?:[$€£¥₽฿₹]|руб\.?|р\.|USD|EUR|RUB|THB|GBP))/gi;
+  const prices = [];
+  const body = document.body ? document.body.innerText : '';
+  for (const m of body.matchAll(priceRe)) {
+    if (prices.length >= limits.prices) break;
+    const start = Math.max(0, m.index - 40);
+    prices.push({value: clip(m[0], 30), context: clip(body.slice(start, m.index + m[0].length + 20), 100)});
+  }
+  const overlays = [];
+  const vw = window.innerWidth, vh = window.innerHeight;
+  for (const el of document.querySelectorAll('[role="dialog"],[role="alertdialog"],[aria-modal="true"],dialog[open],body *')) {
+    if (overlays.length >= limits.overlays) break;
+    const st = getComputedStyle(el);
+    const modal = el.matches('[role="dialog"],[role="alertdialog"],[aria-modal="true"],dialog[open]');
+    if (!modal && st.position !== 'fixed' && st.position !== 'sticky') continue;
+    if (!visible(el)) continue;
+    const r = el.getBoundingClientRect();
+    const cover = (Math.min(r.right, vw) - Math.max(r.left, 0)) * (Math.min(r.bottom, vh) - Math.max(r.top, 0)) / (vw * vh);
+    if (!modal && cover < 0.25) continue;
+    if (overlays.some(o => o.el.contains(el))) continue;
+    overlays.push({el, selector: selector(el), cover: Math.round(cover * 100) / 100, text: clip(el.innerText, 200)});
+  }
+  return {
+    url: location.href,
+    title: clip(document.title, 120),
+    texts, interactive, fields, prices,
+    overlays: overlays.map(({el, ...rest}) => rest),
+  };
+}
+"""
+DEFAULT_LIMITS = {"texts": 200, "text_chars": 300, "interactive": 150, "fields": 80, "prices": 40, "overlays": 5}
+SECTIONS = ("texts", "interactive", "fields", "prices", "overlays")
+def _size(data: Any) -> int:
+    return len(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+def _finalize(digest: Dict[str, Any], dropped: Dict[str, int]) -> Dict[str, Any]:
+    """Дайджест со служебными полями; bytes — размер всего результата вместе с ними"""
+    result = {**digest, "truncated": bool(dropped)}
+    if dropped:
+        result["dropped"] = dict(dropped)
+    result["bytes"] = 0
+    # bytes входит в собственный размер: пересчитываем, пока не перестанет меняться число цифр.
+    while result["bytes"] != _size(result):
+        result["bytes"] = _size(result)
+    return result
+def fit_to_budget(digest: Dict[str, Any], max_bytes: int) -> Dict[str, Any]:
+    """Отрезает хвосты самых длинных разделов, пока итоговый дайджест не влезет в max_bytes"""
+    digest = dict(digest)
+    dropped: Dict[str, int] = {}
+    result = _finalize(digest, dropped)
+    while result["bytes"] > max_bytes:
+        lists = [s for s in SECTIONS if digest.get(s)]
+        if not lists:
+            break
+        size = result["bytes"]
+        section = max(lists, key=lambda s: _size(digest[s]))
+        items = digest[section]
+        # Режем сразу долю, пропорциональную превышению, а не по одному элементу.
+        cut = max(1, int(len(items) * min(0.5, (size - max_bytes) / max(size, 1) + 0.05)))
+        digest[section] = items[:-cut]
+        dropped[section] = dropped.get(section, 0) + cut
+        result = _finalize(digest, dropped)
+    return result
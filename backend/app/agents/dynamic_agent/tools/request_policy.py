@@ -0,0 +1,111 @@
+from __future__ import annotations
+"""
+Политика перехвата запросов для сессий browser_tools.
+Агенты читают в основном текст страницы, поэтому по умолчанию в контексте
+отменяются медиа, шрифты и запросы к известным трекерам/рекламе.
+Картинки по умолчанию грузятся: take_screenshot страницу не перезагружает и
+снимает её как есть, а скриншот без картинок для vision-шага бесполезен.
+Если добавить "image" в BROWSER_BLOCK_RESOURCES, картинки останутся только
+у детекторов из BROWSER_IMAGE_DETECTORS (решение принимается при создании
+сессии, до первой навигации).
+Настройки:
+- BROWSER_ROUTE_POLICY: "block" (по умолчанию) или "off"
+- BROWSER_BLOCK_RESOURCES: типы ресурсов Playwright для блокировки (по умолчанию "media,font")
+- BROWSER_BLOCK_HOSTS: дополнительные домены трекеров через запятую
+- BROWSER_IMAGE_DETECTORS: детекторы, которым картинки нужны и при блокировке "image"
+Учтите: при включённом route Playwright отключает HTTP-кэш контекста.
+"""
+import os
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Optional, Any
+from urllib.parse import urlsplit
+ROUTE_POLICY = os.getenv("BROWSER_ROUTE_POLICY", "block").strip().lower()
+BLOCK_RESOURCES = frozenset(
+    t.strip() for t in os.getenv("BROWSER_BLOCK_RESOURCES", "media,font").split(",") if t.strip()
+)
+TRACKER_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "googlesyndication.com",
+    "googleadservices.com", "facebook.net", "connect.facebook.com", "hotjar.com", "clarity.ms",
+    "mc.yandex.ru", "an.yandex.ru", "top-fwz1.mail.ru", "criteo.com", "criteo.net", "taboola.com",
+    "outbrain.com", "adnxs.com", "amplitude.com", "segment.io", "mixpanel.com", "tiktok.com/i18n/pixel",
+)
+EXTRA_TRACKER_HOSTS = tuple(h.strip() for h in os.getenv("BROWSER_BLOCK_HOSTS", "").split(",") if h.strip())
+IMAGE_DETECTORS = frozenset(d.strip() for d in os.getenv("BROWSER_IMAGE_DETECTORS", "").split(",") if d.strip())
+@dataclass
+class RoutingPolicy:
+    block_resources: frozenset = BLOCK_RESOURCES
+    tracker_hosts: tuple = TRACKER_HOSTS + EXTRA_TRACKER_HOSTS
+    allow_images: bool = False
+    enabled: bool = True
+    def block_reason(self, resource_type: str, url: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        if resource_type == "image" and self.allow_images:
+            return None
+        if resource_type in self.block_resources:
+            return resource_type
+        parts = urlsplit(url)
+        host, target = parts.hostname or "", f"{parts.hostname or ''}{parts.path}"
+        for tracker in self.tracker_hosts:
+            if "/" in tracker:
+                if target.startswith(tracker) or f".{tracker}" in target:
+                    return "tracker"
+            elif host == tracker or host.endswith("." + tracker):
+                return "tracker"
+        return None
+def policy_for(detector: str) -> RoutingPolicy:
+    return RoutingPolicy(allow_images=detector in IMAGE_DETECTORS, enabled=ROUTE_POLICY != "off")
+@dataclass
+class RouteStats:
+    blocked: Counter = field(default_factory=Counter)
+    allowed_requests: int = 0
+    loaded_bytes: int = 0
+    page_loads: int = 0
+    page_load_ms: float = 0.0
+    def as_dict(self) -> dict:
+        return {
+            "blocked": dict(self.blocked),
+            "blocked_total": sum(self.blocked.values()),
+            "allowed_requests": self.allowed_requests,
+            "loaded_bytes": self.loaded_bytes,
+            "page_loads": self.page_loads,
+            "avg_page_load_ms": round(self.page_load_ms / self.page_loads, 1) if self.page_loads else None,
+        }
+_TOTALS = RouteStats()
+_TOTALS_LOCK = threading.Lock()
+def _count(stats: RouteStats, **changes) -> None:
+    for target in (stats, _TOTALS):
+        with _TOTALS_LOCK:
+            for name, value in changes.items():
+                if name == "blocked":
+                    target.blocked[value] += 1
+                else:
+                    setattr(target, name, getattr(target, name) + value)
+def record_page_load(stats: RouteStats, ms: float) -> None:
+    _count(stats, page_loads=1, page_load_ms=ms)
+async def install_routing(context: Any, policy: RoutingPolicy, stats: RouteStats) -> None:
+    """Вешает перехватчик на весь контекст; без активной политики ничего не делает"""
+    if not policy.enabled:
+        return
+    async def handle(route):
+        request = route.request
+        reason = policy.block_reason(request.resource_type, request.url)
+        if reason:
+            _count(stats, blocked=reason)
+            await route.abort("blockedbyclient")
+        else:
+            _count(stats, allowed_requests=1)
+            await route.continue_()
+    def on_response(response):
+        try:
+            size = int(response.headers.get("content-length") or 0)
+        except (TypeError, ValueError):
+            size = 0
+        if size:
+            _count(stats, loaded_bytes=size)
+    await context.route("**/*", handle)
+    context.on("response", on_response)
+def route_stats() -> dict:
+    return _TOTALS.as_dict()
@@ -0,0 +1,68 @@
+from __future__ import annotations
+"""
+Подготовка скриншотов для vision-моделей — целиком в памяти.
+- Уменьшение до SCREENSHOT_MAX_DIM по большей стороне и перекодирование в
+  JPEG/WebP/PNG (Pillow). Без Pillow остаётся то, что умеет Playwright:
+  PNG или JPEG в исходном размере.
+- Перцептивный хэш (dHash, 64 бита) для пропуска почти одинаковых кадров:
+  если расстояние Хэмминга до предыдущего кадра сессии не больше
+  SCREENSHOT_DEDUP_BITS, повторно кадр не сохраняется.
+"""
+import io
+import os
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+try:
+    from PIL import Image
+except Exception:  # Pillow необязателен
+    Image = None
+SCREENSHOT_MAX_DIM = int(os.getenv("SCREENSHOT_MAX_DIM", "1280"))
+SCREENSHOT_QUALITY = int(os.getenv("SCREENSHOT_QUALITY", "70"))
+SCREENSHOT_DEDUP_BITS = int(os.getenv("SCREENSHOT_DEDUP_BITS", "4"))
+FORMATS = {"jpeg": "image/jpeg", "webp": "image/webp", "png": "image/png"}
+@dataclass
+class Frame:
+    data: bytes
+    mime_type: str
+    width: Optional[int]
+    height: Optional[int]
+    fingerprint: str
+    @property
+    def extension(self) -> str:
+        return self.mime_type.split("/")[1].replace("jpeg", "jpg")
+def capture_type(fmt: str) -> str:
+    """Формат, в котором просить кадр у Playwright (он не умеет WebP)"""
+    if Image is not None:
+        return "png"
+    return "jpeg" if fmt in ("jpeg", "webp") else "png"
+def _dhash(image) -> str:
+    small = image.convert("L").resize((9, 8))
+    pixels = list(small.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | int(pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return f"d:{bits:016x}"
+def encode(raw: bytes, fmt: str = "jpeg", max_dim: int = SCREENSHOT_MAX_DIM, quality: int = SCREENSHOT_QUALITY) -> Frame:
+    fmt = fmt if fmt in FORMATS else "jpeg"
+    if Image is None:
+        mime = "image/jpeg" if capture_type(fmt) == "jpeg" else "image/png"
+        return Frame(raw, mime, None, None, "s:" + hashlib.sha1(raw).hexdigest())
+    image = Image.open(io.BytesIO(raw))
+    image.load()
+    fingerprint = _dhash(image)
+    if max_dim and max(image.size) > max_dim:
+        image.thumbnail((max_dim, max_dim), Image.LANCZOS)
+    if fmt == "jpeg" and image.mode != "RGB":
+        image = image.convert("RGB")
+    out = io.BytesIO()
+    options = {"quality": quality} if fmt in ("jpeg", "webp") else {"optimize": True}
+    image.save(out, format=fmt.upper(), **options)
+    return Frame(out.getvalue(), FORMATS[fmt], image.width, image.height, fingerprint)
+def is_near_duplicate(previous: Optional[str], current: str, max_bits: int = SCREENSHOT_DEDUP_BITS) -> bool:
+    if not previous:
+        return False
+    if previous.startswith("d:") and current.startswith("d:"):
+        return bin(int(previous[2:], 16) ^ int(current[2:], 16)).count("1") <= max_bits
+    return previous == current
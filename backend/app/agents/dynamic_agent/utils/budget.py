@@ -0,0 +1,157 @@
+"""
+Token, wall-clock and browser-action budgets for detector runs.
+The runner attaches a `Budget` to the scan's ADK session. Model responses and
+tool calls are charged to it (and to its parent, the whole task's budget).
+- At SOFT_RATIO of any limit, every model request gets a note asking the
+  agent to call `finish` now with what it has.
+- At the limit, the next agent step finishes the loop itself: `final_data`
+  is filled from the latest parser output, marked `budget_exhausted`, and the
+  loop escalates. The multi-detector scan then moves on to the next detector.
+Limits (0 = unlimited) come from the detector's cost class and can be
+overridden per detector with DETECTOR_BUDGETS
+('drip_pricing=600000:1800:150,nagging=100000:300:40' = tokens:seconds:actions).
+A limit on loop iterations is only set when learned from earlier runs
+(app/processing/adaptive.py); otherwise the LoopAgent's max_iterations applies.
+"""
+import os
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from google.adk.agents import LoopAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types
+from .early_stop import stop_loop
+from .model_router import discarded_attempts
+logger = logging.getLogger(__name__)
+SOFT_RATIO = float(os.getenv("BUDGET_SOFT_RATIO", "0.85"))
+@dataclass(frozen=True)
+class Limits:
+    tokens: int = 0
+    seconds: float = 0
+    actions: int = 0
+    iterations: int = 0
+COST_CLASS_LIMITS = {
+    "low": Limits(tokens=150_000, seconds=600, actions=40),
+    "medium": Limits(tokens=300_000, seconds=1200, actions=80),
+    "high": Limits(tokens=600_000, seconds=2400, actions=150),
+}
+TASK_LIMITS = Limits(
+    tokens=int(os.getenv("BUDGET_TASK_MAX_TOKENS", "4000000")),
+    seconds=float(os.getenv("BUDGET_TASK_MAX_SECONDS", "10800")),
+    actions=int(os.getenv("BUDGET_TASK_MAX_ACTIONS", "0")),
+)
+# Tools that don't drive the browser are free.
+FREE_TOOLS = frozenset({"finish", "get_current_url", "browser_shutdown"})
+def _parse_overrides(raw: str) -> Dict[str, Limits]:
+    overrides = {}
+    for chunk in filter(None, (c.strip() for c in raw.split(","))):
+        try:
+            name, spec = chunk.split("=", 1)
+            tokens, seconds, actions = spec.split(":")
+            overrides[name.strip()] = Limits(int(tokens), float(seconds), int(actions))
+        except ValueError:
+            logger.warning("Ignoring malformed DETECTOR_BUDGETS entry: %r", chunk)
+    return overrides
+DETECTOR_LIMITS = _parse_overrides(os.getenv("DETECTOR_BUDGETS", ""))
+def limits_for(detector: str) -> Limits:
+    if detector in DETECTOR_LIMITS:
+        return DETECTOR_LIMITS[detector]
+    from app.agents.dynamic_agent.registry import DETECTORS
+    spec = DETECTORS.get(detector)
+    return COST_CLASS_LIMITS.get(spec.cost_class if spec else "medium", COST_CLASS_LIMITS["medium"])
+@dataclass
+class Budget:
+    limits: Limits
+    parent: Optional["Budget"] = None
+    started: float = field(default_factory=time.monotonic)
+    tokens: int = 0
+    actions: int = 0
+    iterations: int = 0
+    def child(self, limits: Limits) -> "Budget":
+        return Budget(limits, parent=self)
+    def charge(self, tokens: int = 0, actions: int = 0, iterations: int = 0) -> None:
+        self.tokens += tokens
+        self.actions += actions
+        self.iterations += iterations
+        if self.parent is not None:
+            self.parent.charge(tokens, actions, iterations)
+    def used(self) -> dict:
+        return {
+            "tokens": self.tokens,
+            "seconds": round(time.monotonic() - self.started, 1),
+            "actions": self.actions,
+            "iterations": self.iterations,
+        }
+    def _over(self, ratio: float) -> Optional[str]:
+        used = self.used()
+        # The iteration being started is charged before the check, so it doesn't count yet.
+        used["iterations"] -= 1
+        for name in ("tokens", "seconds", "actions", "iterations"):
+            limit = getattr(self.limits, name)
+            if limit and used[name] >= limit * ratio:
+                return name
+        return self.parent._over(ratio) if self.parent is not None else None
+    def exhausted(self) -> Optional[str]:
+        """Name of the first limit reached (here or in the task budget), or None"""
+        return self._over(1.0)
+    def nearly_exhausted(self) -> Optional[str]:
+        return self._over(SOFT_RATIO)
+_budgets: Dict[str, Budget] = {}
+def attach(session_id: str, budget: Budget) -> None:
+    _budgets[session_id] = budget
+def detach(session_id: str) -> None:
+    _budgets.pop(session_id, None)
+def _budget(context) -> Optional[Budget]:
+    try:
+        return _budgets.get(context._invocation_context.session.id)
+    except AttributeError:
+        return None
+def iteration_callback(loop: LoopAgent):
+    """before_agent_callback for the loop's first sub-agent: charges one iteration"""
+    async def before_agent_callback(callback_context: CallbackContext) -> Optional[types.Content]:
+        budget = _budget(callback_context)
+        if budget is not None:
+            budget.charge(iterations=1)
+        return None
+    before_agent_callback.budget_loop = loop.name
+    return before_agent_callback
+async def before_agent_callback(callback_context: CallbackContext) -> Optional[types.Content]:
+    budget = _budget(callback_context)
+    reason = budget.exhausted() if budget is not None else None
+    if not reason:
+        return None
+    used = budget.used()
+    logger.info("Budget exhausted (%s) in %s: %s", reason, callback_context.agent_name, used)
+    return stop_loop(
+        callback_context,
+        f"budget_exhausted: {reason}",
+        f"Stopped early: {reason} budget exhausted; results are partial.",
+        budget_exhausted=True, budget_limit=reason, budget_used=used,
+    )
+def before_model_callback(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+    budget = _budget(callback_context)
+    reason = budget.nearly_exhausted() if budget is not None else None
+    if reason:
+        llm_request.contents.append(types.Content(role="user", parts=[types.Part(text=(
+            f"[budget] The {reason} budget for this check is almost used up. Do not start new "
+            "navigation; call finish now with the data collected so far and set "
+            "data.budget_exhausted = true."
+        ))]))
+    return None
+def after_model_callback(callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+    budget = _budget(callback_context)
+    usage = llm_response.usage_metadata
+    if budget is not None and usage is not None and not llm_response.partial:
+        # Escalated calls also pay for the cheaper answers the router threw away.
+        retried = sum(used.total_token_count or 0 for _, used, _ in discarded_attempts(llm_response))
+        budget.charge(tokens=(usage.total_token_count or 0) + retried)
+    return None
+def after_tool_callback(tool: BaseTool, args: dict, tool_context: ToolContext, tool_response) -> Optional[dict]:
+    budget = _budget(tool_context)
+    if budget is not None and tool.name not in FREE_TOOLS:
+        budget.charge(actions=1)
+    return None
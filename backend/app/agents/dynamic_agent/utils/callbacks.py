@@ -0,0 +1,92 @@
+"""
+Shared ADK callbacks for the detector pipelines.
+Every `*_agent.py` module wraps its root agent with `instrument(...)`, which
+walks the agent tree once at build time and attaches the callbacks each
+LlmAgent's role is configured for.
+LLM_STATIC_INSTRUCTION_ROLES (comma separated roles, empty by default) opts
+roles into `split_static_instruction`, which gives the context cache a stable
+prefix but rewrites the prompt, so it is left off until a role is checked.
+"""
+import os
+import re
+from typing import Iterator
+from google.adk.agents import BaseAgent, LlmAgent, LoopAgent
+from app.agents import context_cache
+from . import budget, cancellation, convergence, llm_cache, metering, progress, structured_output, waypoints
+from .roles import agent_role, parse_roles
+STATIC_INSTRUCTION_ROLES = parse_roles(os.getenv("LLM_STATIC_INSTRUCTION_ROLES", ""))
+def walk(agent: BaseAgent) -> Iterator[BaseAgent]:
+    yield agent
+    for sub in agent.sub_agents or []:
+        yield from walk(sub)
+def _append(agent: BaseAgent, attr: str, callback) -> None:
+    current = getattr(agent, attr)
+    if current is None:
+        callbacks = []
+    elif isinstance(current, list):
+        callbacks = list(current)
+    else:
+        callbacks = [current]
+    if callback not in callbacks:
+        callbacks.append(callback)
+    setattr(agent, attr, callbacks)
+_STATE_REF = re.compile(r"\{([A-Za-z_][\w:.]*)\??\}")
+def split_static_instruction(template: str) -> tuple[str, str]:
+    """
+    Split an instruction template into a static part (state references turned
+    into <name> markers) and a short dynamic block that supplies the values.
+    ADK sends `static_instruction` first as the system instruction, which makes
+    it a stable, cacheable prefix; the dynamic block follows as user content.
+    """
+    names = list(dict.fromkeys(m.group(1) for m in _STATE_REF.finditer(template)))
+    static = _STATE_REF.sub(lambda m: f"<{m.group(1)}>", template)
+    if not names:
+        return static, ""
+    dynamic = "Текущие значения для <...> из инструкции:\n" + "\n".join(f"<{n}>: {{{n}?}}" for n in names)
+    return static, dynamic
+def _use_static_instruction(agent: LlmAgent) -> None:
+    if agent.static_instruction or not isinstance(agent.instruction, str) or not agent.instruction:
+        return
+    agent.static_instruction, agent.instruction = split_static_instruction(agent.instruction)
+def _hook_loop(loop: LoopAgent, marker: str, factory) -> bool:
+    """Put factory(loop) on the loop's first sub-agent unless a callback marked for this loop is there"""
+    first = loop.sub_agents[0]
+    current = first.before_agent_callback
+    hooked = current if isinstance(current, list) else [current]
+    if any(getattr(cb, marker, None) == loop.name for cb in hooked):
+        return False
+    _append(first, "before_agent_callback", factory(loop))
+    return True
+def instrument(agent: BaseAgent) -> BaseAgent:
+    for node in walk(agent):
+        if isinstance(node, LoopAgent) and node.sub_agents:
+            _hook_loop(node, "progress_loop", progress.iteration_callback)
+            _hook_loop(node, "budget_loop", budget.iteration_callback)
+            if _hook_loop(node, "convergence_loop", convergence.supervisor_callback):
+                for sub in node.sub_agents[1:]:
+                    if agent_role(sub.name) in ("critic", "result"):
+                        break
+                    _append(sub, "before_agent_callback", convergence.skip_to_critic_callback(node))
+        if not isinstance(node, LlmAgent):
+            continue
+        if context_cache.MODE != "off" and agent_role(node.name) in STATIC_INSTRUCTION_ROLES:
+            _use_static_instruction(node)
+        _append(node, "before_agent_callback", cancellation.before_agent_callback)
+        _append(node, "before_agent_callback", budget.before_agent_callback)
+        # Ahead of llm_cache, so a response cached without the budget note isn't replayed.
+        _append(node, "before_model_callback", budget.before_model_callback)
+        _append(node, "after_tool_callback", budget.after_tool_callback)
+        _append(node, "after_tool_callback", waypoints.after_tool_callback)
+        role = agent_role(node.name)
+        if role in waypoints.HINT_ROLES:
+            _append(node, "before_model_callback", waypoints.before_model_callback)
+        if role in structured_output.ROLE_OUTPUT_KEYS:
+            _append(node, "before_agent_callback", structured_output.before_agent_callback)
+            _append(node, "after_agent_callback", structured_output.after_agent_callback)
+        if llm_cache.enabled_for(role):
+            _append(node, "before_model_callback", llm_cache.before_model_callback)
+            _append(node, "after_model_callback", llm_cache.after_model_callback)
+        _append(node, "before_model_callback", metering.before_model_callback)
+        _append(node, "after_model_callback", metering.after_model_callback)
+        _append(node, "after_model_callback", budget.after_model_callback)
+    return agent
@@ -0,0 +1,54 @@
+"""
+Cooperative cancellation of running scans.
+The runner registers a probe per ADK session (usually "is the Task row
+cancelled?"). Before each agent step - so at least once per loop iteration -
+`before_agent_callback` asks the probe, at most every CANCEL_CHECK_INTERVAL
+seconds, and on cancellation escalates out of the loop. The runner then stops
+consuming events and releases the scan's browser.
+"""
+import os
+import time
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+from google.adk.agents.callback_context import CallbackContext
+from google.genai import types
+from app.agents import runtime
+logger = logging.getLogger(__name__)
+CHECK_INTERVAL = float(os.getenv("CANCEL_CHECK_INTERVAL", "3"))
+class ScanCancelled(Exception):
+    pass
+@dataclass
+class _Watch:
+    probe: Callable[[], bool]
+    checked_at: float = 0.0
+    cancelled: bool = False
+_watches: Dict[str, _Watch] = {}
+def watch(session_id: str, probe: Callable[[], bool]) -> None:
+    _watches[session_id] = _Watch(probe)
+def unwatch(session_id: str) -> None:
+    _watches.pop(session_id, None)
+async def is_cancelled(session_id: str) -> bool:
+    """Ask the session's probe; blocking probes (ORM) run off the event loop"""
+    w = _watches.get(session_id)
+    if w is None:
+        return False
+    now = time.monotonic()
+    if not w.cancelled and now - w.checked_at >= CHECK_INTERVAL:
+        w.checked_at = now
+        try:
+            w.cancelled = bool(await runtime.to_thread(w.probe))
+        except Exception as ex:
+            logger.debug("Cancellation probe for %s failed: %r", session_id, ex)
+    return w.cancelled
+def _session_id(callback_context: CallbackContext) -> Optional[str]:
+    try:
+        return callback_context._invocation_context.session.id
+    except AttributeError:
+        return None
+async def before_agent_callback(callback_context: CallbackContext) -> Optional[types.Content]:
+    sid = _session_id(callback_context)
+    if not sid or not await is_cancelled(sid):
+        return None
+    callback_context.actions.escalate = True
+    return types.Content(role="model", parts=[types.Part(text="Scan cancelled")])
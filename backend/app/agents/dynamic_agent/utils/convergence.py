@@ -0,0 +1,77 @@
+"""
+Stall detection for detector loops.
+`instrument()` hooks a supervisor onto the first sub-agent of every LoopAgent.
+At the start of each iteration it fingerprints what the previous iteration
+produced - page text, `parsed` and `decider_json` - and counts consecutive
+iterations that changed nothing. After CONVERGENCE_PATIENCE stalled
+iterations the next iteration skips straight to the critic, so it can call
+`finish` with what is known; if that doesn't end the loop either, the loop is
+finished with the latest extracted data. The total number of stalled
+iterations is kept in state["stalled_iterations"].
+"""
+import os
+import json
+import hashlib
+import logging
+from typing import Optional
+from google.adk.agents import LoopAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.genai import types
+from .early_stop import stop_loop
+from .roles import agent_role
+logger = logging.getLogger(__name__)
+CONVERGENCE_PATIENCE = int(os.getenv("CONVERGENCE_PATIENCE", "3"))  # 0 disables
+FINGERPRINT_KEYS = ("last_page_text", "parsed", "decider_json")
+STATE_KEY = "__convergence__"
+def fingerprint(state) -> str:
+    blob = json.dumps([state.get(key) for key in FINGERPRINT_KEYS], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+def _skip(text: str) -> types.Content:
+    return types.Content(role="model", parts=[types.Part(text=text)])
+def _stop(callback_context: CallbackContext, stalled: int) -> types.Content:
+    return stop_loop(
+        callback_context,
+        f"stalled: no progress in {stalled} iterations",
+        f"Stopped early: no progress in {stalled} iterations; results are partial.",
+        stalled=True, stalled_iterations=callback_context.state.get("stalled_iterations", stalled),
+    )
+def supervisor_callback(loop: LoopAgent, patience: Optional[int] = None):
+    """before_agent_callback for the loop's first sub-agent: one call per iteration"""
+    has_critic = any(agent_role(sub.name) == "critic" for sub in loop.sub_agents)
+    async def before_agent_callback(callback_context: CallbackContext) -> Optional[types.Content]:
+        limit = CONVERGENCE_PATIENCE if patience is None else patience
+        if limit <= 0:
+            return None
+        state = callback_context.state
+        tracked = dict(state.get(STATE_KEY) or {})
+        entry = dict(tracked.get(loop.name) or {})
+        current = fingerprint(state)
+        if entry.get("fingerprint") == current:
+            entry["stalled"] = entry.get("stalled", 0) + 1
+            state["stalled_iterations"] = state.get("stalled_iterations", 0) + 1
+        else:
+            entry.update(fingerprint=current, stalled=0, forced=False)
+        entry["force_critic"] = False
+        result = None
+        if entry["stalled"] >= limit:
+            if has_critic and not entry.get("forced"):
+                entry["forced"] = entry["force_critic"] = True
+                logger.info("%s stalled for %s iterations; asking the critic to finish", loop.name, entry["stalled"])
+                result = _skip("No progress; skipping to the critic.")
+            else:
+                logger.info("%s stalled for %s iterations; stopping", loop.name, entry["stalled"])
+                result = _stop(callback_context, entry["stalled"])
+        tracked[loop.name] = entry
+        state[STATE_KEY] = tracked
+        return result
+    before_agent_callback.convergence_loop = loop.name
+    return before_agent_callback
+def skip_to_critic_callback(loop: LoopAgent):
+    """before_agent_callback for the sub-agents between the first one and the critic"""
+    async def before_agent_callback(callback_context: CallbackContext) -> Optional[types.Content]:
+        entry = (callback_context.state.get(STATE_KEY) or {}).get(loop.name) or {}
+        if entry.get("force_critic"):
+            return _skip("No progress; skipping to the critic.")
+        return None
+    before_agent_callback.convergence_loop = loop.name
+    return before_agent_callback
@@ -0,0 +1,23 @@
+"""
+Ending a detector loop before its agents call `finish`.
+Budgets (budget.py) and stall detection (convergence.py) both stop a loop
+early; the latest extracted data becomes `final_data`, marked with why it is
+partial, and the loop escalates.
+"""
+from google.adk.agents.callback_context import CallbackContext
+from google.genai import types
+def partial_data(state, **marks) -> dict:
+    """`final_data`, else the parser's latest extraction, with `marks` added"""
+    parsed = state.get("parsed")
+    extracted = parsed.get("extracted") if isinstance(parsed, dict) else None
+    data = dict(state.get("final_data") or extracted or {})
+    data.update(marks)
+    return data
+def stop_loop(callback_context: CallbackContext, reason: str, summary: str, **marks) -> types.Content:
+    state = callback_context.state
+    state["final_data"] = partial_data(state, **marks)
+    state["final_reason"] = reason
+    if not state.get("final_summary"):
+        state["final_summary"] = summary
+    callback_context.actions.escalate = True
+    return types.Content(role="model", parts=[types.Part(text=state["final_summary"])])
@@ -0,0 +1,170 @@
+"""
+Opt-in cache of LLM responses for deterministic agent roles.
+Hooked in as ADK before/after model callbacks. The key covers the model, the
+system instruction (with the rendered state), the conversation contents
+(including tool results) and the generation config, so a retried or repeated
+scan that reaches the same prompt replays the stored response instead of
+paying for another call.
+Configuration:
+- LLM_CACHE_ROLES: comma separated roles to cache (e.g. "ingest,parser"); empty disables the cache
+- LLM_CACHE_BACKEND: "redis" (default, REDIS_URL) or "disk" (LLM_CACHE_DIR)
+- LLM_CACHE_TTL: seconds to keep an entry
+- LLM_CACHE_MAX_BYTES: total size after which the oldest entries are evicted
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import pathlib
+import threading
+from typing import Optional
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from .roles import agent_role, parse_roles
+logger = logging.getLogger(__name__)
+CACHE_ROLES = parse_roles(os.getenv("LLM_CACHE_ROLES", ""))
+CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "redis").lower()
+CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+CACHE_DIR = pathlib.Path(os.getenv("LLM_CACHE_DIR", "/tmp/llm-cache"))
+_KEY_STATE = "temp:llm_cache_key"
+class _DiskStore:
+    def __init__(self, root: pathlib.Path, ttl: int, max_bytes: int):
+        self.root = root
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._writes = 0
+    def _path(self, key: str) -> pathlib.Path:
+        return self.root / key[:2] / f"{key}.json"
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            if time.time() - path.stat().st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+                return None
+            return path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+    def set(self, key: str, value: str) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(value, encoding="utf-8")
+        tmp.replace(path)
+        with self._lock:
+            self._writes += 1
+            if self._writes % 50 == 0:
+                self._evict()
+    def _evict(self) -> None:
+        now = time.time()
+        entries, total = [], 0
+        for path in self.root.glob("*/*.json"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            if now - st.st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+class _RedisStore:
+    def __init__(self, url: str, ttl: int, max_bytes: int, prefix: str = "llm:cache"):
+        import redis
+        self.client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.prefix = prefix
+    def get(self, key: str) -> Optional[str]:
+        raw = self.client.get(f"{self.prefix}:{key}")
+        return raw.decode("utf-8") if raw is not None else None
+    def set(self, key: str, value: str) -> None:
+        size = len(value.encode("utf-8"))
+        pipe = self.client.pipeline()
+        pipe.set(f"{self.prefix}:{key}", value, ex=self.ttl)
+        pipe.zadd(f"{self.prefix}:index", {key: time.time()})
+        pipe.hset(f"{self.prefix}:sizes", key, size)
+        pipe.incrby(f"{self.prefix}:bytes", size)
+        pipe.execute()
+        # Oldest entries go first; TTL-expired ones are the oldest, so their
+        # stale size accounting is reclaimed here as well.
+        while int(self.client.get(f"{self.prefix}:bytes") or 0) > self.max_bytes:
+            popped = self.client.zpopmin(f"{self.prefix}:index")
+            if not popped:
+                break
+            old = popped[0][0].decode("utf-8")
+            old_size = int(self.client.hget(f"{self.prefix}:sizes", old) or 0)
+            pipe = self.client.pipeline()
+            pipe.delete(f"{self.prefix}:{old}")
+            pipe.hdel(f"{self.prefix}:sizes", old)
+            pipe.decrby(f"{self.prefix}:bytes", old_size)
+            pipe.execute()
+_store = None
+_store_lock = threading.Lock()
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                url = os.getenv("LLM_CACHE_REDIS_URL") or os.getenv("REDIS_URL")
+                if CACHE_BACKEND == "redis" and url:
+                    _store = _RedisStore(url, CACHE_TTL, CACHE_MAX_BYTES)
+                else:
+                    _store = _DiskStore(CACHE_DIR, CACHE_TTL, CACHE_MAX_BYTES)
+    return _store
+def enabled_for(role: str) -> bool:
+    return role in CACHE_ROLES
+def request_key(llm_request: LlmRequest) -> Optional[str]:
+    """Stable hash of everything that determines the model output."""
+    try:
+        config = llm_request.config.model_dump(
+            mode="json", exclude_none=True, exclude={"http_options", "labels"}
+        ) if llm_request.config else {}
+        payload = {
+            "model": llm_request.model,
+            "config": config,
+            "contents": [c.model_dump(mode="json", exclude_none=True) for c in llm_request.contents or []],
+        }
+        blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    except Exception as ex:
+        logger.debug("LLM cache: request not hashable: %r", ex)
+        return None
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+def before_model_callback(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+    if not enabled_for(agent_role(callback_context.agent_name)):
+        return None
+    key = request_key(llm_request)
+    if not key:
+        return None
+    try:
+        raw = get_store().get(key)
+    except Exception as ex:
+        logger.warning("LLM cache read failed: %r", ex)
+        raw = None
+    if raw:
+        response = LlmResponse.model_validate_json(raw)
+        response.custom_metadata = {**(response.custom_metadata or {}), "llm_cache": "hit"}
+        callback_context.state[_KEY_STATE] = None
+        return response
+    callback_context.state[_KEY_STATE] = key
+    return None
+def after_model_callback(callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+    key = callback_context.state.get(_KEY_STATE)
+    if not key:
+        return None
+    callback_context.state[_KEY_STATE] = None
+    if llm_response.partial or llm_response.error_code or not llm_response.content:
+        return None
+    try:
+        get_store().set(key, llm_response.model_dump_json(exclude_none=True))
+    except Exception as ex:
+        logger.warning("LLM cache write failed: %r", ex)
+    return None
@@ -1,15 +1,75 @@
 import os
+import asyncio
+from typing import AsyncGenerator
 from google.adk.models import google_llm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
 from google.genai import Client
 from google.genai.types import HttpOptions
-class GeminiLLM(google_llm.Gemini):
-    @property
-    def api_client(self) -> Client:
-        """Override to use the Google GenAI client."""
-        return Client(
+from app.agents.rate_limiter import get_rate_limiter, estimate_tokens
+from app.agents.context_cache import get_context_cache
+def _request_texts(llm_request: LlmRequest):
+    config = llm_request.config
+    instruction = getattr(config, "system_instruction", None) if config else None
+    if isinstance(instruction, str):
+        yield instruction
+    elif instruction is not None:
+        for part in getattr(instruction, "parts", None) or []:
+            yield part.text
+    for content in llm_request.contents or []:
+        for part in content.parts or []:
+            if part.text:
+                yield part.text
+            elif part.function_response is not None:
+                yield str(part.function_response.response)
+_clients: dict = {}
+def shared_client() -> Client:
+    """One GenAI client per event loop, so every model in the process reuses its connection pool."""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    for key, (owner, _) in list(_clients.items()):
+        if owner is not None and owner.is_closed():
+            _clients.pop(key, None)
+    entry = _clients.get(id(loop))
+    if entry is None:
+        entry = _clients[id(loop)] = (loop, Client(
             api_key=os.getenv("GEMINI_API_KEY"),
             http_options=HttpOptions(
                 base_url=os.getenv("GEMINI_API_BASE_URL", "https://generativelanguage.googleapis.com"),
                 api_version=os.getenv("GEMINI_API_VERSION", "v1beta1"),
             ),
+        ))
+    return entry[1]
+class GeminiLLM(google_llm.Gemini):
+    @property
+    def api_client(self) -> Client:
+        """Override to use the Google GenAI client."""
+        return shared_client()
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        """Acquire from the shared LLM rate limiter before every model call."""
+        model = llm_request.model or self.model
+        await self._use_context_cache(model, llm_request)
+        async with get_rate_limiter().limit(model, estimate_tokens(*_request_texts(llm_request))) as lease:
+            async for response in super().generate_content_async(llm_request, stream=stream):
+                usage = response.usage_metadata
+                if usage is not None and usage.total_token_count:
+                    lease.used_tokens = usage.total_token_count
+                yield response
+    async def _use_context_cache(self, model: str, llm_request: LlmRequest) -> None:
+        """Serve the static instruction and tool declarations from an explicit context cache."""
+        registry = get_context_cache()
+        config = llm_request.config
+        if not registry.enabled or llm_request.cache_config or not config or not config.system_instruction or config.cached_content:
+            return
+        name = await registry.get_or_create(
+            self.api_client,
+            model,
+            system_instruction=config.system_instruction,
+            tools=config.tools,
+            tool_config=config.tool_config,
         )
+        llm_request.config = registry.config_for(name, config)
@@ -0,0 +1,254 @@
+"""
+Pool of playwright-mcp endpoints behind a single ADK toolset.
+BROWSER_MCP (or BROWSER_MCP_URLS) takes a comma separated list of endpoints.
+Every scan - one ADK session - is pinned to one endpoint and gets its own MCP
+session there, so its pages, cookies and tabs stay on the same browser while
+other scans are spread over the least loaded healthy endpoints. Adding
+browser capacity means adding playwright-mcp containers to the list.
+The endpoint "local" serves the in-process Playwright tools from
+`tools/browser_tools.py` instead of MCP; it is a stand-in for tests and for
+development without the container.
+playwright-mcp has no get_page_digest; on MCP endpoints it is added on top of
+`browser_evaluate`, running the same digest script (tools/page_digest.py).
+Configuration:
+- MCP_POOL_SESSIONS_PER_ENDPOINT: soft capacity of one endpoint, used to balance load
+- MCP_POOL_IDLE_TTL: seconds after which an unused scan lease is closed
+- MCP_POOL_DOWN_SECONDS: how long a failing endpoint is skipped
+- MCP_POOL_PROBE_TIMEOUT: TCP health-probe timeout
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+from google.adk.agents.readonly_context import ReadonlyContext
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.base_toolset import BaseToolset
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types
+from ..tools.page_digest import DEFAULT_LIMITS, DIGEST_JS, fit_to_budget
+logger = logging.getLogger(__name__)
+LOCAL_ENDPOINT = "local"
+SESSIONS_PER_ENDPOINT = int(os.getenv("MCP_POOL_SESSIONS_PER_ENDPOINT", "8"))
+IDLE_TTL = float(os.getenv("MCP_POOL_IDLE_TTL", "900"))
+DOWN_SECONDS = float(os.getenv("MCP_POOL_DOWN_SECONDS", "30"))
+PROBE_TIMEOUT = float(os.getenv("MCP_POOL_PROBE_TIMEOUT", "2"))
+def endpoint_urls() -> List[str]:
+    raw = os.getenv("BROWSER_MCP_URLS") or os.getenv("BROWSER_MCP", "localhost")
+    return [u.strip() for u in raw.split(",") if u.strip()]
+class LocalBrowserToolset(BaseToolset):
+    """In-process Playwright tools exposed like an MCP endpoint"""
+    async def get_tools(self, readonly_context: Optional[ReadonlyContext] = None) -> List[BaseTool]:
+        from google.adk.tools.function_tool import FunctionTool
+        from ..tools import browser_tools
+        return [
+            FunctionTool(func) for func in (
+                browser_tools.open_url,
+                browser_tools.get_current_url,
+                browser_tools.get_page_digest,
+                browser_tools.get_html,
+                browser_tools.scroll_by,
+                browser_tools.click_text,
+                browser_tools.click_css,
+                browser_tools.type_css,
+                browser_tools.take_screenshot,
+                browser_tools.browser_shutdown,
+            )
+        ]
+    async def close(self) -> None:
+        pass
+_RESULT = re.compile(r"### Result\s*\n(.*?)(?=\n### |\Z)", re.S)
+def _evaluated(response: Any) -> Any:
+    """Value returned by the page script from a browser_evaluate call result"""
+    if isinstance(response, dict) and isinstance(response.get("content"), list):
+        text = "\n".join(str(part.get("text", "")) for part in response["content"] if isinstance(part, dict))
+    else:
+        text = str(response)
+    match = _RESULT.search(text)
+    raw = (match.group(1) if match else text).strip().removeprefix("```json").removeprefix("```").removesuffix("```")
+    value = json.loads(raw)
+    # Some playwright-mcp versions print the value as a JSON string.
+    return json.loads(value) if isinstance(value, str) else value
+class PageDigestTool(BaseTool):
+    """get_page_digest for playwright-mcp endpoints, run through their browser_evaluate"""
+    def __init__(self, evaluate: BaseTool):
+        super().__init__(
+            name="get_page_digest",
+            description=(
+                "Структурированная выжимка видимой страницы: текстовые блоки, кликабельные элементы и поля "
+                "форм с селекторами, цены, оверлеи. Вместо снимка страницы, когда нужен смысл, а не разметка."
+            ),
+        )
+        self._evaluate = evaluate
+    def _get_declaration(self) -> Optional[types.FunctionDeclaration]:
+        return types.FunctionDeclaration(
+            name=self.name,
+            description=self.description,
+            parameters=types.Schema(type=types.Type.OBJECT, properties={"max_bytes": types.Schema(type=types.Type.INTEGER)}),
+        )
+    async def run_async(self, *, args: Dict[str, Any], tool_context: ToolContext) -> Any:
+        script = f"() => ({DIGEST_JS.strip()})({json.dumps(DEFAULT_LIMITS)})"
+        response = await self._evaluate.run_async(args={"function": script}, tool_context=tool_context)
+        if isinstance(response, dict) and response.get("isError"):
+            return response
+        try:
+            digest = _evaluated(response)
+        except ValueError as ex:
+            return {"status": "error", "message": f"digest not parsed: {ex}"}
+        if not isinstance(digest, dict):
+            return {"status": "error", "message": f"digest not parsed: got {type(digest).__name__}"}
+        return {"status": "ok", **fit_to_budget(digest, max(1_000, int(args.get("max_bytes") or 20_000)))}
+def _with_digest(tools: List[BaseTool]) -> List[BaseTool]:
+    names = {getattr(tool, "name", None) for tool in tools}
+    if "get_page_digest" in names or "browser_evaluate" not in names:
+        return tools
+    evaluate = next(tool for tool in tools if getattr(tool, "name", None) == "browser_evaluate")
+    return [*tools, PageDigestTool(evaluate)]
+def _default_factory(url: str) -> BaseToolset:
+    if url == LOCAL_ENDPOINT:
+        return LocalBrowserToolset()
+    from google.adk.tools.mcp_tool.mcp_toolset import McpToolset, StreamableHTTPConnectionParams
+    return McpToolset(connection_params=StreamableHTTPConnectionParams(url=url))
+@dataclass
+class Endpoint:
+    url: str
+    active: int = 0
+    served: int = 0
+    failures: int = 0
+    down_until: float = 0.0
+    @property
+    def up(self) -> bool:
+        return self.down_until <= time.time()
+    def mark_down(self) -> None:
+        self.failures += 1
+        self.down_until = time.time() + DOWN_SECONDS
+@dataclass
+class _Lease:
+    endpoint: Endpoint
+    toolset: BaseToolset
+    loop: asyncio.AbstractEventLoop
+    last_used: float = field(default_factory=time.time)
+def _affinity_key(readonly_context: Optional[ReadonlyContext]) -> str:
+    if readonly_context is None:
+        return "default"
+    try:
+        return readonly_context.session.id
+    except Exception:
+        return readonly_context.invocation_id
+class MCPToolsetPool(BaseToolset):
+    """Routes each scan to one endpoint and hands out that scan's MCP toolset"""
+    def __init__(
+        self,
+        urls: List[str],
+        toolset_factory: Callable[[str], BaseToolset] = _default_factory,
+        capacity: int = SESSIONS_PER_ENDPOINT,
+    ):
+        super().__init__()
+        if not urls:
+            raise ValueError("MCP pool needs at least one endpoint")
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.capacity = max(1, capacity)
+        self._factory = toolset_factory
+        self._leases: Dict[str, _Lease] = {}
+    async def _probe(self, endpoint: Endpoint) -> bool:
+        if endpoint.url == LOCAL_ENDPOINT:
+            return True
+        parts = urlsplit(endpoint.url if "//" in endpoint.url else f"http://{endpoint.url}")
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(parts.hostname, port), PROBE_TIMEOUT)
+            writer.close()
+            return True
+        except Exception:
+            return False
+    async def check_endpoints(self) -> dict:
+        """Probe every endpoint now, so the first scan does not route to a dead one"""
+        results = await asyncio.gather(*(self._probe(e) for e in self.endpoints))
+        for endpoint, ok in zip(self.endpoints, results):
+            if not ok:
+                endpoint.mark_down()
+        return {e.url: ok for e, ok in zip(self.endpoints, results)}
+    def _candidates(self, exclude: set) -> List[Endpoint]:
+        usable = [e for e in self.endpoints if e.url not in exclude]
+        up = [e for e in usable if e.up]
+        # When every endpoint is marked down, try the one that comes back first rather than fail outright.
+        ranked = sorted(up, key=lambda e: (e.active / self.capacity, e.served))
+        return ranked or sorted(usable, key=lambda e: e.down_until)[:1]
+    async def _reap(self) -> None:
+        loop = asyncio.get_running_loop()
+        now = time.time()
+        for key, lease in list(self._leases.items()):
+            if lease.loop.is_closed():
+                self._forget(key)
+            elif lease.loop is loop and now - lease.last_used > IDLE_TTL:
+                await self.release(key)
+    def _forget(self, key: str) -> Optional[_Lease]:
+        lease = self._leases.pop(key, None)
+        if lease is not None:
+            lease.endpoint.active = max(0, lease.endpoint.active - 1)
+        return lease
+    async def _lease(self, key: str, exclude: set) -> _Lease:
+        await self._reap()
+        for endpoint in self._candidates(exclude):
+            if not await self._probe(endpoint):
+                endpoint.mark_down()
+                logger.warning("MCP endpoint %s is unreachable", endpoint.url)
+                continue
+            lease = _Lease(endpoint=endpoint, toolset=self._factory(endpoint.url), loop=asyncio.get_running_loop())
+            endpoint.active += 1
+            endpoint.served += 1
+            self._leases[key] = lease
+            return lease
+        raise ConnectionError("no reachable playwright-mcp endpoint")
+    async def get_tools(self, readonly_context: Optional[ReadonlyContext] = None) -> List[BaseTool]:
+        key = _affinity_key(readonly_context)
+        lease = self._leases.get(key)
+        if lease is not None and lease.loop is not asyncio.get_running_loop():
+            self._forget(key)
+            lease = None
+        tried: set = set()
+        while True:
+            if lease is None:
+                lease = await self._lease(key, tried)
+            lease.last_used = time.time()
+            try:
+                return _with_digest(await lease.toolset.get_tools(readonly_context))
+            except Exception as ex:
+                tried.add(lease.endpoint.url)
+                lease.endpoint.mark_down()
+                logger.warning("MCP endpoint %s failed, rerouting %s: %r", lease.endpoint.url, key, ex)
+                await self.release(key)
+                lease = None
+                if len(tried) >= len(self.endpoints):
+                    raise
+    async def release(self, key: str) -> None:
+        """Close the scan's MCP session; its browser context goes away with it"""
+        lease = self._forget(key)
+        if lease is None or lease.loop is not asyncio.get_running_loop():
+            return
+        try:
+            await lease.toolset.close()
+        except Exception as ex:
+            logger.debug("MCP toolset for %s not closed cleanly: %r", key, ex)
+    async def close(self) -> None:
+        for key in list(self._leases):
+            await self.release(key)
+    def stats(self) -> dict:
+        return {
+            "leases": len(self._leases),
+            "endpoints": [
+                {"url": e.url, "up": e.up, "active": e.active, "served": e.served, "failures": e.failures}
+                for e in self.endpoints
+            ],
+        }
+_pool: Optional[MCPToolsetPool] = None
+def mcp_toolset() -> MCPToolsetPool:
+    """The process-wide pooled toolset shared by all detector agents"""
+    global _pool
+    if _pool is None:
+        _pool = MCPToolsetPool(endpoint_urls())
+    return _pool
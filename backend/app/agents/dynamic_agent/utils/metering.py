@@ -0,0 +1,44 @@
+"""
+ADK model callbacks feeding `app.agents.usage`: every non-partial model
+response is recorded under (detector, role, model) with its latency. Responses
+served from the LLM cache short-circuit the model call and are not counted.
+An answer the model router escalated is recorded under the model that gave
+it, plus one row per cheaper attempt it threw away.
+"""
+import time
+from typing import Optional
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from app.agents import usage
+from .model_router import answered_by, discarded_attempts
+from .roles import agent_detector, agent_role
+def _started_key(agent_name: str) -> str:
+    # temp: state lives for one invocation, so a call that errors out leaves nothing behind.
+    return f"temp:metering_started:{agent_name}"
+def before_model_callback(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+    if usage.current_meter() is not None:
+        callback_context.state[_started_key(callback_context.agent_name)] = [time.monotonic(), llm_request.model or ""]
+    return None
+def after_model_callback(callback_context: CallbackContext, llm_response: LlmResponse) -> Optional[LlmResponse]:
+    if llm_response.partial:
+        return None
+    key = _started_key(callback_context.agent_name)
+    started, model = callback_context.state.get(key) or (None, "")
+    if started is not None:
+        callback_context.state[key] = None
+    if started is None or llm_response.usage_metadata is None:
+        return None
+    name = callback_context.agent_name
+    role, detector = agent_role(name), agent_detector(name)
+    elapsed = time.monotonic() - started
+    for attempt_model, used, seconds in discarded_attempts(llm_response):
+        usage.record(role, attempt_model, used, seconds, detector=detector)
+        elapsed -= seconds
+    usage.record(
+        role,
+        answered_by(llm_response) or model or llm_response.model_version or "",
+        llm_response.usage_metadata,
+        max(0.0, elapsed),
+        detector=detector,
+    )
+    return None
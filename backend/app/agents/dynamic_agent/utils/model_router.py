@@ -0,0 +1,179 @@
+"""
+Per-role model tiering for the detector agents.
+Cheap, fast models drive the chatty loop roles (decider, navigator, form
+filler, parser); the top model is kept for planning and for the final
+critic/result judgement. When a cheap call returns JSON that does not parse,
+or reports a confidence below the threshold, the same request is retried on
+the next tier up. The answer that is returned carries the model that gave it
+and the usage of the attempts thrown away on the way (`answered_by`,
+`discarded_attempts`), so metering and budgets count every call.
+Configuration:
+- BROWSER_LLM / BROWSER_LLM_FLASH / BROWSER_LLM_LITE: model per tier (pro / flash / lite)
+- LLM_ROLE_TIERS: overrides of the role -> tier map, e.g. "decider=flash,parser=pro"
+- LLM_ESCALATION: "0" disables escalation
+- LLM_ESCALATE_MIN_CONFIDENCE: confidence below which a JSON answer is escalated
+"""
+import os
+import re
+import json
+import time
+import logging
+import threading
+from typing import AsyncGenerator, Optional, Any
+from pydantic import Field
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+from .llmproxy import GeminiLLM
+from .roles import ROLES
+logger = logging.getLogger(__name__)
+TIERS = ("lite", "flash", "pro")
+TIER_MODELS = {
+    "pro": os.getenv("BROWSER_LLM", "gemini-2.5-pro"),
+    "flash": os.getenv("BROWSER_LLM_FLASH", "gemini-2.5-flash"),
+    "lite": os.getenv("BROWSER_LLM_LITE", "gemini-2.5-flash-lite"),
+}
+DEFAULT_ROLE_TIERS = {
+    "ingest": "pro",
+    "decider": "lite",
+    "navigator": "flash",
+    "form_filler": "flash",
+    "parser": "flash",
+    "critic": "pro",
+    "result": "pro",
+}
+# Roles whose text answer is a JSON object; tool-driving roles answer in free text.
+JSON_ROLES = frozenset({"ingest", "decider", "parser", "critic", "result"})
+ESCALATION = os.getenv("LLM_ESCALATION", "1") not in ("0", "false", "no")
+MIN_CONFIDENCE = float(os.getenv("LLM_ESCALATE_MIN_CONFIDENCE", "0.5"))
+# custom_metadata keys of a routed answer.
+MODEL_KEY = "answered_by"
+DISCARDED_KEY = "discarded_attempts"
+def _parse_role_tiers(raw: str) -> dict[str, str]:
+    tiers = dict(DEFAULT_ROLE_TIERS)
+    for item in (raw or "").split(","):
+        role, _, tier = item.partition("=")
+        role, tier = role.strip(), tier.strip()
+        if role in ROLES and tier in TIERS:
+            tiers[role] = tier
+    return tiers
+ROLE_TIERS = _parse_role_tiers(os.getenv("LLM_ROLE_TIERS", ""))
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+def extract_json(text: str) -> Optional[Any]:
+    """Parse a model's JSON answer, tolerating ``` fences and prose around the object"""
+    text = _FENCE.sub("", (text or "").strip())
+    if not text:
+        return None
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        return json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+def response_text(response: Optional[LlmResponse]) -> str:
+    if response is None or response.content is None:
+        return ""
+    return "".join(p.text or "" for p in response.content.parts or [] if not p.thought)
+def escalation_reason(role: str, response: Optional[LlmResponse]) -> Optional[str]:
+    """Why this answer should be retried on a bigger model, or None if it is usable"""
+    if role not in JSON_ROLES or response is None or response.error_code:
+        return None
+    parts = response.content.parts if response.content else None
+    if any(p.function_call for p in parts or []):
+        return None
+    text = response_text(response)
+    if not text.strip():
+        return "empty answer"
+    data = extract_json(text)
+    if not isinstance(data, dict):
+        return "unparseable JSON"
+    confidence = data.get("confidence")
+    if isinstance(confidence, (int, float)) and confidence < MIN_CONFIDENCE:
+        return f"low confidence {confidence}"
+    return None
+class _LatencyStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: dict[tuple[str, str], dict[str, float]] = {}
+    def record(self, role: str, model: str, seconds: float, escalated: bool = False) -> None:
+        with self._lock:
+            row = self._stats.setdefault((role, model), {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "escalations": 0})
+            row["calls"] += 1
+            row["seconds"] += seconds
+            row["max_seconds"] = max(row["max_seconds"], seconds)
+            row["escalations"] += int(escalated)
+    def snapshot(self) -> list[dict]:
+        with self._lock:
+            return [
+                {"role": role, "model": model, **row, "avg_seconds": row["seconds"] / row["calls"]}
+                for (role, model), row in sorted(self._stats.items())
+            ]
+latency_stats = _LatencyStats()
+def answered_by(response: LlmResponse) -> Optional[str]:
+    return (getattr(response, "custom_metadata", None) or {}).get(MODEL_KEY)
+def discarded_attempts(response: LlmResponse) -> list[tuple[str, types.GenerateContentResponseUsageMetadata, float]]:
+    """(model, usage, seconds) of the escalated-away calls behind this answer"""
+    metadata = getattr(response, "custom_metadata", None) or {}
+    if metadata.get("llm_cache") == "hit":
+        return []
+    return [
+        (a["model"], types.GenerateContentResponseUsageMetadata(**a["usage"]), a["seconds"])
+        for a in metadata.get(DISCARDED_KEY) or []
+    ]
+class RoutedGeminiLLM(GeminiLLM):
+    """GeminiLLM bound to an agent role, with the bigger models to fall back to"""
+    role: str = ""
+    escalation: list[str] = Field(default_factory=list)
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        models = [llm_request.model or self.model]
+        if not stream:
+            models += [m for m in self.escalation if m not in models]
+        config = llm_request.config
+        discarded: list[dict] = []
+        for attempt, model in enumerate(models):
+            llm_request.model = model
+            # The context cache rewrites the config per model; start every attempt from the original.
+            llm_request.config = config
+            started = time.monotonic()
+            if stream:
+                async for response in super().generate_content_async(llm_request, stream=True):
+                    yield response
+                latency_stats.record(self.role, model, time.monotonic() - started)
+                return
+            responses = [r async for r in super().generate_content_async(llm_request, stream=False)]
+            elapsed = time.monotonic() - started
+            reason = escalation_reason(self.role, responses[-1] if responses else None)
+            last = attempt == len(models) - 1
+            latency_stats.record(self.role, model, elapsed, escalated=bool(reason) and not last)
+            logger.debug("LLM %s on %s took %.2fs", self.role, model, elapsed)
+            if reason and not last:
+                logger.info("Escalating %s from %s to %s: %s", self.role, model, models[attempt + 1], reason)
+                used = responses[-1].usage_metadata if responses else None
+                discarded.append({
+                    "model": model,
+                    "usage": used.model_dump(mode="json", exclude_none=True) if used else {},
+                    "seconds": elapsed,
+                })
+                continue
+            for index, response in enumerate(responses):
+                metadata = {**(response.custom_metadata or {}), MODEL_KEY: model}
+                if discarded and index == len(responses) - 1:
+                    metadata[DISCARDED_KEY] = discarded
+                response.custom_metadata = metadata
+                yield response
+            return
+def model_for(role: str) -> RoutedGeminiLLM:
+    """Model for an agent role: its tier's model, escalating through the tiers above it"""
+    tier = ROLE_TIERS.get(role, "pro")
+    model = TIER_MODELS[tier]
+    escalation = []
+    if ESCALATION and role in JSON_ROLES:
+        escalation = [TIER_MODELS[t] for t in TIERS[TIERS.index(tier) + 1:] if TIER_MODELS[t] != model]
+    return RoutedGeminiLLM(model=model, role=role, escalation=list(dict.fromkeys(escalation)))
@@ -0,0 +1,76 @@
+"""
+Live progress of running scans.
+The caller (a Celery task) gives the runner a `ProgressChannel` bound to a
+write function; `instrument()` hooks the first sub-agent of every LoopAgent,
+so each loop iteration reports (stage, iteration, max_iterations). The channel
+turns that into a 0..1 fraction and calls `write` at most every
+PROGRESS_INTERVAL seconds, off the event loop. A multi-detector scan moves the
+channel to the next stage before each detector.
+"""
+import os
+import time
+import logging
+from collections import Counter
+from typing import Callable, Dict, Optional
+from google.adk.agents import LoopAgent
+from google.adk.agents.callback_context import CallbackContext
+from app.agents import runtime
+logger = logging.getLogger(__name__)
+PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", "10"))
+class ProgressChannel:
+    def __init__(self, write: Callable[[float, dict], None], interval: float = PROGRESS_INTERVAL, stages: int = 1):
+        self._write = write
+        self.interval = interval
+        self.stages = max(1, stages)
+        self.stage = 0
+        self.iterations: Counter = Counter()
+        self.max_iterations: Dict[str, int] = {}
+        self.fraction = 0.0
+        self._written_at = 0.0
+    def set_stage(self, index: int, total: Optional[int] = None) -> None:
+        if total:
+            self.stages = max(1, total)
+        self.stage = index
+        self.iterations.clear()
+        self.fraction = max(self.fraction, index / self.stages)
+    def detail(self) -> dict:
+        loop = next(reversed(self.iterations), None)
+        return {
+            "stage": self.stage,
+            "stages": self.stages,
+            "loop": loop,
+            "iteration": self.iterations[loop] if loop else 0,
+            "max_iterations": self.max_iterations.get(loop, 0) if loop else 0,
+        }
+    async def iteration(self, loop: str, max_iterations: int) -> None:
+        self.iterations[loop] += 1
+        self.max_iterations[loop] = max_iterations
+        done = (self.iterations[loop] - 1) / max(1, max_iterations)
+        self.fraction = max(self.fraction, (self.stage + min(done, 0.95)) / self.stages)
+        await self.flush()
+    async def flush(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._written_at < self.interval:
+            return
+        self._written_at = now
+        try:
+            await runtime.to_thread(self._write, round(self.fraction, 4), self.detail())
+        except Exception as ex:
+            logger.debug("Progress write failed: %r", ex)
+_channels: Dict[str, ProgressChannel] = {}
+def attach(session_id: str, channel: ProgressChannel) -> None:
+    _channels[session_id] = channel
+def detach(session_id: str) -> None:
+    _channels.pop(session_id, None)
+def iteration_callback(loop: LoopAgent):
+    """before_agent_callback for the loop's first sub-agent: one call per iteration"""
+    async def before_agent_callback(callback_context: CallbackContext):
+        try:
+            channel = _channels.get(callback_context._invocation_context.session.id)
+        except AttributeError:
+            channel = None
+        if channel is not None:
+            await channel.iteration(loop.name, loop.max_iterations or 0)
+        return None
+    before_agent_callback.progress_loop = loop.name
+    return before_agent_callback
@@ -0,0 +1,18 @@
+"""Role/detector naming helpers for the `<detector>_<role>_agent` convention."""
+ROLES = ("ingest", "decider", "navigator", "form_filler", "parser", "critic", "result")
+def _split(agent_name: str) -> tuple[str, str]:
+    base = (agent_name or "").removesuffix("_agent")
+    for role in ROLES:
+        if base == role:
+            return "browser", role
+        if base.endswith("_" + role):
+            return base[: -len(role) - 1], role
+    return "", base
+def agent_role(agent_name: str) -> str:
+    """`drip_pricing_decider_agent` -> `decider`"""
+    return _split(agent_name)[1]
+def agent_detector(agent_name: str) -> str:
+    """`drip_pricing_decider_agent` -> `drip_pricing`; bare `decider_agent` -> `browser`"""
+    return _split(agent_name)[0]
+def parse_roles(raw: str) -> frozenset[str]:
+    return frozenset(r.strip() for r in (raw or "").split(",") if r.strip())
@@ -0,0 +1,84 @@
+"""
+Validation of the JSON state written by the detector agents.
+The decider and critic answer through an ADK `output_schema` and the parser
+through JSON-constrained decoding, so their `output_key` state should always
+be a dict. The after-agent callback here checks that against the schemas in
+`agent_utils/schema.py`, turns leftover JSON text into a dict, and when an
+answer is still unusable puts the previous valid value back, so the next
+iteration and `*_after_loop_callback` keep working from real data.
+"""
+import logging
+import threading
+from typing import Optional
+from pydantic import BaseModel, ValidationError
+from google.adk.agents.callback_context import CallbackContext
+from google.genai import types
+from ..agent_utils.schema import DeciderOut, ParserOut, CriticOut
+from .model_router import extract_json
+from .roles import agent_role
+logger = logging.getLogger(__name__)
+# For agents without tools: any JSON object, the detector-specific fields vary too much for one schema.
+JSON_RESPONSE = types.GenerateContentConfig(response_mime_type="application/json")
+ROLE_OUTPUT_KEYS = {
+    "ingest": "plan",
+    "decider": "decider_json",
+    "parser": "parsed",
+    "critic": "critic_json",
+    "result": "result_json",
+}
+ROLE_SCHEMAS: dict[str, type[BaseModel]] = {
+    "decider": DeciderOut,
+    "parser": ParserOut,
+    "critic": CriticOut,
+}
+def _snapshot_key(output_key: str) -> str:
+    return f"temp:structured_output:{output_key}"
+class _ValidationStats:
+    OUTCOMES = ("valid", "repaired", "invalid", "empty")
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict[str, int]] = {}
+    def record(self, role: str, outcome: str) -> None:
+        with self._lock:
+            row = self._stats.setdefault(role, dict.fromkeys(self.OUTCOMES, 0))
+            row[outcome] += 1
+    def snapshot(self) -> dict[str, dict[str, int]]:
+        with self._lock:
+            return {role: dict(row) for role, row in self._stats.items()}
+validation_stats = _ValidationStats()
+def validate_output(role: str, value) -> tuple[str, Optional[dict]]:
+    """Classify an agent's state value and return it as a dict when it is usable"""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return "empty", None
+    outcome = "valid"
+    if not isinstance(value, dict):
+        value = extract_json(value) if isinstance(value, str) else None
+        if not isinstance(value, dict):
+            return "invalid", None
+        outcome = "repaired"
+    schema = ROLE_SCHEMAS.get(role)
+    if schema is not None:
+        try:
+            value = schema.model_validate(value).model_dump(exclude_none=True)
+        except ValidationError:
+            return "invalid", None
+    return outcome, value
+def before_agent_callback(callback_context: CallbackContext) -> Optional[types.Content]:
+    output_key = ROLE_OUTPUT_KEYS.get(agent_role(callback_context.agent_name))
+    if output_key and isinstance(callback_context.state.get(output_key), dict):
+        callback_context.state[_snapshot_key(output_key)] = callback_context.state[output_key]
+    return None
+def after_agent_callback(callback_context: CallbackContext) -> Optional[types.Content]:
+    role = agent_role(callback_context.agent_name)
+    output_key = ROLE_OUTPUT_KEYS.get(role)
+    if not output_key:
+        return None
+    state = callback_context.state
+    outcome, value = validate_output(role, state.get(output_key))
+    validation_stats.record(role, outcome)
+    if value is not None:
+        state[output_key] = value
+    elif outcome == "invalid":
+        logger.warning("%s returned unusable %s, keeping the previous value", callback_context.agent_name, output_key)
+        state[output_key] = state.get(_snapshot_key(output_key))
+    return None
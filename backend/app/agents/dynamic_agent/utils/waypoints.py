@@ -0,0 +1,78 @@
+"""
+Navigation trail and site-map hints for detector loops.
+Every browser action a navigator or form filler takes (navigate, click, type,
+select...) is appended to state[TRAIL_KEY] with the decider's current phase,
+the action's target and the page URL it ended on. After the run the trail is
+turned into per-domain waypoints (app/processing/waypoints.py).
+Waypoints known from earlier scans arrive in state[HINTS_KEY]; the ingest
+and decider agents get them as an extra message, so a rescan can go straight
+to the cart or the cancellation page instead of looking for it again.
+"""
+import re
+import json
+from typing import Any, Dict, List, Optional
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.tool_context import ToolContext
+from google.genai import types
+TRAIL_KEY = "__waypoint_trail__"
+HINTS_KEY = "site_hints"
+MAX_TRAIL = 200
+HINT_ROLES = frozenset({"ingest", "decider"})
+# playwright-mcp tools and their in-process counterparts (tools/browser_tools.py).
+ACTION_TOOLS = frozenset({
+    "browser_navigate", "browser_navigate_back", "browser_click", "browser_type", "browser_select_option",
+    "browser_press_key", "browser_fill_form", "open_url", "click_text", "click_css", "type_css",
+})
+# Their `text` is what gets typed, not what gets clicked.
+TYPING_TOOLS = frozenset({"browser_type", "browser_fill_form", "type_css"})
+_PAGE_URL = re.compile(r"Page URL:\s*(\S+)")
+def _target(tool_name: str, args: Dict[str, Any]) -> str:
+    # Typed text is never kept: form fillers enter test personal data.
+    keys = ("element", "selector") if tool_name in TYPING_TOOLS else ("url", "element", "text", "selector", "key", "values")
+    for key in keys:
+        value = args.get(key)
+        if value:
+            return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+    return ""
+def _text_of(tool_response: Any) -> str:
+    if isinstance(tool_response, dict) and isinstance(tool_response.get("content"), list):
+        return "\n".join(str(part.get("text", "")) for part in tool_response["content"] if isinstance(part, dict))
+    return str(tool_response)
+def _outcome(tool_response: Any) -> tuple[bool, Optional[str]]:
+    """(succeeded, page URL after the action) from a browser_tools dict or an MCP call result"""
+    if isinstance(tool_response, dict):
+        ok = not (tool_response.get("isError") or tool_response.get("status") in ("error", "not_found", "disabled"))
+        url = tool_response.get("url") if isinstance(tool_response.get("url"), str) else None
+    else:
+        ok, url = True, None
+    if url is None:
+        match = _PAGE_URL.search(_text_of(tool_response))
+        url = match.group(1) if match else None
+    return ok, url
+def after_tool_callback(tool: BaseTool, args: dict, tool_context: ToolContext, tool_response) -> Optional[dict]:
+    if tool.name not in ACTION_TOOLS:
+        return None
+    decider = tool_context.state.get("decider_json")
+    phase = (decider.get("current_phase") if isinstance(decider, dict) else None) or "page"
+    ok, url = _outcome(tool_response)
+    if url is None and ok and tool.name in ("browser_navigate", "open_url"):
+        url = args.get("url")
+    trail = list(tool_context.state.get(TRAIL_KEY) or [])[-(MAX_TRAIL - 1):]
+    trail.append({"phase": phase, "tool": tool.name, "target": _target(tool.name, args or {}), "url": url, "ok": ok})
+    tool_context.state[TRAIL_KEY] = trail
+    return None
+def format_hints(hints: List[Dict[str, Any]]) -> str:
+    lines = ["Карта сайта из прошлых проверок (может устареть — сверяйся со страницей, при ошибке ищи путь заново):"]
+    for hint in hints:
+        line = f"- фаза {hint['phase']}: {hint['url']}"
+        if hint.get("actions"):
+            line += " (путь: " + " → ".join(hint["actions"]) + ")"
+        lines.append(line)
+    return "\n".join(lines)
+def before_model_callback(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+    hints = callback_context.state.get(HINTS_KEY)
+    if hints:
+        llm_request.contents.append(types.Content(role="user", parts=[types.Part(text=format_hints(hints))]))
+    return None
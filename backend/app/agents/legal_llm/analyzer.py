@@ -2,11 +2,15 @@
 Legal contract analyzer using Google Gemini AI with grouped parallel analysis
 """
 import os
+import time
 import asyncio
 from datetime import datetime
 from typing import Optional
 from google import genai
-from google.genai.types import GenerateContentConfig, SafetySetting, HarmCategory, HttpOptions, HarmBlockThreshold
+from google.genai.types import GenerateContentConfig, SafetySetting, HarmCategory, HttpOptions, HarmBlockThreshold, Content, Part
+from app.agents import usage
+from app.agents.rate_limiter import get_rate_limiter, estimate_tokens
+from app.agents.context_cache import get_context_cache
 from .models import (
     LegalAnalysisResult,
     ConsumerProtectionAnalysis,
@@ -16,6 +20,10 @@ from .models import (
     RegulatoryComplianceAnalysis,
     ComplianceStatus
 )
+# Stands in for the contract body in the group prompts when it is served from a context cache
+CACHED_CONTRACT_REF = "(полный текст договора передан выше в начале запроса)"
+# The per-document cache only has to outlive the five parallel group calls
+CONTRACT_CACHE_TTL = int(os.getenv("LEGAL_LLM_CONTRACT_CACHE_TTL", "600"))
 def _create_consumer_protection_prompt(contract_text: str) -> str:
     """Create prompt for consumer protection analysis"""
     return f"""
@@ -206,7 +214,8 @@ async def _analyze_group(
     client: genai.Client,
     prompt: str,
     model_name: str,
-    response_schema: type
+    response_schema: type,
+    cached_content: Optional[str] = None
 ) -> dict:
     """Analyze a single group of criteria"""
     config = GenerateContentConfig(
@@ -234,11 +243,20 @@ async def _analyze_group(
             ),
         ]
     )
-    response = await client.aio.models.generate_content(
-        model=model_name,
-        contents=prompt,
-        config=config
-    )
+    registry = get_context_cache()
+    config = registry.config_for(cached_content, config)
+    contents = registry.contents_for(cached_content, [Content(role="user", parts=[Part(text=prompt)])])
+    texts = [part.text for content in contents for part in content.parts or []]
+    async with get_rate_limiter().limit(model_name, estimate_tokens(*texts, output_tokens=8192)) as lease:
+        started = time.monotonic()
+        response = await client.aio.models.generate_content(
+            model=model_name,
+            contents=contents,
+            config=config
+        )
+        usage.record(response_schema.__name__, model_name, response.usage_metadata, time.monotonic() - started, detector="legal")
+        if response.usage_metadata and response.usage_metadata.total_token_count:
+            lease.used_tokens = response.usage_metadata.total_token_count
     if not response.candidates or not response.candidates[0].content.parts:
         raise Exception("No response generated by Gemini")
     if hasattr(response, 'parsed') and response.parsed:
@@ -313,39 +331,58 @@ def analyze_contract(
     client = _configure_gemini()
     async def run_parallel_analysis():
         """Run all analysis groups in parallel"""
+        # The contract body is the shared prefix of all five group prompts:
+        # upload it once as a context cache and let each group reference it.
+        registry = get_context_cache()
+        cache_name = await registry.get_or_create(
+            client,
+            model_name,
+            contents=[Content(role="user", parts=[Part(text=f"ТЕКСТ ДОГОВОРА:\n{contract_text}")])],
+            ttl=CONTRACT_CACHE_TTL,
+            min_uses=1,
+        )
+        text = CACHED_CONTRACT_REF if cache_name else contract_text
         tasks = [
             _analyze_group(
                 client,
-                _create_consumer_protection_prompt(contract_text),
+                _create_consumer_protection_prompt(text),
                 model_name,
-                ConsumerProtectionAnalysis
+                ConsumerProtectionAnalysis,
+                cache_name
             ),
             _analyze_group(
                 client,
-                _create_legal_framework_prompt(contract_text),
+                _create_legal_framework_prompt(text),
                 model_name,
-                LegalFrameworkAnalysis
+                LegalFrameworkAnalysis,
+                cache_name
             ),
             _analyze_group(
                 client,
-                _create_data_protection_prompt(contract_text),
+                _create_data_protection_prompt(text),
                 model_name,
-                DataProtectionAnalysis
+                DataProtectionAnalysis,
+                cache_name
             ),
             _analyze_group(
                 client,
-                _create_contract_structure_prompt(contract_text),
+                _create_contract_structure_prompt(text),
                 model_name,
-                ContractStructureAnalysis
+                ContractStructureAnalysis,
+                cache_name
             ),
             _analyze_group(
                 client,
-                _create_regulatory_compliance_prompt(contract_text),
+                _create_regulatory_compliance_prompt(text),
                 model_name,
-                RegulatoryComplianceAnalysis
+                RegulatoryComplianceAnalysis,
+                cache_name
             )
         ]
-        results = await asyncio.gather(*tasks)
+        try:
+            results = await asyncio.gather(*tasks)
+        finally:
+            await registry.release(client, cache_name)
         return {
             'consumer_protection': results[0],
             'legal_framework': results[1],
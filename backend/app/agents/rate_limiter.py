@@ -0,0 +1,292 @@
+"""
+Cluster-wide rate limiter and concurrency governor for LLM calls.
+Every worker acquires from the same Redis token buckets (requests/minute and
+tokens/minute) and the same concurrency lease set, keyed per model. Lower
+priority lanes may not drain the last part of each bucket, so HIGH priority
+tasks keep flowing when the fleet is saturated. Without Redis the limiter
+degrades to an equivalent in-process implementation.
+"""
+import os
+import time
+import uuid
+import asyncio
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager, asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Optional, Dict, Tuple, Iterable
+logger = logging.getLogger(__name__)
+PRIORITY_HIGH = "high"
+PRIORITY_NORMAL = "normal"
+PRIORITY_LOW = "low"
+# Share of every bucket (and of the concurrency slots) a lane is not allowed to use.
+LANE_RESERVE: Dict[str, float] = {
+    PRIORITY_HIGH: 0.0,
+    PRIORITY_NORMAL: float(os.getenv("LLM_RESERVE_NORMAL", "0.15")),
+    PRIORITY_LOW: float(os.getenv("LLM_RESERVE_LOW", "0.35")),
+}
+_PRIORITY: contextvars.ContextVar[str] = contextvars.ContextVar("llm_priority", default=PRIORITY_NORMAL)
+@dataclass(frozen=True)
+class ModelQuota:
+    rpm: int
+    tpm: int
+    concurrency: int
+def _parse_quotas(raw: str) -> Dict[str, ModelQuota]:
+    """Parse LLM_RATE_LIMITS, e.g. 'gemini-2.5-pro=150:2000000:16,gemini-2.5-flash=1000:4000000:64'"""
+    quotas = {}
+    for chunk in filter(None, (c.strip() for c in raw.split(","))):
+        try:
+            name, spec = chunk.split("=", 1)
+            rpm, tpm, concurrency = (int(x) for x in spec.split(":"))
+        except ValueError:
+            logger.warning("Ignoring malformed LLM_RATE_LIMITS entry: %r", chunk)
+            continue
+        quotas[name.strip()] = ModelQuota(rpm=rpm, tpm=tpm, concurrency=concurrency)
+    return quotas
+DEFAULT_QUOTA = ModelQuota(
+    rpm=int(os.getenv("LLM_DEFAULT_RPM", "150")),
+    tpm=int(os.getenv("LLM_DEFAULT_TPM", "2000000")),
+    concurrency=int(os.getenv("LLM_DEFAULT_CONCURRENCY", "16")),
+)
+QUOTAS = _parse_quotas(os.getenv("LLM_RATE_LIMITS", ""))
+# Target fraction of the provider quota; keeps the fleet just under the 429 line.
+HEADROOM = float(os.getenv("LLM_RATE_HEADROOM", "0.9"))
+EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "1024"))
+LEASE_TTL_SECONDS = int(os.getenv("LLM_LEASE_TTL", "600"))
+MAX_WAIT_SECONDS = float(os.getenv("LLM_MAX_WAIT", "900"))
+def quota_for(model: str) -> ModelQuota:
+    name = (model or "").rsplit("/", 1)[-1]
+    return QUOTAS.get(name, DEFAULT_QUOTA)
+def estimate_tokens(*texts: Optional[str], output_tokens: int = EXPECTED_OUTPUT_TOKENS) -> int:
+    """Rough pre-call token estimate (~4 chars per token) plus an output reservation"""
+    chars = sum(len(t) for t in texts if t)
+    return chars // 4 + output_tokens
+def current_priority() -> str:
+    return _PRIORITY.get()
+@contextmanager
+def llm_priority(priority: Optional[str]):
+    """Run LLM calls made inside the block (including asyncio tasks it spawns) in the given lane"""
+    token = _PRIORITY.set(priority if priority in LANE_RESERVE else PRIORITY_NORMAL)
+    try:
+        yield
+    finally:
+        _PRIORITY.reset(token)
+@dataclass
+class Lease:
+    model: str
+    lease_id: str
+    reserved_tokens: int
+    used_tokens: Optional[int] = None
+    waited: float = 0.0
+    acquired_at: float = field(default_factory=time.monotonic)
+class RateLimitTimeout(Exception):
+    pass
+_TAKE_LUA = """
+local now = tonumber(ARGV[1])
+local reserve = tonumber(ARGV[4])
+local amounts = {1, tonumber(ARGV[5])}
+local caps = {tonumber(ARGV[2]), tonumber(ARGV[3])}
+local levels = {}
+local wait = 0
+for i = 1, 2 do
+  local cap = caps[i]
+  local rate = cap / 60.0
+  local b = redis.call('HMGET', KEYS[i], 'level', 'ts')
+  local level = tonumber(b[1]) or cap
+  local ts = tonumber(b[2]) or now
+  level = math.min(cap, level + math.max(0, now - ts) * rate)
+  levels[i] = level
+  local floor = cap * reserve
+  local need = math.min(amounts[i], cap - floor)
+  local deficit = need + floor - level
+  if deficit > 0 then
+    wait = math.max(wait, deficit / rate)
+  end
+end
+if wait > 0 then
+  return tostring(wait)
+end
+for i = 1, 2 do
+  redis.call('HSET', KEYS[i], 'level', levels[i] - amounts[i], 'ts', now)
+  redis.call('EXPIRE', KEYS[i], 180)
+end
+return '0'
+"""
+_LEASE_LUA = """
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+  return 0
+end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[4]), ARGV[3])
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[4]) * 2)
+return 1
+"""
+class _LocalBackend:
+    """Process-local twin of the Redis scripts; used when Redis is not reachable"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._leases: Dict[str, Dict[str, float]] = {}
+    async def take(self, keys: Tuple[str, str], caps: Tuple[float, float], reserve: float, tokens: int) -> float:
+        now = time.time()
+        with self._lock:
+            levels, wait = [], 0.0
+            for key, cap, amount in zip(keys, caps, (1, tokens)):
+                rate = cap / 60.0
+                level, ts = self._buckets.get(key, (cap, now))
+                level = min(cap, level + max(0.0, now - ts) * rate)
+                levels.append(level)
+                floor = cap * reserve
+                deficit = min(amount, cap - floor) + floor - level
+                if deficit > 0:
+                    wait = max(wait, deficit / rate)
+            if wait > 0:
+                return wait
+            for key, level, amount in zip(keys, levels, (1, tokens)):
+                self._buckets[key] = (level - amount, now)
+            return 0.0
+    async def adjust(self, key: str, delta: float) -> None:
+        with self._lock:
+            if key in self._buckets:
+                level, ts = self._buckets[key]
+                self._buckets[key] = (level + delta, ts)
+    async def drain(self, keys: Iterable[str]) -> None:
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                self._buckets[key] = (0.0, now)
+    async def lease(self, key: str, limit: int, lease_id: str) -> bool:
+        now = time.time()
+        with self._lock:
+            leases = self._leases.setdefault(key, {})
+            for lid in [lid for lid, exp in leases.items() if exp <= now]:
+                leases.pop(lid, None)
+            if len(leases) >= limit:
+                return False
+            leases[lease_id] = now + LEASE_TTL_SECONDS
+            return True
+    async def unlease(self, key: str, lease_id: str) -> None:
+        with self._lock:
+            self._leases.get(key, {}).pop(lease_id, None)
+class _RedisBackend:
+    def __init__(self, url: str):
+        import redis.asyncio as aioredis
+        self._url = url
+        self._aioredis = aioredis
+        self._clients: Dict[int, object] = {}
+    def _client(self):
+        # redis.asyncio connections are bound to the loop that created them;
+        # analyze_contract spins a fresh loop per call via asyncio.run.
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(id(loop))
+        if client is None:
+            client = self._aioredis.from_url(self._url, socket_timeout=2, socket_connect_timeout=2)
+            self._clients = {k: v for k, v in self._clients.items() if k == id(loop)}
+            self._clients[id(loop)] = client
+        return client
+    async def take(self, keys, caps, reserve, tokens) -> float:
+        wait = await self._client().eval(_TAKE_LUA, 2, *keys, time.time(), caps[0], caps[1], reserve, tokens)
+        return float(wait)
+    async def adjust(self, key: str, delta: float) -> None:
+        await self._client().hincrbyfloat(key, "level", delta)
+    async def drain(self, keys: Iterable[str]) -> None:
+        client = self._client()
+        for key in keys:
+            await client.hset(key, mapping={"level": 0, "ts": time.time()})
+    async def lease(self, key: str, limit: int, lease_id: str) -> bool:
+        ok = await self._client().eval(_LEASE_LUA, 1, key, time.time(), limit, lease_id, LEASE_TTL_SECONDS)
+        return bool(ok)
+    async def unlease(self, key: str, lease_id: str) -> None:
+        await self._client().zrem(key, lease_id)
+class LLMRateLimiter:
+    """Token-bucket (RPM + TPM) and concurrency governor keyed per model"""
+    def __init__(self, redis_url: Optional[str] = None, prefix: str = "llm:rl"):
+        self.prefix = prefix
+        self._local = _LocalBackend()
+        self._backend = self._local
+        if redis_url:
+            try:
+                self._backend = _RedisBackend(redis_url)
+            except Exception as ex:
+                logger.warning("Redis rate limiter unavailable (%r); using process-local limits", ex)
+    def _keys(self, model: str) -> Tuple[str, str, str]:
+        name = (model or "default").rsplit("/", 1)[-1]
+        base = f"{self.prefix}:{name}"
+        return f"{base}:rpm", f"{base}:tpm", f"{base}:conc"
+    async def _call(self, method: str, *args):
+        try:
+            return await getattr(self._backend, method)(*args)
+        except Exception as ex:
+            if self._backend is self._local:
+                raise
+            logger.warning("Redis rate limiter error (%r); falling back to process-local limits", ex)
+            self._backend = self._local
+            return await getattr(self._local, method)(*args)
+    async def acquire(self, model: str, tokens: int, priority: Optional[str] = None) -> Lease:
+        priority = priority or current_priority()
+        reserve = LANE_RESERVE.get(priority, LANE_RESERVE[PRIORITY_NORMAL])
+        quota = quota_for(model)
+        caps = (max(1.0, quota.rpm * HEADROOM), max(1.0, quota.tpm * HEADROOM))
+        rpm_key, tpm_key, conc_key = self._keys(model)
+        slots = max(1, int(quota.concurrency * (1 - reserve)))
+        lease_id = uuid.uuid4().hex
+        started = time.monotonic()
+        backoff = 0.05
+        while not await self._call("lease", conc_key, slots, lease_id):
+            await self._sleep(started, backoff)
+            backoff = min(backoff * 2, 1.0)
+        try:
+            while True:
+                wait = await self._call("take", (rpm_key, tpm_key), caps, reserve, int(tokens))
+                if wait <= 0:
+                    break
+                await self._sleep(started, wait)
+        except BaseException:
+            await self._call("unlease", conc_key, lease_id)
+            raise
+        waited = time.monotonic() - started
+        if waited > 1:
+            logger.info("LLM limiter: %s waited %.1fs in %s lane", model, waited, priority)
+        return Lease(model=model, lease_id=lease_id, reserved_tokens=int(tokens), waited=waited)
+    async def _sleep(self, started: float, wait: float) -> None:
+        if time.monotonic() - started + wait > MAX_WAIT_SECONDS:
+            raise RateLimitTimeout(f"LLM rate limiter wait exceeded {MAX_WAIT_SECONDS:.0f}s")
+        await asyncio.sleep(wait)
+    async def release(self, lease: Lease) -> None:
+        rpm_key, tpm_key, conc_key = self._keys(lease.model)
+        try:
+            if lease.used_tokens is not None and lease.used_tokens != lease.reserved_tokens:
+                await self._call("adjust", tpm_key, lease.reserved_tokens - lease.used_tokens)
+        finally:
+            await self._call("unlease", conc_key, lease.lease_id)
+    async def penalize(self, model: str) -> None:
+        """Empty the buckets after a provider 429 so the whole fleet backs off together"""
+        rpm_key, tpm_key, _ = self._keys(model)
+        await self._call("drain", (rpm_key, tpm_key))
+    @asynccontextmanager
+    async def limit(self, model: str, tokens: int, priority: Optional[str] = None):
+        lease = await self.acquire(model, tokens, priority)
+        try:
+            yield lease
+        except Exception as ex:
+            if is_rate_limit_error(ex):
+                await self.penalize(model)
+            raise
+        finally:
+            await self.release(lease)
+def is_rate_limit_error(ex: BaseException) -> bool:
+    return getattr(ex, "code", None) == 429 or "RESOURCE_EXHAUSTED" in str(ex)
+_limiter: Optional[LLMRateLimiter] = None
+_limiter_lock = threading.Lock()
+def get_rate_limiter() -> LLMRateLimiter:
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                url = None
+                if os.getenv("LLM_RATE_LIMIT_BACKEND", "redis").lower() == "redis":
+                    url = os.getenv("LLM_RATE_LIMIT_REDIS_URL") or os.getenv("REDIS_URL")
+                _limiter = LLMRateLimiter(redis_url=url)
+    return _limiter
@@ -0,0 +1,67 @@
+"""
+Process-wide asyncio loop for agent work in synchronous workers.
+Browser pools, MCP sessions and GenAI clients are bound to the event loop
+that created them. Running every coroutine on one long-lived loop (in a
+daemon thread) lets them survive from one Celery task to the next instead of
+being rebuilt by each `asyncio.run`. Start it only after the worker process
+has forked.
+Many Celery threads (`-P threads`) can submit scans at once; they all run
+concurrently on this loop while the threads themselves only wait and do the
+blocking Django ORM work.
+"""
+import os
+import asyncio
+import threading
+import contextvars
+import concurrent.futures
+from typing import Any, Awaitable, Callable, Optional
+DB_THREADS = int(os.getenv("AGENT_DB_THREADS", "4"))
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_lock = threading.Lock()
+_db_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+def get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="agent-runtime", daemon=True).start()
+            _loop = loop
+        return _loop
+def run(coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+    """Run a coroutine on the shared loop and wait for its result.
+    The caller's context variables (e.g. the LLM priority lane) are carried over.
+    """
+    loop = get_loop()
+    context = contextvars.copy_context()
+    future: concurrent.futures.Future = concurrent.futures.Future()
+    started: list = []
+    def start():
+        if not future.set_running_or_notify_cancel():
+            coro.close()
+            return
+        task = loop.create_task(coro, context=context)
+        started.append(task)
+        def done(t: asyncio.Task):
+            if t.cancelled():
+                future.cancel()
+            elif t.exception() is not None:
+                future.set_exception(t.exception())
+            else:
+                future.set_result(t.result())
+        task.add_done_callback(done)
+    loop.call_soon_threadsafe(start)
+    try:
+        return future.result(timeout)
+    except TimeoutError:
+        if not future.cancel():
+            # A running future can't be cancelled; stop the task itself so it
+            # gives back its slot, browser and MCP lease. Runs after `start`.
+            loop.call_soon_threadsafe(lambda: [task.cancel() for task in started])
+        raise
+async def to_thread(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run blocking work (Django ORM writes) off the loop, on a small dedicated pool"""
+    global _db_executor
+    if _db_executor is None:
+        _db_executor = concurrent.futures.ThreadPoolExecutor(DB_THREADS, thread_name_prefix="agent-db")
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_db_executor, lambda: context.run(fn, *args, **kwargs))
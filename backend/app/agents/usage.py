@@ -0,0 +1,107 @@
+"""
+Token, cost and latency accounting for LLM calls.
+A `UsageMeter` is installed for the duration of a task (`metering()`); every
+`generate_content` response recorded while it is active - ADK model callbacks
+and the legal analyzer - is added to it under (detector, role, model). The
+meter travels through context variables, so calls made on the agent runtime
+loop or inside `asyncio.run` are attributed to the task that started them.
+Prices are USD per 1M tokens, overridable with LLM_PRICES
+('gemini-2.5-pro=1.25:10,gemini-2.5-flash=0.3:2.5').
+"""
+import os
+import logging
+import contextvars
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterator, Optional, Tuple
+logger = logging.getLogger(__name__)
+DEFAULT_PRICES = {
+    "gemini-2.5-pro": (1.25, 10.0),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+}
+CACHED_INPUT_DISCOUNT = 0.25
+def _parse_prices(raw: str) -> Dict[str, Tuple[float, float]]:
+    prices = dict(DEFAULT_PRICES)
+    for chunk in filter(None, (c.strip() for c in raw.split(","))):
+        try:
+            name, spec = chunk.split("=", 1)
+            prompt, output = (float(x) for x in spec.split(":"))
+        except ValueError:
+            logger.warning("Ignoring malformed LLM_PRICES entry: %r", chunk)
+            continue
+        prices[name.strip()] = (prompt, output)
+    return prices
+PRICES = _parse_prices(os.getenv("LLM_PRICES", ""))
+def price_for(model: str) -> Tuple[float, float]:
+    name = (model or "").rsplit("/", 1)[-1]
+    if name in PRICES:
+        return PRICES[name]
+    # Versioned names (gemini-2.5-flash-preview-05-20) fall back to the longest known prefix.
+    for known in sorted(PRICES, key=len, reverse=True):
+        if name.startswith(known):
+            return PRICES[known]
+    return (0.0, 0.0)
+@dataclass
+class Usage:
+    calls: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    output_tokens: int = 0
+    total_tokens: int = 0
+    latency_ms: int = 0
+    cost_usd: float = 0.0
+    def add(self, other: "Usage") -> None:
+        for name, value in asdict(other).items():
+            setattr(self, name, getattr(self, name) + value)
+def usage_from(model: str, usage_metadata, latency: float = 0.0) -> Usage:
+    prompt = getattr(usage_metadata, "prompt_token_count", None) or 0
+    cached = getattr(usage_metadata, "cached_content_token_count", None) or 0
+    output = (getattr(usage_metadata, "candidates_token_count", None) or 0) + (
+        getattr(usage_metadata, "thoughts_token_count", None) or 0
+    )
+    total = getattr(usage_metadata, "total_token_count", None) or prompt + output
+    prompt_price, output_price = price_for(model)
+    cost = ((prompt - cached) + cached * CACHED_INPUT_DISCOUNT) * prompt_price / 1e6 + output * output_price / 1e6
+    return Usage(1, prompt, cached, output, total, int(latency * 1000), round(cost, 6))
+class UsageMeter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.rows: Dict[Tuple[str, str, str], Usage] = {}
+    def record(self, role: str, model: str, usage_metadata, latency: float = 0.0, detector: Optional[str] = None) -> Usage:
+        usage = usage_from(model, usage_metadata, latency)
+        key = (detector if detector is not None else _detector.get(), role or "", model or "")
+        with self._lock:
+            self.rows.setdefault(key, Usage()).add(usage)
+        return usage
+    def totals(self) -> Usage:
+        total = Usage()
+        with self._lock:
+            for usage in self.rows.values():
+                total.add(usage)
+        return total
+_meter: contextvars.ContextVar[Optional[UsageMeter]] = contextvars.ContextVar("usage_meter", default=None)
+_detector: contextvars.ContextVar[str] = contextvars.ContextVar("usage_detector", default="")
+def current_meter() -> Optional[UsageMeter]:
+    return _meter.get()
+@contextmanager
+def metering(meter: Optional[UsageMeter] = None) -> Iterator[UsageMeter]:
+    meter = meter or UsageMeter()
+    token = _meter.set(meter)
+    try:
+        yield meter
+    finally:
+        _meter.reset(token)
+@contextmanager
+def detector_scope(name: str):
+    """Attribute calls made inside the block to a pipeline that agent names don't identify"""
+    token = _detector.set(name)
+    try:
+        yield
+    finally:
+        _detector.reset(token)
+def record(role: str, model: str, usage_metadata, latency: float = 0.0, detector: Optional[str] = None) -> None:
+    meter = _meter.get()
+    if meter is not None and usage_metadata is not None:
+        meter.record(role, model, usage_metadata, latency, detector)
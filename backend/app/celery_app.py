@@ -1,6 +1,25 @@
 import os
 from celery import Celery
+from celery.concurrency import get_implementation
+from celery.signals import worker_init, worker_process_init
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
 app = Celery("app")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
+def _forks(pool_cls) -> bool:
+    if isinstance(pool_cls, str):
+        pool_cls = get_implementation(pool_cls)
+    return pool_cls.__module__.endswith(".prefork")
+@worker_process_init.connect
+def warm_up_worker(**kwargs):
+    from app.processing.warmup import warm_up
+    warm_up()
+@worker_init.connect
+def warm_up_threaded_worker(sender=None, **kwargs):
+    # worker_process_init only fires in forked children; threads/solo pools run
+    # tasks in this process, so warm it here. Never before a fork: the runtime
+    # loop and its browsers would not survive into the children.
+    if sender is None or _forks(getattr(sender, "pool_cls", "prefork")):
+        return
+    from app.processing.warmup import warm_up
+    warm_up()
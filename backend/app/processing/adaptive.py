@@ -0,0 +1,82 @@
+"""
+Detector limits learned from earlier runs.
+Every detector run leaves a DetectorRunStat (iterations, seconds, tokens,
+browser actions, outcome) for its site's domain. The next run of that detector
+gets a budget sized to ADAPTIVE_PERCENTILE of recent finished runs times
+ADAPTIVE_MARGIN - on the same domain if there is enough history there,
+otherwise across all domains - but never above the configured limits.
+If too many recent runs were cut short by a limit, the configured limits are
+used again until finished runs catch up.
+"""
+import os
+import math
+import logging
+from typing import Any, Dict, List
+from urllib.parse import urlparse
+from app.agents.dynamic_agent.utils.budget import Budget, Limits
+from .models import DetectorRunStat
+logger = logging.getLogger(__name__)
+ADAPTIVE_LIMITS = os.getenv("ADAPTIVE_LIMITS", "on") != "off"
+ADAPTIVE_HISTORY = int(os.getenv("ADAPTIVE_HISTORY", "50"))
+ADAPTIVE_MIN_RUNS = int(os.getenv("ADAPTIVE_MIN_RUNS", "5"))
+ADAPTIVE_PERCENTILE = float(os.getenv("ADAPTIVE_PERCENTILE", "0.95"))
+ADAPTIVE_MARGIN = float(os.getenv("ADAPTIVE_MARGIN", "1.5"))
+ADAPTIVE_MIN_COMPLETION = float(os.getenv("ADAPTIVE_MIN_COMPLETION", "0.8"))
+CUT_SHORT = (DetectorRunStat.Outcome.BUDGET_EXHAUSTED, DetectorRunStat.Outcome.MAX_ITERATIONS)
+def domain_of(url: str) -> str:
+    host = (urlparse(url if "//" in url else f"//{url}").hostname or "").lower()
+    return host.removeprefix("www.")
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+def _history(detector: str, domain: str) -> List[DetectorRunStat]:
+    runs: List[DetectorRunStat] = []
+    for scope in ({"detector": detector, "domain": domain}, {"detector": detector}):
+        runs = list(DetectorRunStat.objects.filter(**scope).order_by("-created_at")[:ADAPTIVE_HISTORY])
+        if sum(r.outcome == DetectorRunStat.Outcome.FINISHED for r in runs) >= ADAPTIVE_MIN_RUNS:
+            break
+    return runs
+def learned_limits(detector: str, url: str, base: Limits) -> Limits:
+    if not ADAPTIVE_LIMITS:
+        return base
+    runs = _history(detector, domain_of(url))
+    finished = [r for r in runs if r.outcome == DetectorRunStat.Outcome.FINISHED]
+    if len(finished) < ADAPTIVE_MIN_RUNS:
+        return base
+    if 1 - sum(r.outcome in CUT_SHORT for r in runs) / len(runs) < ADAPTIVE_MIN_COMPLETION:
+        return base
+    def learned(name: str, configured: float) -> float:
+        value = math.ceil(percentile([getattr(r, name) for r in finished], ADAPTIVE_PERCENTILE) * ADAPTIVE_MARGIN)
+        if value <= 0:
+            return configured
+        return min(configured, value) if configured else value
+    return Limits(
+        tokens=int(learned("tokens", base.tokens)),
+        seconds=learned("seconds", base.seconds),
+        actions=int(learned("actions", base.actions)),
+        iterations=int(learned("iterations", base.iterations)),
+    )
+def outcome_of(state: Dict[str, Any]) -> str:
+    reason = str(state.get("final_reason") or "")
+    if reason.startswith("budget_exhausted"):
+        return DetectorRunStat.Outcome.BUDGET_EXHAUSTED
+    if reason.startswith("stalled"):
+        return DetectorRunStat.Outcome.STALLED
+    if state.get("final_summary"):
+        return DetectorRunStat.Outcome.FINISHED
+    return DetectorRunStat.Outcome.MAX_ITERATIONS
+def record_run(detector: str, url: str, budget: Budget, state: Dict[str, Any]) -> None:
+    used = budget.used()
+    try:
+        DetectorRunStat.objects.create(
+            detector=detector,
+            domain=domain_of(url),
+            outcome=outcome_of(state),
+            iterations=used["iterations"],
+            seconds=used["seconds"],
+            tokens=used["tokens"],
+            actions=used["actions"],
+        )
+    except Exception as ex:
+        logger.warning("Run stats of %s on %s not saved: %r", detector, url, ex)
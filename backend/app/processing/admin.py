@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Task, Worker
+from .models import DetectorRun, DetectorRunStat, SiteWaypoint, Task, TaskUsage, Worker
 @admin.register(Task)
 class TaskAdmin(admin.ModelAdmin):
     list_display = ("id", "url", "status", "priority", "project", "assigned_to", "created_at")
@@ -8,3 +8,23 @@ class TaskAdmin(admin.ModelAdmin):
 @admin.register(Worker)
 class WorkerAdmin(admin.ModelAdmin):
     list_display = ("name", "is_active", "last_seen")
+@admin.register(DetectorRun)
+class DetectorRunAdmin(admin.ModelAdmin):
+    list_display = ("task", "pattern_type", "status", "attempts", "finished_at")
+    search_fields = ("task__id", "pattern_type")
+    list_filter = ("status", "pattern_type")
+@admin.register(TaskUsage)
+class TaskUsageAdmin(admin.ModelAdmin):
+    list_display = ("task", "detector", "role", "model", "calls", "total_tokens", "cost_usd")
+    search_fields = ("task__id",)
+    list_filter = ("detector", "role", "model")
+@admin.register(DetectorRunStat)
+class DetectorRunStatAdmin(admin.ModelAdmin):
+    list_display = ("detector", "domain", "outcome", "iterations", "seconds", "tokens", "created_at")
+    search_fields = ("domain",)
+    list_filter = ("detector", "outcome")
+@admin.register(SiteWaypoint)
+class SiteWaypointAdmin(admin.ModelAdmin):
+    list_display = ("domain", "detector", "phase", "url", "hits", "failures", "verified_at")
+    search_fields = ("domain", "url")
+    list_filter = ("detector",)
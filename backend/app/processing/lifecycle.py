@@ -0,0 +1,162 @@
+"""
+Status bookkeeping shared by the in-process Celery tasks.
+`TaskLifecycle` loads the Task (with its project) once and keeps it in
+memory. Every transition is one UPDATE of the changed columns; the project's
+trust score is written in the same transaction as the DONE transition.
+    with TaskLifecycle(task_id) as lc:
+        if lc.skipped:
+            return lc.outcome
+        ...
+        lc.finish(result_dict, trust_score=score)
+    return lc.outcome
+A cancelled run (ScanCancelled, or any exception once the row is CANCELLED)
+leaves the row as the cancel endpoint set it; any other exception marks the
+task FAILED and propagates.
+The row is claimed under a lock: a redelivered message for a task that is
+still running elsewhere (fresh heartbeat) is skipped instead of starting a
+second scan. `lc.run_timeout()` keeps each agent run inside SCAN_DEADLINE,
+which thread pools don't enforce as a Celery time limit.
+LLM usage recorded while the block runs is rolled up into TaskUsage on exit,
+added to what earlier attempts of the same task used. `lc.budget` bounds the
+whole run; detectors get child budgets from `detector_budget()`.
+"""
+import os
+import time
+import logging
+from dataclasses import asdict
+from typing import Any, Dict, Optional
+from celery import current_task
+from django.db import transaction
+from django.utils import timezone
+from app.agents import usage
+from app.agents.dynamic_agent.runner import AGENT_RUN_TIMEOUT
+from app.agents.dynamic_agent.utils import budget
+from app.agents.dynamic_agent.utils.cancellation import ScanCancelled
+from app.agents.dynamic_agent.utils.progress import ProgressChannel
+from . import adaptive
+from .models import Task, TaskUsage
+from .queues import BROWSER, QUEUE_OPTIONS
+logger = logging.getLogger(__name__)
+# Below the broker's visibility timeout, so an unacked scan isn't redelivered while it runs.
+SCAN_DEADLINE = float(os.getenv("SCAN_DEADLINE", QUEUE_OPTIONS[BROWSER]["soft_time_limit"]))
+# A running task whose heartbeat is younger than this is assumed alive.
+LIVE_HEARTBEAT_SECONDS = float(os.getenv("LIVE_HEARTBEAT_SECONDS", "600"))
+def save_usage(task_id: str, meter: usage.UsageMeter) -> None:
+    if not meter.rows:
+        return
+    existing = {(u.detector, u.role, u.model): u for u in TaskUsage.objects.filter(task_id=task_id)}
+    created, updated = [], []
+    for (detector, role, model), used in meter.rows.items():
+        row = existing.get((detector, role, model))
+        if row is None:
+            created.append(TaskUsage(task_id=task_id, detector=detector, role=role, model=model, **asdict(used)))
+            continue
+        for name, value in asdict(used).items():
+            setattr(row, name, getattr(row, name) + value)
+        updated.append(row)
+    if created:
+        TaskUsage.objects.bulk_create(created)
+    if updated:
+        TaskUsage.objects.bulk_update(updated, list(asdict(usage.Usage())))
+class TaskLifecycle:
+    def __init__(self, task_id: str):
+        self.task_id = str(task_id)
+        self.task: Optional[Task] = None
+        self.skipped = False
+        self.outcome: Dict[str, Any] = {'task_id': self.task_id, 'status': 'success'}
+        self.meter = usage.UsageMeter()
+        self.budget = budget.Budget(budget.TASK_LIMITS)
+        self.deadline = time.monotonic() + SCAN_DEADLINE
+        self._metering = None
+    def _save(self, **fields) -> None:
+        for name, value in fields.items():
+            setattr(self.task, name, value)
+        self.task.save(update_fields=[*fields, 'updated_at'])
+    def _running_elsewhere(self, now) -> bool:
+        heartbeat = self.task.heartbeat_at or self.task.started_at
+        return (
+            self.task.status == Task.Status.IN_PROGRESS
+            and heartbeat is not None
+            and (now - heartbeat).total_seconds() < LIVE_HEARTBEAT_SECONDS
+        )
+    def __enter__(self) -> "TaskLifecycle":
+        with transaction.atomic():
+            self.task = Task.objects.select_related('project').select_for_update(of=('self',)).get(id=self.task_id)
+            if self.task.status == Task.Status.CANCELLED:
+                self.skipped = True
+                self.outcome = {'task_id': self.task_id, 'status': 'cancelled'}
+                return self
+            now = timezone.now()
+            if self._running_elsewhere(now):
+                logger.warning("Task %s is already running; ignoring the duplicate delivery", self.task_id)
+                self.skipped = True
+                self.outcome = {'task_id': self.task_id, 'status': 'duplicate'}
+                return self
+            fields = dict(status=Task.Status.IN_PROGRESS, started_at=now, heartbeat_at=now, progress=0.0, progress_detail=None)
+            celery_id = getattr(getattr(current_task, 'request', None), 'id', None)
+            if celery_id:
+                # Lets the cancel endpoint revoke the job.
+                fields['celery_task_id'] = celery_id
+            self._save(**fields)
+        self.budget = budget.Budget(budget.TASK_LIMITS)
+        self.deadline = time.monotonic() + SCAN_DEADLINE
+        self._metering = usage.metering(self.meter)
+        self._metering.__enter__()
+        return self
+    def cancelled(self) -> bool:
+        """Re-read only the status; used as the cooperative stop probe"""
+        return Task.objects.filter(id=self.task_id, status=Task.Status.CANCELLED).exists()
+    def report_progress(self, fraction: float, detail: Optional[dict] = None) -> None:
+        """Progress doubles as the heartbeat that keeps requeue_stale_tasks away from a live scan"""
+        now = timezone.now()
+        fields = dict(progress=fraction, heartbeat_at=now)
+        if detail is not None:
+            # Stage and loop iteration from the ProgressChannel, shown by the status endpoint.
+            fields['progress_detail'] = detail
+        for name, value in fields.items():
+            setattr(self.task, name, value)
+        Task.objects.filter(id=self.task_id).update(**fields, updated_at=now)
+    def progress_channel(self, stages: int = 1) -> ProgressChannel:
+        return ProgressChannel(self.report_progress, stages=stages)
+    def detector_budget(self, pattern_type: str, url: Optional[str] = None) -> budget.Budget:
+        limits = budget.limits_for(pattern_type)
+        if url:
+            limits = adaptive.learned_limits(pattern_type, url, limits)
+        return self.budget.child(limits)
+    def run_timeout(self) -> float:
+        """Timeout for the next agent run: AGENT_RUN_TIMEOUT, cut to what is left of SCAN_DEADLINE"""
+        return max(0.0, min(AGENT_RUN_TIMEOUT, self.deadline - time.monotonic()))
+    def fail(self, error: str) -> None:
+        self._save(status=Task.Status.FAILED, error=error, finished_at=timezone.now())
+        self.outcome = {'task_id': self.task_id, 'status': 'failed'}
+    def finish(self, result_json: dict, trust_score: Optional[float] = None, **outcome) -> None:
+        from app.projects.models import Project
+        with transaction.atomic():
+            self._save(result_json=result_json, status=Task.Status.DONE, progress=1.0, finished_at=timezone.now())
+            project = self.task.project
+            if project is not None and trust_score is not None:
+                project.trust_score = trust_score
+                project.status = Project.Status.UNDER_REVIEW
+                project.save(update_fields=['trust_score', 'status', 'updated_at'])
+        self.outcome.update(outcome)
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if self._metering is not None:
+            self._metering.__exit__(None, None, None)
+            self._metering = None
+            try:
+                save_usage(self.task_id, self.meter)
+            except Exception as ex:
+                logger.warning("Usage of task %s not saved: %r", self.task_id, ex)
+        if exc_type is None or self.task is None:
+            return False
+        if issubclass(exc_type, ScanCancelled):
+            self.outcome = {'task_id': self.task_id, 'status': 'cancelled'}
+            return True
+        if self.cancelled():
+            # Cancelling closes the browser under the agent; whatever it raised then isn't a failure.
+            logger.info("Task %s was cancelled; ignoring %r", self.task_id, exc)
+            self.outcome = {'task_id': self.task_id, 'status': 'cancelled'}
+            return True
+        if self.task.status != Task.Status.FAILED:
+            self.fail(str(exc))
+        return False
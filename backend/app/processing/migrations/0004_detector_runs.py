@@ -0,0 +1,25 @@
+import django.db.models.deletion
+from django.db import migrations, models
+class Migration(migrations.Migration):
+    dependencies = [
+        ('processing', '0003_rename_processing_task_status_prio_created_idx_processing__status_c93f27_idx_and_more'),
+    ]
+    operations = [
+        migrations.CreateModel(
+            name='DetectorRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pattern_type', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='running', max_length=16)),
+                ('attempts', models.IntegerField(default=0)),
+                ('result_json', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='detector_runs', to='processing.task')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('task', 'pattern_type'), name='processing_detectorrun_task_pattern_uniq')],
+            },
+        ),
+    ]
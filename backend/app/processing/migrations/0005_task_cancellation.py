@@ -0,0 +1,17 @@
+from django.db import migrations, models
+class Migration(migrations.Migration):
+    dependencies = [
+        ('processing', '0004_detector_runs'),
+    ]
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='celery_task_id',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='task',
+            name='status',
+            field=models.CharField(choices=[('new', 'New'), ('queued', 'Queued'), ('in_progress', 'In Progress'), ('done', 'Done'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='new', max_length=32),
+        ),
+    ]
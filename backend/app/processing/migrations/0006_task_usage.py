@@ -0,0 +1,28 @@
+import django.db.models.deletion
+from django.db import migrations, models
+class Migration(migrations.Migration):
+    dependencies = [
+        ('processing', '0005_task_cancellation'),
+    ]
+    operations = [
+        migrations.CreateModel(
+            name='TaskUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('detector', models.CharField(blank=True, default='', max_length=64)),
+                ('role', models.CharField(blank=True, default='', max_length=64)),
+                ('model', models.CharField(blank=True, default='', max_length=128)),
+                ('calls', models.IntegerField(default=0)),
+                ('prompt_tokens', models.BigIntegerField(default=0)),
+                ('cached_tokens', models.BigIntegerField(default=0)),
+                ('output_tokens', models.BigIntegerField(default=0)),
+                ('total_tokens', models.BigIntegerField(default=0)),
+                ('latency_ms', models.BigIntegerField(default=0)),
+                ('cost_usd', models.FloatField(default=0.0)),
+                ('task', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='usage', to='processing.task')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('task', 'detector', 'role', 'model'), name='processing_taskusage_key_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations, models
+class Migration(migrations.Migration):
+    dependencies = [
+        ('processing', '0006_task_usage'),
+    ]
+    operations = [
+        migrations.CreateModel(
+            name='DetectorRunStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('detector', models.CharField(max_length=64)),
+                ('domain', models.CharField(max_length=255)),
+                ('outcome', models.CharField(choices=[('finished', 'Finished'), ('budget_exhausted', 'Budget exhausted'), ('stalled', 'Stalled'), ('max_iterations', 'Max iterations')], max_length=32)),
+                ('iterations', models.IntegerField(default=0)),
+                ('seconds', models.FloatField(default=0.0)),
+                ('tokens', models.BigIntegerField(default=0)),
+                ('actions', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['detector', 'domain', '-created_at'], name='processing__detecto_309510_idx'), models.Index(fields=['detector', '-created_at'], name='processing__detecto_e595e3_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+class Migration(migrations.Migration):
+    dependencies = [
+        ('processing', '0007_detector_run_stats'),
+    ]
+    operations = [
+        migrations.CreateModel(
+            name='SiteWaypoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domain', models.CharField(max_length=255)),
+                ('detector', models.CharField(max_length=64)),
+                ('phase', models.CharField(max_length=64)),
+                ('url', models.TextField()),
+                ('actions', models.JSONField(blank=True, default=list)),
+                ('hits', models.IntegerField(default=0)),
+                ('failures', models.IntegerField(default=0)),
+                ('verified_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('domain', 'detector', 'phase'), name='processing_sitewaypoint_key_uniq')],
+            },
+        ),
+    ]
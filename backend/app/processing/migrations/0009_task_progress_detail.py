@@ -0,0 +1,12 @@
+from django.db import migrations, models
+class Migration(migrations.Migration):
+    dependencies = [
+        ('processing', '0008_site_waypoints'),
+    ]
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='progress_detail',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -13,6 +13,7 @@ class Task(models.Model):
         IN_PROGRESS = "in_progress", "In Progress"
         DONE = "done", "Done"
         FAILED = "failed", "Failed"
+        CANCELLED = "cancelled", "Cancelled"
     class Priority(models.TextChoices):
         LOW = "low", "Low"
         NORMAL = "normal", "Normal"
@@ -32,9 +33,11 @@ class Task(models.Model):
     finished_at = models.DateTimeField(null=True, blank=True)
     heartbeat_at = models.DateTimeField(null=True, blank=True)
     progress = models.FloatField(null=True, blank=True)
+    progress_detail = models.JSONField(null=True, blank=True)
     error = models.TextField(blank=True, default="")
     result_json = models.JSONField(null=True, blank=True)
     result_s3_key = models.CharField(max_length=512, blank=True, default="")
+    celery_task_id = models.CharField(max_length=255, blank=True, default="")
     class Meta:
         indexes = [
             models.Index(fields=["status", "priority", "created_at"]),
@@ -44,3 +47,81 @@ class Task(models.Model):
         ]
     def __str__(self):
         return f"Task {self.id} {self.status}"
+class DetectorRun(models.Model):
+    """Checkpoint of one detector inside a multi-detector scan"""
+    class Status(models.TextChoices):
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="detector_runs")
+    pattern_type = models.CharField(max_length=64)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.RUNNING)
+    attempts = models.IntegerField(default=0)
+    result_json = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["task", "pattern_type"], name="processing_detectorrun_task_pattern_uniq"),
+        ]
+    def __str__(self):
+        return f"{self.pattern_type} {self.status} ({self.task_id})"
+class TaskUsage(models.Model):
+    """LLM usage of one task, rolled up per detector, agent role and model"""
+    task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="usage")
+    detector = models.CharField(max_length=64, blank=True, default="")
+    role = models.CharField(max_length=64, blank=True, default="")
+    model = models.CharField(max_length=128, blank=True, default="")
+    calls = models.IntegerField(default=0)
+    prompt_tokens = models.BigIntegerField(default=0)
+    cached_tokens = models.BigIntegerField(default=0)
+    output_tokens = models.BigIntegerField(default=0)
+    total_tokens = models.BigIntegerField(default=0)
+    latency_ms = models.BigIntegerField(default=0)
+    cost_usd = models.FloatField(default=0.0)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["task", "detector", "role", "model"], name="processing_taskusage_key_uniq"),
+        ]
+    def __str__(self):
+        return f"{self.task_id} {self.detector}/{self.role} {self.total_tokens} tokens"
+class DetectorRunStat(models.Model):
+    """How long one detector run took on a site; feeds the adaptive limits"""
+    class Outcome(models.TextChoices):
+        FINISHED = "finished", "Finished"
+        BUDGET_EXHAUSTED = "budget_exhausted", "Budget exhausted"
+        STALLED = "stalled", "Stalled"
+        MAX_ITERATIONS = "max_iterations", "Max iterations"
+    detector = models.CharField(max_length=64)
+    domain = models.CharField(max_length=255)
+    outcome = models.CharField(max_length=32, choices=Outcome.choices)
+    iterations = models.IntegerField(default=0)
+    seconds = models.FloatField(default=0.0)
+    tokens = models.BigIntegerField(default=0)
+    actions = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        indexes = [
+            models.Index(fields=["detector", "domain", "-created_at"]),
+            models.Index(fields=["detector", "-created_at"]),
+        ]
+    def __str__(self):
+        return f"{self.detector}@{self.domain} {self.outcome} ({self.iterations} it, {self.seconds:.0f}s)"
+class SiteWaypoint(models.Model):
+    """A page a detector needed on a domain and how it was reached; a hint for rescans"""
+    domain = models.CharField(max_length=255)
+    detector = models.CharField(max_length=64)
+    phase = models.CharField(max_length=64)
+    url = models.TextField()
+    actions = models.JSONField(default=list, blank=True)
+    hits = models.IntegerField(default=0)
+    failures = models.IntegerField(default=0)
+    verified_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["domain", "detector", "phase"], name="processing_sitewaypoint_key_uniq"),
+        ]
+    def __str__(self):
+        return f"{self.detector}@{self.domain} {self.phase}: {self.url}"
@@ -0,0 +1,80 @@
+"""
+Celery queues and routing.
+- browser: detector and website scans, minutes to hours each; thread pool
+  workers driving the shared agent loop (see app.agents.dynamic_agent.runner)
+- llm: document analysis, LLM calls only
+- maintenance: the stale-task sweeper and other housekeeping
+Workers subscribe with `-Q <queue>`; concurrency and prefetch are set per
+worker in docker-compose. Time limits and acks_late are applied per queue
+through `QueueAnnotations` (CELERY_TASK_ANNOTATIONS). Thread pools do not
+enforce Celery time limits, so a browser scan keeps to SCAN_DEADLINE itself
+(app.processing.lifecycle), which stays below the broker visibility timeout.
+"""
+import os
+from typing import Optional
+BROWSER = "browser"
+LLM = "llm"
+MAINTENANCE = "maintenance"
+TASK_QUEUES = {
+    "app.processing.tasks.analyze_document_with_legal_llm": LLM,
+    "app.processing.tasks.analyze_website_with_browser_agent": BROWSER,
+    "app.processing.tasks.detect_roach_motel_pattern": BROWSER,
+    "app.processing.tasks.detect_fake_urgency_pattern": BROWSER,
+    "app.processing.tasks.detect_drip_pricing_pattern": BROWSER,
+    "app.processing.tasks.detect_all_dark_patterns": BROWSER,
+    "app.processing.tasks.requeue_stale_tasks": MAINTENANCE,
+    "app.processing.tasks.touch_queue": MAINTENANCE,
+}
+QUEUE_OPTIONS = {
+    BROWSER: {
+        "acks_late": True,
+        "reject_on_worker_lost": True,
+        "time_limit": int(os.getenv("BROWSER_TASK_TIME_LIMIT", "14400")),
+        "soft_time_limit": int(os.getenv("BROWSER_TASK_SOFT_TIME_LIMIT", "14100")),
+    },
+    LLM: {
+        "acks_late": True,
+        "reject_on_worker_lost": True,
+        "time_limit": int(os.getenv("LLM_TASK_TIME_LIMIT", "1800")),
+        "soft_time_limit": int(os.getenv("LLM_TASK_SOFT_TIME_LIMIT", "1700")),
+    },
+    MAINTENANCE: {
+        "acks_late": False,
+        "time_limit": int(os.getenv("MAINTENANCE_TASK_TIME_LIMIT", "120")),
+        "soft_time_limit": int(os.getenv("MAINTENANCE_TASK_SOFT_TIME_LIMIT", "100")),
+    },
+}
+# Redis evaluates priorities 0 (first) .. 9 (last); see CELERY_BROKER_TRANSPORT_OPTIONS.
+BROKER_PRIORITY = {"high": 0, "normal": 5, "low": 9}
+def queue_for(name: str, args=None) -> Optional[str]:
+    if name == "app.processing.tasks.detect_dark_pattern":
+        from app.agents.dynamic_agent.registry import get_detector
+        try:
+            return get_detector(args[2]).queue
+        except (IndexError, TypeError, ValueError):
+            return BROWSER
+    return TASK_QUEUES.get(name)
+def broker_priority(priority: Optional[str]) -> int:
+    return BROKER_PRIORITY.get(priority or "normal", BROKER_PRIORITY["normal"])
+def _task_priority(task_id) -> Optional[str]:
+    from .models import Task
+    try:
+        return Task.objects.filter(id=task_id).values_list("priority", flat=True).first()
+    except Exception:
+        return None
+def route_task(name, args, kwargs, options, task=None, **kw):
+    """Celery router: queue by task name, broker priority from the Task row"""
+    queue = queue_for(name, args)
+    if queue is None:
+        return None
+    route = {"queue": queue}
+    if queue != MAINTENANCE and args and options.get("priority") is None:
+        route["priority"] = broker_priority(_task_priority(args[0]))
+    return route
+class QueueAnnotations:
+    """Per-queue task options (acks_late, time limits), see QUEUE_OPTIONS"""
+    def annotate(self, task):
+        if task.name == "app.processing.tasks.detect_dark_pattern":
+            return QUEUE_OPTIONS[BROWSER]
+        queue = TASK_QUEUES.get(task.name)
+        return QUEUE_OPTIONS.get(queue)
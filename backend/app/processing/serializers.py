@@ -1,3 +1,4 @@
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Task
 class TaskSubmitSerializer(serializers.Serializer):
@@ -5,9 +6,15 @@ class TaskSubmitSerializer(serializers.Serializer):
 class TaskIdSerializer(serializers.Serializer):
     id = serializers.UUIDField()
 class TaskStatusSerializer(serializers.ModelSerializer):
+    eta_seconds = serializers.SerializerMethodField()
     class Meta:
         model = Task
-        fields = ["id", "status", "created_at", "updated_at", "error"]
+        fields = ["id", "status", "created_at", "updated_at", "error", "progress", "progress_detail", "heartbeat_at", "eta_seconds"]
+    def get_eta_seconds(self, obj):
+        if obj.status != Task.Status.IN_PROGRESS or not obj.started_at or not obj.progress:
+            return None
+        elapsed = (timezone.now() - obj.started_at).total_seconds()
+        return max(0, round(elapsed * (1 - obj.progress) / obj.progress))
 class TaskResultSerializer(serializers.ModelSerializer):
     class Meta:
         model = Task
@@ -1,7 +1,16 @@
 from app.celery import app
 from django.utils import timezone
 from django.db import transaction
-from .models import Task
+import os
+from typing import Optional
+from .models import DetectorRun, Task
+from .lifecycle import TaskLifecycle
+from . import adaptive, triage, waypoints
+from app.agents.rate_limiter import llm_priority
+from app.agents.dynamic_agent import registry
+from app.agents.dynamic_agent.runner import AGENT_RUN_TIMEOUT, run_agent
+from app.agents.dynamic_agent.utils.cancellation import ScanCancelled
+DETECTOR_MAX_ATTEMPTS = int(os.getenv("DETECTOR_MAX_ATTEMPTS", "2"))
 @app.task
 def touch_queue(task_id: str):
     return {"task_id": task_id}
@@ -39,21 +48,16 @@ def requeue_stale_tasks():
 def analyze_document_with_legal_llm(task_id: str, file_content: bytes, filename: str):
     from app.agents.legal_llm import analyze_contract
     from app.agents.document_extractor import extract_text_from_file
-    from app.projects.models import Project
-    try:
-        task = Task.objects.get(id=task_id)
-        task.status = Task.Status.IN_PROGRESS
-        task.started_at = timezone.now()
-        task.save(update_fields=['status', 'started_at', 'updated_at'])
+    with TaskLifecycle(task_id) as lc:
+        if lc.skipped:
+            return lc.outcome
         try:
             document_text = extract_text_from_file(file_content, filename)
         except ValueError as e:
-            task.status = Task.Status.FAILED
-            task.error = f"Text extraction failed: {str(e)}"
-            task.finished_at = timezone.now()
-            task.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+            lc.fail(f"Text extraction failed: {str(e)}")
             raise
-        result = analyze_contract(document_text, contract_id=task_id)
+        with llm_priority(lc.task.priority):
+            result = analyze_contract(document_text, contract_id=task_id)
         result_dict = {
             'contract_id': result.contract_id,
             'analysis_date': result.analysis_date,
@@ -79,67 +83,47 @@ def analyze_document_with_legal_llm(task_id: str, file_content: bytes, filename:
                         'recommendations': criterion.recommendations,
                         'confidence_score': criterion.confidence_score
                     }
-        task.result_json = result_dict
-        task.status = Task.Status.DONE
-        task.finished_at = timezone.now()
-        task.save(update_fields=['result_json', 'status', 'finished_at', 'updated_at'])
-        if task.project:
-            trust_score = result.overall_compliance_score * 100
-            task.project.trust_score = trust_score
-            task.project.status = Project.Status.UNDER_REVIEW
-            task.project.save(update_fields=['trust_score', 'status', 'updated_at'])
-        return {'task_id': task_id, 'status': 'success'}
-    except Exception as e:
-        task = Task.objects.get(id=task_id)
-        task.status = Task.Status.FAILED
-        task.error = str(e)
-        task.finished_at = timezone.now()
-        task.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
-        raise
+        lc.finish(result_dict, trust_score=result.overall_compliance_score * 100)
+    return lc.outcome
 @app.task
 def analyze_website_with_browser_agent(task_id: str, url: str):
-    from app.projects.models import Project
     from app.agents.dynamic_agent import analyze_website
-    try:
-        task = Task.objects.get(id=task_id)
-        task.status = Task.Status.IN_PROGRESS
-        task.started_at = timezone.now()
-        task.save(update_fields=['status', 'started_at', 'updated_at'])
-        result_dict = analyze_website(url)
-        task.result_json = result_dict
-        task.status = Task.Status.DONE
-        task.finished_at = timezone.now()
-        task.save(update_fields=['result_json', 'status', 'finished_at', 'updated_at'])
-        if task.project:
-            task.project.trust_score = result_dict.get('transparency_score', 75.0)
-            task.project.status = Project.Status.UNDER_REVIEW
-            task.project.save(update_fields=['trust_score', 'status', 'updated_at'])
-        return {'task_id': task_id, 'status': 'success'}
-    except Exception as e:
-        task = Task.objects.get(id=task_id)
-        task.status = Task.Status.FAILED
-        task.error = str(e)
-        task.finished_at = timezone.now()
-        task.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
-        raise
+    with TaskLifecycle(task_id) as lc:
+        if lc.skipped:
+            return lc.outcome
+        with llm_priority(lc.task.priority):
+            result_dict = analyze_website(
+                url, should_stop=lc.cancelled, progress_channel=lc.progress_channel(), budget=lc.budget,
+                timeout=lc.run_timeout(),
+            )
+        lc.finish(result_dict, trust_score=result_dict.get('transparency_score', 75.0))
+    return lc.outcome
+def _remember_run(pattern_type: str, url: str, state: dict, budget=None) -> None:
+    """Keep what the run learned about the site: its cost for adaptive limits, its route for rescans"""
+    if budget is not None:
+        adaptive.record_run(pattern_type, url, budget, state)
+    waypoints.learn(pattern_type, url, state)
 @app.task
 def detect_roach_motel_pattern(task_id: str, url: str, test_service: str = None):
-    from app.projects.models import Project
-    import os
-    try:
-        task = Task.objects.get(id=task_id)
-        task.status = Task.Status.IN_PROGRESS
-        task.started_at = timezone.now()
-        task.save(update_fields=['status', 'started_at', 'updated_at'])
-        from app.agents.dynamic_agent.agents.roach_motel_agent import roach_motel_root_agent
+    with TaskLifecycle(task_id) as lc:
+        if lc.skipped:
+            return lc.outcome
+        roach_motel_root_agent = registry.root_agent('roach_motel')
         initial_state = {
             "request": f"Test {url} for Roach Motel pattern" + (f" - {test_service}" if test_service else ""),
             "target_site": url,
-            "test_service": test_service
+            "test_service": test_service,
+            "site_hints": waypoints.hints_for('roach_motel', url),
         }
-        result = roach_motel_root_agent.run(state=initial_state)
+        with llm_priority(lc.task.priority):
+            run_budget = lc.detector_budget('roach_motel', url)
+            result = run_agent(
+                roach_motel_root_agent, initial_state, should_stop=lc.cancelled, progress_channel=lc.progress_channel(),
+                budget=run_budget, timeout=lc.run_timeout(),
+            )
+        _remember_run('roach_motel', url, result, run_budget)
         metrics = result.get("metrics_to_collect", {})
-        result_dict = {
+        lc.finish({
             'pattern_type': 'roach_motel',
             'url': url,
             'detected': bool(metrics.get('sar_ratio', 0) > 2.0),
@@ -147,35 +131,28 @@ def detect_roach_motel_pattern(task_id: str, url: str, test_service: str = None)
             'metrics': metrics,
             'summary': result.get('final_summary', 'Pattern detection completed'),
             'details': result.get('final_data', {})
-        }
-        task.result_json = result_dict
-        task.status = Task.Status.DONE
-        task.finished_at = timezone.now()
-        task.save(update_fields=['result_json', 'status', 'finished_at', 'updated_at'])
-        return {'task_id': task_id, 'status': 'success'}
-    except Exception as e:
-        task = Task.objects.get(id=task_id)
-        task.status = Task.Status.FAILED
-        task.error = str(e)
-        task.finished_at = timezone.now()
-        task.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
-        raise
+        })
+    return lc.outcome
 @app.task
 def detect_fake_urgency_pattern(task_id: str, url: str):
-    from app.projects.models import Project
-    try:
-        task = Task.objects.get(id=task_id)
-        task.status = Task.Status.IN_PROGRESS
-        task.started_at = timezone.now()
-        task.save(update_fields=['status', 'started_at', 'updated_at'])
-        from app.agents.dynamic_agent.agents.fake_urgency_agent import fake_urgency_root_agent
+    with TaskLifecycle(task_id) as lc:
+        if lc.skipped:
+            return lc.outcome
+        fake_urgency_root_agent = registry.root_agent('fake_urgency')
         initial_state = {
             "request": f"Test {url} for Fake Urgency pattern",
-            "target_site": url
+            "target_site": url,
+            "site_hints": waypoints.hints_for('fake_urgency', url),
         }
-        result = fake_urgency_root_agent.run(state=initial_state)
+        with llm_priority(lc.task.priority):
+            run_budget = lc.detector_budget('fake_urgency', url)
+            result = run_agent(
+                fake_urgency_root_agent, initial_state, should_stop=lc.cancelled, progress_channel=lc.progress_channel(),
+                budget=run_budget, timeout=lc.run_timeout(),
+            )
+        _remember_run('fake_urgency', url, result, run_budget)
         metrics = result.get("metrics", {})
-        result_dict = {
+        lc.finish({
             'pattern_type': 'fake_urgency',
             'url': url,
             'detected': bool(metrics.get('timer_resets', 0) > 0 or metrics.get('false_countdown', False)),
@@ -183,36 +160,29 @@ def detect_fake_urgency_pattern(task_id: str, url: str):
             'metrics': metrics,
             'summary': result.get('final_summary', 'Pattern detection completed'),
             'details': result.get('final_data', {})
-        }
-        task.result_json = result_dict
-        task.status = Task.Status.DONE
-        task.finished_at = timezone.now()
-        task.save(update_fields=['result_json', 'status', 'finished_at', 'updated_at'])
-        return {'task_id': task_id, 'status': 'success'}
-    except Exception as e:
-        task = Task.objects.get(id=task_id)
-        task.status = Task.Status.FAILED
-        task.error = str(e)
-        task.finished_at = timezone.now()
-        task.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
-        raise
+        })
+    return lc.outcome
 @app.task
 def detect_drip_pricing_pattern(task_id: str, url: str):
-    from app.projects.models import Project
-    try:
-        task = Task.objects.get(id=task_id)
-        task.status = Task.Status.IN_PROGRESS
-        task.started_at = timezone.now()
-        task.save(update_fields=['status', 'started_at', 'updated_at'])
-        from app.agents.dynamic_agent.agents.drip_pricing_agent import drip_pricing_root_agent
+    with TaskLifecycle(task_id) as lc:
+        if lc.skipped:
+            return lc.outcome
+        drip_pricing_root_agent = registry.root_agent('drip_pricing')
         initial_state = {
             "request": f"Test {url} for Drip Pricing pattern",
-            "target_site": url
+            "target_site": url,
+            "site_hints": waypoints.hints_for('drip_pricing', url),
         }
-        result = drip_pricing_root_agent.run(state=initial_state)
+        with llm_priority(lc.task.priority):
+            run_budget = lc.detector_budget('drip_pricing', url)
+            result = run_agent(
+                drip_pricing_root_agent, initial_state, should_stop=lc.cancelled, progress_channel=lc.progress_channel(),
+                budget=run_budget, timeout=lc.run_timeout(),
+            )
+        _remember_run('drip_pricing', url, result, run_budget)
         metrics = result.get("metrics", {})
         price_increase = metrics.get('final_price', 0) - metrics.get('initial_price', 0)
-        result_dict = {
+        lc.finish({
             'pattern_type': 'drip_pricing',
             'url': url,
             'detected': bool(price_increase > 0 and metrics.get('hidden_fees_count', 0) > 0),
@@ -220,89 +190,141 @@ def detect_drip_pricing_pattern(task_id: str, url: str):
             'metrics': metrics,
             'summary': result.get('final_summary', 'Pattern detection completed'),
             'details': result.get('final_data', {})
-        }
-        task.result_json = result_dict
-        task.status = Task.Status.DONE
-        task.finished_at = timezone.now()
-        task.save(update_fields=['result_json', 'status', 'finished_at', 'updated_at'])
-        return {'task_id': task_id, 'status': 'success'}
-    except Exception as e:
-        task = Task.objects.get(id=task_id)
-        task.status = Task.Status.FAILED
-        task.error = str(e)
-        task.finished_at = timezone.now()
-        task.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+        })
+    return lc.outcome
+def _run_detector(pattern_type: str, url: str, should_stop=None, progress_channel=None, budget=None, timeout=AGENT_RUN_TIMEOUT) -> dict:
+    detector = registry.get_detector(pattern_type)
+    agent = registry.root_agent(pattern_type)
+    initial_state = {
+        "request": detector.request(url),
+        "target_site": url,
+        "site_hints": waypoints.hints_for(pattern_type, url),
+    }
+    result = run_agent(
+        agent, initial_state, timeout=timeout, should_stop=should_stop, progress_channel=progress_channel, budget=budget,
+    )
+    _remember_run(pattern_type, url, result, budget)
+    final_data = result.get('final_data') or {}
+    return {
+        'detected': bool(final_data.get('detected', False)),
+        'severity': final_data.get('severity', 'unknown'),
+        'metrics': final_data,
+        'summary': result.get('final_summary', ''),
+        'budget_exhausted': bool(final_data.get('budget_exhausted', False)),
+        'stalled_iterations': result.get('stalled_iterations', 0),
+    }
+def _claim(lc: TaskLifecycle, pattern_type: str) -> tuple[DetectorRun, Optional[dict]]:
+    """Lock this detector's checkpoint and mark it RUNNING; or return the result an earlier attempt left"""
+    with transaction.atomic():
+        run, _ = DetectorRun.objects.select_for_update().get_or_create(task=lc.task, pattern_type=pattern_type)
+        if run.status == DetectorRun.Status.DONE:
+            return run, run.result_json
+        if run.status == DetectorRun.Status.FAILED:
+            return run, {'error': run.error, 'detected': False}
+        if run.attempts >= DETECTOR_MAX_ATTEMPTS:
+            # The worker died inside this detector on every attempt; don't let it sink the whole scan again.
+            run.status = DetectorRun.Status.FAILED
+            run.error = f"interrupted {run.attempts} times, giving up"
+            run.finished_at = timezone.now()
+            run.save()
+            return run, {'error': run.error, 'detected': False}
+        run.status = DetectorRun.Status.RUNNING
+        run.attempts += 1
+        run.started_at = timezone.now()
+        run.save()
+    return run, None
+def _run_checkpointed(lc: TaskLifecycle, pattern_type: str, url: str, channel=None) -> dict:
+    """Run one detector of a full scan, or reuse its result if an earlier attempt finished it"""
+    run, earlier = _claim(lc, pattern_type)
+    if earlier is not None:
+        return earlier
+    try:
+        result = _run_detector(
+            pattern_type, url, should_stop=lc.cancelled, progress_channel=channel,
+            budget=lc.detector_budget(pattern_type, url), timeout=lc.run_timeout(),
+        )
+    except ScanCancelled:
         raise
+    except Exception as pattern_error:
+        run.status = DetectorRun.Status.FAILED
+        run.error = str(pattern_error)
+        run.finished_at = timezone.now()
+        run.save(update_fields=['status', 'error', 'finished_at'])
+        return {'error': run.error, 'detected': False}
+    run.status = DetectorRun.Status.DONE
+    run.result_json = result
+    run.finished_at = timezone.now()
+    run.save(update_fields=['status', 'result_json', 'finished_at'])
+    return result
+@app.task
+def detect_dark_pattern(task_id: str, url: str, pattern_type: str):
+    with TaskLifecycle(task_id) as lc:
+        if lc.skipped:
+            return lc.outcome
+        with llm_priority(lc.task.priority):
+            pattern_result = _run_detector(
+                pattern_type, url, should_stop=lc.cancelled, progress_channel=lc.progress_channel(),
+                budget=lc.detector_budget(pattern_type, url), timeout=lc.run_timeout(),
+            )
+        lc.finish({'pattern_type': pattern_type, 'url': url, **pattern_result})
+    return lc.outcome
 @app.task
 def detect_all_dark_patterns(task_id: str, url: str):
-    from app.projects.models import Project
-    try:
-        task = Task.objects.get(id=task_id)
-        task.status = Task.Status.IN_PROGRESS
-        task.started_at = timezone.now()
-        task.save(update_fields=['status', 'started_at', 'updated_at'])
+    with TaskLifecycle(task_id) as lc:
+        if lc.skipped:
+            return lc.outcome
         all_results = {
             'url': url,
             'scan_date': timezone.now().isoformat(),
             'patterns_detected': [],
             'pattern_results': {}
         }
-        pattern_tasks = [
-            ('roach_motel', 'app.agents.dynamic_agent.agents.roach_motel_agent', 'roach_motel_root_agent'),
-            ('fake_urgency', 'app.agents.dynamic_agent.agents.fake_urgency_agent', 'fake_urgency_root_agent'),
-            ('fake_scarcity', 'app.agents.dynamic_agent.agents.fake_scarcity_agent', 'fake_scarcity_root_agent'),
-            ('drip_pricing', 'app.agents.dynamic_agent.agents.drip_pricing_agent', 'drip_pricing_root_agent'),
-            ('hidden_subscription', 'app.agents.dynamic_agent.agents.hidden_subscription_agent', 'hidden_subscription_root_agent'),
-            ('sneak_into_basket', 'app.agents.dynamic_agent.agents.sneak_into_basket_agent', 'sneak_into_basket_root_agent'),
-            ('bait_and_switch', 'app.agents.dynamic_agent.agents.bait_and_switch_agent', 'bait_and_switch_root_agent'),
-            ('confirmshaming', 'app.agents.dynamic_agent.agents.confirmshaming_agent', 'confirmshaming_root_agent'),
-            ('forced_actions', 'app.agents.dynamic_agent.agents.forced_actions_agent', 'forced_actions_root_agent'),
-            ('nagging', 'app.agents.dynamic_agent.agents.nagging_agent', 'nagging_root_agent'),
-            ('navigation_obstacles', 'app.agents.dynamic_agent.agents.navigation_obstacles_agent', 'navigation_obstacles_root_agent'),
-            ('currency_manipulation', 'app.agents.dynamic_agent.agents.currency_manipulation_agent', 'currency_manipulation_root_agent'),
-        ]
-        for pattern_name, module_path, agent_name in pattern_tasks:
-            try:
-                module = __import__(module_path, fromlist=[agent_name])
-                agent = getattr(module, agent_name)
-                initial_state = {
-                    "request": f"Test {url} for {pattern_name.replace('_', ' ').title()} pattern",
-                    "target_site": url
+        pattern_tasks = registry.detector_names()
+        checkpoints = {run.pattern_type: run for run in DetectorRun.objects.filter(task=lc.task)}
+        plan = triage.plan_scan(url, pattern_tasks)
+        all_results['triage'] = plan.to_dict()
+        # A detector an earlier attempt already started keeps its checkpoint even if triage now disagrees.
+        to_run = [name for name in pattern_tasks if name in plan.run or name in checkpoints]
+        for pattern_name in pattern_tasks:
+            if pattern_name not in to_run:
+                all_results['pattern_results'][pattern_name] = {
+                    'detected': False, 'skipped': True, 'status': 'not_applicable',
+                    'summary': f"Not applicable: {plan.skip[pattern_name]}",
                 }
-                result = agent.run(state=initial_state)
-                pattern_result = {
-                    'detected': bool(result.get('final_data', {}).get('detected', False)),
-                    'severity': result.get('final_data', {}).get('severity', 'unknown'),
-                    'metrics': result.get('final_data', {}),
-                    'summary': result.get('final_summary', '')
+        channel = lc.progress_channel(stages=len(to_run))
+        for index, pattern_name in enumerate(to_run):
+            if lc.cancelled():
+                raise ScanCancelled(task_id)
+            channel.set_stage(index)
+            lc.report_progress(channel.fraction, channel.detail())
+            exhausted = lc.budget.exhausted()
+            done = getattr(checkpoints.get(pattern_name), 'status', None) == DetectorRun.Status.DONE
+            if not done and lc.run_timeout() <= 0:
+                # Past the scan deadline: finish with what we have before the broker redelivers the task.
+                all_results['pattern_results'][pattern_name] = {
+                    'detected': False, 'skipped': True, 'deadline_exceeded': True,
+                    'summary': "Not run: scan deadline reached",
                 }
-                all_results['pattern_results'][pattern_name] = pattern_result
-                if pattern_result['detected']:
-                    all_results['patterns_detected'].append(pattern_name)
-            except Exception as pattern_error:
+                continue
+            if exhausted and not done:
+                # Out of task budget: report the rest as not run rather than failing the scan.
                 all_results['pattern_results'][pattern_name] = {
-                    'error': str(pattern_error),
-                    'detected': False
+                    'detected': False, 'skipped': True, 'budget_exhausted': True,
+                    'summary': f"Not run: task {exhausted} budget exhausted",
                 }
+                continue
+            with llm_priority(lc.task.priority):
+                pattern_result = _run_checkpointed(lc, pattern_name, url, channel)
+            all_results['pattern_results'][pattern_name] = pattern_result
+            if pattern_result['detected']:
+                all_results['patterns_detected'].append(pattern_name)
         detected_count = len(all_results['patterns_detected'])
+        # Detectors triage found not applicable count as passed.
         total_patterns = len(pattern_tasks)
         transparency_score = max(0, min(100, 100 - (detected_count / total_patterns * 100)))
         all_results['transparency_score'] = transparency_score
-        all_results['total_patterns_tested'] = total_patterns
+        all_results['total_patterns_tested'] = len(to_run)
+        all_results['patterns_not_applicable'] = [name for name in pattern_tasks if name not in to_run]
         all_results['patterns_detected_count'] = detected_count
-        task.result_json = all_results
-        task.status = Task.Status.DONE
-        task.finished_at = timezone.now()
-        task.save(update_fields=['result_json', 'status', 'finished_at', 'updated_at'])
-        if task.project:
-            task.project.trust_score = transparency_score
-            task.project.status = Project.Status.UNDER_REVIEW
-            task.project.save(update_fields=['trust_score', 'status', 'updated_at'])
-        return {'task_id': task_id, 'status': 'success', 'patterns_detected': detected_count}
-    except Exception as e:
-        task = Task.objects.get(id=task_id)
-        task.status = Task.Status.FAILED
-        task.error = str(e)
-        task.finished_at = timezone.now()
-        task.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
-        raise
+        lc.finish(all_results, trust_score=transparency_score, patterns_detected=detected_count)
+    return lc.outcome
@@ -0,0 +1,155 @@
+"""
+Cheap pre-screening of a site before a full scan.
+The landing page and a few same-site links that look like shop, pricing or
+account pages are fetched once over plain HTTP (no browser, no LLM) and
+matched against keyword heuristics ("signals": cart, pricing, subscription,
+timer, ...). Each detector declares in the registry which signals make it
+worth running; detectors none of whose signals were seen are skipped and
+reported as not_applicable.
+Triage fails open: if the landing page can't be fetched or is a script shell
+with next to no text, every detector runs.
+"""
+import os
+import re
+import logging
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
+from django.conf import settings
+from app.agents.dynamic_agent import registry
+logger = logging.getLogger(__name__)
+TRIAGE_TIMEOUT = float(os.getenv("TRIAGE_TIMEOUT", "10"))
+TRIAGE_MAX_LINKS = int(os.getenv("TRIAGE_MAX_LINKS", "3"))
+TRIAGE_MAX_BYTES = int(os.getenv("TRIAGE_MAX_BYTES", str(2 * 1024 * 1024)))
+TRIAGE_MIN_TEXT = int(os.getenv("TRIAGE_MIN_TEXT", "300"))
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+SIGNALS: Dict[str, re.Pattern] = {name: re.compile(pattern, re.I) for name, pattern in {
+    "cart": r"\b(cart|basket|add[ -]to[ -](cart|bag)|checkout|shopping bag)\b|корзин|оформ(ить|ление) заказ",
+    "pricing": r"[$€£₽]\s?\d|\d\s?(₽|(руб|usd|eur)\b)|\b(pricing|prices?|plans|tariffs?)\b|цен[аыу]\b|тариф|стоимост",
+    "subscription": r"\b(subscri\w*|free trial|membership|auto-?renew\w*|per month|billed (monthly|annually))\b|подписк|пробн\w+ период|в месяц|/\s?мес",
+    "signup": r"\b(sign[ -]?up|register|create (an )?account|join now)\b|регистрац|зарегистр",
+    "account": r"\b(log[ -]?in|sign[ -]?in|my account)\b|войти|личный кабинет|аккаунт",
+    "cancel": r"\b(cancel\w*|unsubscribe|(close|delete) (my )?account)\b|отмен|отпис|удалить аккаунт",
+    "timer": r"\b(countdown|timer|hurry|ends in|offer ends|limited[ -]time|today only)\b|таймер|только сегодня|до конца акции|успей",
+    "scarcity": r"\b(only \d+ left|left in stock|low stock|in stock|selling fast|almost gone)\b|в наличии|осталось \d+|последн\w+ (штук|экземпляр)",
+    "currency": r"\b(currency|usd|eur|gbp|rub)\b|валют",
+    "forms": r"<form:(email|tel|password)>|\b(newsletter|subscribe to)\b|рассылк",
+    "popup": r"\b(modal|popup|pop-up|interstitial|lightbox)\b|всплыва",
+}.items()}
+# Links worth a second fetch: where carts, prices and account flows usually live.
+LINK_HINTS = re.compile(
+    r"cart|basket|checkout|pric|plan|tarif|subscri|sign-?up|regist|account|shop|catalog|product|"
+    r"корзин|тариф|цен|подписк|регистрац|каталог|магазин",
+    re.I,
+)
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg"}
+KEPT_ATTRS = {"class", "id", "name", "placeholder", "aria-label", "title", "value", "alt", "data-testid"}
+class _PageParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.text: List[str] = []
+        self.attrs: List[str] = []
+        self.links: List[Tuple[str, str]] = []
+        self._skip = 0
+        self._link: Optional[List[str]] = None
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip += 1
+            return
+        attrs = dict(attrs)
+        self.attrs.extend(v for k, v in attrs.items() if k in KEPT_ATTRS and v)
+        if tag == "input" and attrs.get("type") in ("email", "tel", "password"):
+            self.attrs.append(f"<form:{attrs['type']}>")
+        if tag == "a" and attrs.get("href"):
+            self._link = [attrs["href"], ""]
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS and self._skip:
+            self._skip -= 1
+        elif tag == "a" and self._link is not None:
+            self.links.append((self._link[0], self._link[1].strip()))
+            self._link = None
+    def handle_data(self, data):
+        if self._skip or not data.strip():
+            return
+        self.text.append(data.strip())
+        if self._link is not None:
+            self._link[1] += " " + data.strip()
+@dataclass
+class Page:
+    url: str
+    text: str
+    haystack: str
+    links: List[Tuple[str, str]]
+@dataclass
+class ScanPlan:
+    run: List[str]
+    skip: Dict[str, str] = field(default_factory=dict)
+    signals: Dict[str, List[str]] = field(default_factory=dict)  # signal -> pages it was seen on
+    pages: List[str] = field(default_factory=list)
+    note: str = ""
+    def to_dict(self) -> dict:
+        return asdict(self)
+def fetch(url: str) -> Optional[Page]:
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT, "Accept": "text/html"})
+    try:
+        with urllib.request.urlopen(request, timeout=TRIAGE_TIMEOUT) as response:
+            if "html" not in (response.headers.get_content_type() or ""):
+                return None
+            charset = response.headers.get_content_charset() or "utf-8"
+            html = response.read(TRIAGE_MAX_BYTES).decode(charset, errors="replace")
+            final_url = response.geturl()
+    except Exception as ex:
+        logger.info("Triage fetch of %s failed: %r", url, ex)
+        return None
+    return parse(final_url, html)
+def parse(url: str, html: str) -> Page:
+    parser = _PageParser()
+    parser.feed(html)
+    parser.close()
+    text = " ".join(parser.text)
+    hrefs = " ".join(href for href, _ in parser.links)
+    return Page(url=url, text=text, haystack=" ".join((text, hrefs, *parser.attrs)), links=parser.links)
+def signals_of(page: Page) -> List[str]:
+    return [name for name, pattern in SIGNALS.items() if pattern.search(page.haystack)]
+def follow_links(page: Page, limit: int = TRIAGE_MAX_LINKS) -> List[str]:
+    """Same-site links whose address or label suggests a shop, pricing or account page"""
+    host = urlparse(page.url).hostname
+    picked: List[str] = []
+    for href, label in page.links:
+        target = urljoin(page.url, href).split("#", 1)[0]
+        parsed = urlparse(target)
+        if parsed.scheme not in ("http", "https") or parsed.hostname != host or target in picked or target == page.url:
+            continue
+        if LINK_HINTS.search(f"{parsed.path} {label}"):
+            picked.append(target)
+        if len(picked) >= limit:
+            break
+    return picked
+def plan_scan(url: str, detectors: List[str]) -> ScanPlan:
+    if not settings.SCAN_TRIAGE:
+        return ScanPlan(run=list(detectors), note="triage disabled")
+    landing = fetch(url)
+    if landing is None:
+        return ScanPlan(run=list(detectors), note="triage unavailable: landing page not fetched")
+    if len(landing.text) < TRIAGE_MIN_TEXT:
+        return ScanPlan(run=list(detectors), pages=[landing.url], note="triage unavailable: page is rendered by scripts")
+    pages = [landing]
+    links = follow_links(landing)
+    if links:
+        with ThreadPoolExecutor(max_workers=len(links)) as pool:
+            pages.extend(page for page in pool.map(fetch, links) if page is not None)
+    seen: Dict[str, List[str]] = {}
+    for page in pages:
+        for signal in signals_of(page):
+            seen.setdefault(signal, []).append(page.url)
+    plan = ScanPlan(run=[], signals=seen, pages=[page.url for page in pages])
+    for name in detectors:
+        wanted = registry.get_detector(name).signals
+        if not wanted or any(signal in seen for signal in wanted):
+            plan.run.append(name)
+        else:
+            plan.skip[name] = f"no {', '.join(wanted)} found on {len(pages)} page(s)"
+    return plan
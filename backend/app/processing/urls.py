@@ -1,6 +1,6 @@
 from django.urls import path
 from .views import (
-    SubmitTaskView, TaskStatusView, TaskResultView,
+    SubmitTaskView, TaskStatusView, TaskResultView, TaskCancelView, TaskUsageView,
     WorkerChangeStatusView, WorkerSubmitResultView, WorkerNextTaskView,
     WorkerUploadURLView, TaskResultDownloadURLView, WorkerNextBatchView, WorkerHeartbeatView,
     AnalyzeDocumentView, AnalyzeWebsiteView, DetectDarkPatternsView, DetectSpecificPatternView,
@@ -9,6 +9,8 @@ urlpatterns = [
     path("tasks/submit/", SubmitTaskView.as_view(), name="task-submit"),
     path("tasks/<uuid:task_id>/status/", TaskStatusView.as_view(), name="task-status"),
     path("tasks/<uuid:task_id>/result/", TaskResultView.as_view(), name="task-result"),
+    path("tasks/<uuid:task_id>/cancel/", TaskCancelView.as_view(), name="task-cancel"),
+    path("tasks/<uuid:task_id>/usage/", TaskUsageView.as_view(), name="task-usage"),
     path("tasks/<uuid:task_id>/result/download_url/", TaskResultDownloadURLView.as_view(), name="task-result-download-url"),
     path("agents/analyze-document/", AnalyzeDocumentView.as_view(), name="analyze-document"),
     path("agents/analyze-website/", AnalyzeWebsiteView.as_view(), name="analyze-website"),
@@ -32,6 +32,34 @@ class TaskResultView(RetrieveAPIView):
     lookup_url_kwarg = "task_id"
     queryset = Task.objects.all()
     lookup_field = "id"
+class TaskCancelView(APIView):
+    permission_classes = [permissions.AllowAny]
+    def post(self, request, task_id):
+        with transaction.atomic():
+            try:
+                task = Task.objects.select_for_update().get(id=task_id)
+            except Task.DoesNotExist:
+                return Response({"detail": "Not found"}, status=404)
+            if task.status in (Task.Status.DONE, Task.Status.FAILED, Task.Status.CANCELLED):
+                return Response({"detail": f"Task is already {task.status}"}, status=status.HTTP_409_CONFLICT)
+            task.status = Task.Status.CANCELLED
+            task.finished_at = timezone.now()
+            task.save(update_fields=["status", "finished_at", "updated_at"])
+        if task.celery_task_id:
+            # A queued job is dropped by the worker; a running scan notices the status and stops itself.
+            from app.celery import app as celery_app
+            celery_app.control.revoke(task.celery_task_id)
+        return Response({"id": str(task.id), "status": task.status})
+class TaskUsageView(APIView):
+    permission_classes = [permissions.AllowAny]
+    def get(self, request, task_id):
+        from .models import TaskUsage
+        if not Task.objects.filter(id=task_id).exists():
+            return Response({"detail": "Not found"}, status=404)
+        fields = ["calls", "prompt_tokens", "cached_tokens", "output_tokens", "total_tokens", "latency_ms", "cost_usd"]
+        rows = list(TaskUsage.objects.filter(task_id=task_id).values("detector", "role", "model", *fields))
+        totals = {f: sum(r[f] for r in rows) for f in fields}
+        return Response({"id": str(task_id), "totals": totals, "rows": rows})
 class WorkerChangeStatusView(APIView):
     permission_classes = [HasWorkerToken]
     def patch(self, request, task_id):
@@ -245,7 +273,14 @@ class DetectDarkPatternsView(APIView):
         }, status=status.HTTP_201_CREATED)
 class DetectSpecificPatternView(APIView):
     permission_classes = [permissions.AllowAny]
+    def get(self, request):
+        from app.agents.dynamic_agent.registry import DETECTORS
+        return Response([
+            {"pattern_type": d.name, "title": d.title, "queue": d.queue, "cost_class": d.cost_class}
+            for d in DETECTORS.values()
+        ])
     def post(self, request):
+        from app.agents.dynamic_agent.registry import DETECTORS
         url = request.data.get('url')
         pattern_type = request.data.get('pattern_type')
         project_id = request.data.get('project_id')
@@ -253,14 +288,9 @@ class DetectSpecificPatternView(APIView):
             return Response({"detail": "URL is required"}, status=status.HTTP_400_BAD_REQUEST)
         if not pattern_type:
             return Response({"detail": "pattern_type is required"}, status=status.HTTP_400_BAD_REQUEST)
-        pattern_task_map = {
-            'roach_motel': 'detect_roach_motel_pattern',
-            'fake_urgency': 'detect_fake_urgency_pattern',
-            'drip_pricing': 'detect_drip_pricing_pattern',
-        }
-        if pattern_type not in pattern_task_map:
+        if pattern_type not in DETECTORS:
             return Response({
-                "detail": f"Unknown pattern type. Available: {', '.join(pattern_task_map.keys())}"
+                "detail": f"Unknown pattern type. Available: {', '.join(DETECTORS)}"
             }, status=status.HTTP_400_BAD_REQUEST)
         project = None
         if project_id:
@@ -276,14 +306,18 @@ class DetectSpecificPatternView(APIView):
         from .tasks import (
             detect_roach_motel_pattern,
             detect_fake_urgency_pattern,
-            detect_drip_pricing_pattern
+            detect_drip_pricing_pattern,
+            detect_dark_pattern
         )
         task_function = {
             'roach_motel': detect_roach_motel_pattern,
             'fake_urgency': detect_fake_urgency_pattern,
             'drip_pricing': detect_drip_pricing_pattern,
-        }[pattern_type]
-        task_function.delay(str(task.id), url)
+        }.get(pattern_type)
+        if task_function is None:
+            detect_dark_pattern.delay(str(task.id), url, pattern_type)
+        else:
+            task_function.delay(str(task.id), url)
         return Response({
             "id": str(task.id),
             "status": "queued",
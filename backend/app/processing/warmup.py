@@ -0,0 +1,93 @@
+"""
+Celery worker warm-up, run once per worker process from `worker_process_init`.
+Stages:
+- registry: import google-adk/genai and build the detector agent graphs
+- llm: open the shared GenAI client on the agent runtime loop and touch each model tier
+- mcp: probe the playwright-mcp endpoints
+- browser: pre-launch the Chromium pool on the agent runtime loop
+WORKER_WARMUP lists the stages explicitly ("off" disables). Otherwise the
+stages follow the worker's queues (WORKER_QUEUES, the same list as `-Q`).
+"""
+import os
+import time
+import logging
+from typing import Dict, List
+logger = logging.getLogger(__name__)
+QUEUE_STAGES = {
+    "browser": ["registry", "llm", "mcp", "browser"],
+    "llm": ["llm"],
+    "maintenance": [],
+}
+STAGE_TIMEOUT = float(os.getenv("WORKER_WARMUP_TIMEOUT", "60"))
+report: Dict[str, object] = {}
+def stages_for(queues: List[str], explicit: str = "") -> List[str]:
+    explicit = explicit.strip().lower()
+    if explicit in ("off", "none", "0"):
+        return []
+    if explicit:
+        return [s.strip() for s in explicit.split(",") if s.strip()]
+    stages: List[str] = []
+    for queue in queues or ["browser"]:
+        for stage in QUEUE_STAGES.get(queue, []):
+            if stage not in stages:
+                stages.append(stage)
+    return stages
+def _warm_registry() -> dict:
+    from app.agents.dynamic_agent import registry
+    for name in registry.detector_names():
+        registry.root_agent(name)
+    return {"detectors": len(registry.loaded())}
+async def _warm_llm() -> dict:
+    from app.agents.dynamic_agent.utils.llmproxy import shared_client
+    from app.agents.dynamic_agent.utils.model_router import TIER_MODELS
+    client = shared_client()
+    reachable = {}
+    for model in dict.fromkeys(TIER_MODELS.values()):
+        try:
+            await client.aio.models.get(model=model)
+            reachable[model] = True
+        except Exception as ex:
+            logger.warning("Warm-up: model %s not reachable: %r", model, ex)
+            reachable[model] = False
+    return reachable
+async def _warm_mcp() -> dict:
+    from app.agents.dynamic_agent.utils.mcp_pool import mcp_toolset
+    return await mcp_toolset().check_endpoints()
+async def _warm_browser() -> dict:
+    from app.agents.dynamic_agent.tools.browser_pool import get_pool
+    from app.agents.dynamic_agent.tools.browser_tools import HEADLESS
+    return {"browsers": await get_pool(headless=HEADLESS).warm()}
+_STAGES = {
+    "registry": _warm_registry,
+    "llm": _warm_llm,
+    "mcp": _warm_mcp,
+    "browser": _warm_browser,
+}
+def warm_up(stages: List[str] = None) -> dict:
+    """Run the warm-up stages; a failing stage is logged and does not stop the worker"""
+    from app.agents import runtime
+    if stages is None:
+        queues = [q.strip() for q in os.getenv("WORKER_QUEUES", "").split(",") if q.strip()]
+        stages = stages_for(queues, os.getenv("WORKER_WARMUP", ""))
+    started = time.monotonic()
+    timings, results = {}, {}
+    for stage in stages:
+        fn = _STAGES.get(stage)
+        if fn is None:
+            logger.warning("Warm-up: unknown stage %r", stage)
+            continue
+        stage_started = time.monotonic()
+        try:
+            result = fn()
+            if hasattr(result, "__await__"):
+                result = runtime.run(result, timeout=STAGE_TIMEOUT)
+            results[stage] = result
+        except Exception as ex:
+            logger.warning("Warm-up stage %s failed: %r", stage, ex)
+            results[stage] = {"error": str(ex)}
+        timings[stage] = round(time.monotonic() - stage_started, 3)
+    report.clear()
+    report.update({"stages": timings, "results": results, "total_seconds": round(time.monotonic() - started, 3)})
+    if stages:
+        logger.info("Worker warm-up finished in %.2fs: %s", report["total_seconds"], timings)
+    return report
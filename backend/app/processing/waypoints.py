@@ -0,0 +1,95 @@
+"""
+Per-domain site map learned from detector runs.
+After a run, the navigation trail (app/agents/dynamic_agent/utils/waypoints.py)
+is reduced to one waypoint per detector phase: the last same-site page the
+phase reached and the actions that led there. The next scan of the domain
+gets the fresh ones as hints.
+A waypoint is dropped when
+- a run that was given it fails an action on its URL or on that page,
+- WAYPOINT_MAX_FAILURES runs in a row were given it, never reached it and
+  didn't finish, or
+- it hasn't been confirmed for WAYPOINT_TTL_DAYS.
+"""
+import os
+import logging
+from datetime import timedelta
+from typing import Any, Dict, List, Set
+from django.utils import timezone
+from app.agents.dynamic_agent.utils.waypoints import HINTS_KEY, TRAIL_KEY
+from .adaptive import domain_of, outcome_of
+from .models import DetectorRunStat, SiteWaypoint
+logger = logging.getLogger(__name__)
+WAYPOINT_TTL_DAYS = int(os.getenv("WAYPOINT_TTL_DAYS", "30"))
+WAYPOINT_MAX_FAILURES = int(os.getenv("WAYPOINT_MAX_FAILURES", "2"))
+WAYPOINT_MAX_HINTS = int(os.getenv("WAYPOINT_MAX_HINTS", "8"))
+WAYPOINT_MAX_ACTIONS = int(os.getenv("WAYPOINT_MAX_ACTIONS", "6"))
+def _fresh(detector: str, domain: str):
+    cutoff = timezone.now() - timedelta(days=WAYPOINT_TTL_DAYS)
+    return SiteWaypoint.objects.filter(domain=domain, detector=detector, verified_at__gte=cutoff)
+def hints_for(detector: str, url: str) -> List[Dict[str, Any]]:
+    waypoints = _fresh(detector, domain_of(url)).order_by("-verified_at")[:WAYPOINT_MAX_HINTS]
+    return [{"phase": w.phase, "url": w.url, "actions": w.actions} for w in waypoints]
+def _same_site(url: str, domain: str) -> bool:
+    return url.startswith(("http://", "https://")) and domain_of(url) == domain
+def _failed(trail: List[Dict[str, Any]]) -> Set[str]:
+    """Targets of failed actions and the pages they failed on (their own URL, else the last page reached)"""
+    failed: Set[str] = set()
+    page = None
+    for step in trail:
+        url = (step.get("url") or "").split("#", 1)[0] or None
+        if step.get("ok"):
+            page = url or page
+        else:
+            failed.update(filter(None, (step.get("target"), url or page)))
+    return failed
+def _learn(detector: str, url: str, state: Dict[str, Any]) -> None:
+    domain = domain_of(url)
+    now = timezone.now()
+    trail = state.get(TRAIL_KEY) or []
+    hinted = {hint["url"] for hint in state.get(HINTS_KEY) or []}
+    existing = {w.phase: w for w in SiteWaypoint.objects.filter(domain=domain, detector=detector)}
+    failed = _failed(trail)
+    reached = {step["url"].split("#", 1)[0] for step in trail if step.get("ok") and step.get("url")}
+    finished = outcome_of(state) == DetectorRunStat.Outcome.FINISHED
+    dropped = set()
+    for waypoint in existing.values():
+        if waypoint.url not in hinted:
+            continue
+        if waypoint.url in failed:
+            waypoint.failures = WAYPOINT_MAX_FAILURES
+            dropped.add(waypoint.url)
+        elif waypoint.url in reached:
+            continue
+        elif not finished:
+            waypoint.failures += 1
+        if waypoint.failures >= WAYPOINT_MAX_FAILURES:
+            waypoint.delete()
+            waypoint.pk = None
+        else:
+            waypoint.save(update_fields=["failures"])
+    steps = [step for step in trail if step.get("ok")]
+    # Last same-site page each phase ended on; its path is every action up to it, whatever the phase.
+    landed: Dict[str, int] = {}
+    for index, step in enumerate(steps):
+        if step.get("url") and _same_site(step["url"], domain):
+            landed[step.get("phase") or "page"] = index
+    for phase, last in landed.items():
+        actions = [f"{step['tool']} {step['target']}".strip() for step in steps[: last + 1]][-WAYPOINT_MAX_ACTIONS:]
+        page = steps[last]["url"].split("#", 1)[0]
+        if page in dropped:
+            continue
+        waypoint = existing.get(phase)
+        if waypoint is None or waypoint.pk is None:
+            waypoint = SiteWaypoint(domain=domain, detector=detector, phase=phase)
+        waypoint.url, waypoint.actions, waypoint.verified_at = page, actions, now
+        waypoint.hits += 1
+        waypoint.failures = 0
+        waypoint.save()
+    SiteWaypoint.objects.filter(
+        domain=domain, detector=detector, verified_at__lt=now - timedelta(days=WAYPOINT_TTL_DAYS),
+    ).delete()
+def learn(detector: str, url: str, state: Dict[str, Any]) -> None:
+    try:
+        _learn(detector, url, state)
+    except Exception as ex:
+        logger.warning("Waypoints of %s on %s not saved: %r", detector, url, ex)
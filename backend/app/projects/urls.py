@@ -1,7 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    ProjectViewSet, ComplaintViewSet, DashboardStatsAPIView
+    ProjectViewSet, ComplaintViewSet, DashboardStatsAPIView, RegulatorUsageStatsView
 )
 router = DefaultRouter()
 router.register(r"projects", ProjectViewSet, basename="projects")
@@ -9,4 +9,5 @@ router.register(r"complaints", ComplaintViewSet, basename="complaints")
 urlpatterns = [
     path("", include(router.urls)),
     path("dashboard/stats/", DashboardStatsAPIView.as_view(), name="dashboard-stats"),
+    path("regulator/usage/", RegulatorUsageStatsView.as_view(), name="regulator-usage"),
 ]
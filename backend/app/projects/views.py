@@ -251,6 +251,34 @@ class RegulatorLatencyStatsView(APIView):
             )
             row = cur.fetchone()
         return Response({"window_days": days, "p50_seconds": row[0], "p95_seconds": row[1]})
+class RegulatorUsageStatsView(APIView):
+    """LLM tokens, cost and latency of recent tasks, grouped by detector, role or model"""
+    permission_classes = [permissions.IsAuthenticated]
+    GROUPS = ("detector", "role", "model")
+    def get(self, request):
+        from django.db.models import Sum
+        from app.processing.models import TaskUsage
+        user = request.user
+        if not (user.is_superuser or getattr(user,'role','') in ("admin","regulator")):
+            return Response({"detail": "Forbidden"}, status=403)
+        days = int(request.query_params.get('days', 30))
+        group_by = [g for g in request.query_params.get('group_by', 'detector,role').split(',') if g in self.GROUPS]
+        rows = (
+            TaskUsage.objects.filter(task__created_at__gte=timezone.now() - timedelta(days=days))
+            .values(*group_by)
+            .annotate(
+                tasks=Count('task', distinct=True),
+                calls=Sum('calls'),
+                prompt_tokens=Sum('prompt_tokens'),
+                cached_tokens=Sum('cached_tokens'),
+                output_tokens=Sum('output_tokens'),
+                total_tokens=Sum('total_tokens'),
+                latency_ms=Sum('latency_ms'),
+                cost_usd=Sum('cost_usd'),
+            )
+            .order_by('-total_tokens')
+        )
+        return Response({"window_days": days, "group_by": group_by, "rows": list(rows)})
 class DashboardStatsView(APIView):
     """API endpoint for dashboard statistics"""
     permission_classes = [permissions.IsAuthenticated]
@@ -74,6 +74,21 @@ SIMPLE_JWT = {
 CELERY_BROKER_URL = os.environ.get("REDIS_URL", "redis://redis:6379/0")
 CELERY_RESULT_BACKEND = os.environ.get("REDIS_URL", "redis://redis:6379/0")
 CELERY_TIMEZONE = "UTC"
+CELERY_TASK_DEFAULT_QUEUE = "browser"
+CELERY_TASK_ROUTES = ("app.processing.queues.route_task",)
+CELERY_TASK_ANNOTATIONS = ("app.processing.queues.QueueAnnotations",)
+CELERY_TASK_QUEUE_MAX_PRIORITY = 9
+CELERY_TASK_DEFAULT_PRIORITY = 5
+CELERY_WORKER_PREFETCH_MULTIPLIER = int(os.environ.get("CELERY_PREFETCH_MULTIPLIER", 1))
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    "priority_steps": list(range(10)),
+    "sep": ":",
+    "queue_order_strategy": "priority",
+    # Unacked (acks_late) messages are redelivered after this; keep it above the longest scan.
+    "visibility_timeout": int(os.environ.get("CELERY_VISIBILITY_TIMEOUT", 4 * 3600 + 600)),
+}
+# Pre-screen sites before a full scan and skip detectors that can't apply (app/processing/triage.py).
+SCAN_TRIAGE = os.environ.get("SCAN_TRIAGE", "1") == "1"
 CELERY_BEAT_SCHEDULE = {
     "requeue-stale-tasks": {
         "task": "app.processing.tasks.requeue_stale_tasks",
@@ -0,0 +1,59 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from google.adk.agents import BaseAgent, LoopAgent
+from google.adk.events import Event, EventActions
+from app.agents.dynamic_agent.runner import run_agent
+from app.agents.dynamic_agent.utils import budget
+from app.agents.dynamic_agent.utils.callbacks import _append
+from app.processing import adaptive
+from app.processing.models import DetectorRunStat, Task
+from app.processing.tasks import detect_dark_pattern
+BASE = budget.Limits(tokens=300_000, seconds=1200, actions=80)
+class StepAgent(BaseAgent):
+    async def _run_async_impl(self, ctx):
+        await asyncio.sleep(0)
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            actions=EventActions(state_delta={"steps": ctx.session.state.get("steps", 0) + 1}),
+        )
+def _stats(domain, count, outcome=DetectorRunStat.Outcome.FINISHED, detector="nagging"):
+    DetectorRunStat.objects.bulk_create(
+        DetectorRunStat(detector=detector, domain=domain, outcome=outcome, iterations=i, seconds=10.0 * i, tokens=1000 * i, actions=2 * i)
+        for i in range(1, count + 1)
+    )
+@pytest.mark.django_db
+def test_limits_follow_the_domain_history():
+    _stats("shop.example", 10)
+    _stats("other.example", 10, detector="drip_pricing")
+    limits = adaptive.learned_limits("nagging", "https://www.shop.example/cart", BASE)
+    # p95 of 1..10 is 10, times the 1.5 margin
+    assert limits == budget.Limits(tokens=15_000, seconds=150, actions=30, iterations=15)
+@pytest.mark.django_db
+def test_sparse_domain_falls_back_to_detector_history():
+    _stats("big.example", 10)
+    _stats("new.example", 2)
+    assert adaptive.learned_limits("nagging", "https://new.example", BASE).iterations == 15
+    assert adaptive.learned_limits("confirmshaming", "https://new.example", BASE) == BASE
+@pytest.mark.django_db
+def test_runs_cut_short_restore_configured_limits():
+    _stats("shop.example", 6)
+    _stats("shop.example", 4, outcome=DetectorRunStat.Outcome.BUDGET_EXHAUSTED)
+    assert adaptive.learned_limits("nagging", "https://shop.example", BASE) == BASE
+def test_loop_stops_at_learned_iteration_limit():
+    step = StepAgent(name="capped_step")
+    loop = LoopAgent(name="capped_loop", sub_agents=[step], max_iterations=20)
+    _append(step, "before_agent_callback", budget.iteration_callback(loop))
+    _append(step, "before_agent_callback", budget.before_agent_callback)
+    state = run_agent(loop, {"steps": 0}, budget=budget.Budget(budget.Limits(iterations=4)))
+    assert state["steps"] == 4
+    assert state["final_reason"] == "budget_exhausted: iterations"
+@pytest.mark.django_db
+def test_detector_run_is_recorded():
+    task = Task.objects.create(url='https://www.example.com/', status=Task.Status.QUEUED)
+    final_state = {'final_summary': 'done', 'final_data': {'detected': True}}
+    with patch('app.processing.tasks.registry.root_agent'), patch('app.processing.tasks.run_agent', return_value=final_state):
+        detect_dark_pattern(str(task.id), task.url, 'nagging')
+    stat = DetectorRunStat.objects.get()
+    assert (stat.detector, stat.domain, stat.outcome) == ('nagging', 'example.com', DetectorRunStat.Outcome.FINISHED)
@@ -0,0 +1,47 @@
+import asyncio
+from google.adk.agents import BaseAgent
+from google.adk.events import Event, EventActions
+from app.agents import runtime
+from app.agents.rate_limiter import current_priority, llm_priority
+from app.agents.dynamic_agent.runner import run_agent
+class EchoAgent(BaseAgent):
+    async def _run_async_impl(self, ctx):
+        await asyncio.sleep(0.05)
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            actions=EventActions(state_delta={
+                "final_summary": f"checked {ctx.session.state['target_site']}",
+                "lane": current_priority(),
+            }),
+        )
+def test_run_agent_returns_final_state():
+    state = run_agent(EchoAgent(name="echo"), {"request": "Test", "target_site": "https://example.com"})
+    assert state["final_summary"] == "checked https://example.com"
+    assert state["target_site"] == "https://example.com"
+def test_run_agent_keeps_caller_priority():
+    with llm_priority("high"):
+        state = run_agent(EchoAgent(name="echo_priority"), {"target_site": "x"})
+    assert state["lane"] == "high"
+def test_scans_share_one_loop_concurrently():
+    agent = EchoAgent(name="echo_many")
+    async def many():
+        from app.agents.dynamic_agent.runner import run_agent_async
+        return await asyncio.gather(*(run_agent_async(agent, {"target_site": str(i)}) for i in range(20)))
+    loop_before = runtime.get_loop()
+    results = runtime.run(many(), timeout=10)
+    assert [r["final_summary"] for r in results] == [f"checked {i}" for i in range(20)]
+    assert runtime.get_loop() is loop_before
+def test_timeout_cancels_the_running_coroutine():
+    import threading
+    import pytest
+    cancelled = threading.Event()
+    async def slow():
+        try:
+            await asyncio.sleep(30)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+    with pytest.raises(TimeoutError):
+        runtime.run(slow(), timeout=0.1)
+    assert cancelled.wait(2)
@@ -0,0 +1,147 @@
+import asyncio
+from app.agents.dynamic_agent.tools.browser_pool import BrowserPool
+class FakeContext:
+    def __init__(self):
+        self.closed = False
+    async def close(self):
+        self.closed = True
+class FakeBrowser:
+    def __init__(self):
+        self.connected = True
+    def is_connected(self):
+        return self.connected
+    async def new_context(self, **options):
+        return FakeContext()
+    async def close(self):
+        self.connected = False
+class FakeChromium:
+    def __init__(self):
+        self.launched = []
+    async def launch(self, **kwargs):
+        self.launched.append(FakeBrowser())
+        return self.launched[-1]
+class FakePlaywright:
+    def __init__(self):
+        self.chromium = FakeChromium()
+    async def stop(self):
+        pass
+def _pool(**kwargs):
+    pool = BrowserPool(**kwargs)
+    pool._pw = FakePlaywright()
+    return pool
+def test_contexts_share_warm_browser_until_limit():
+    async def run():
+        pool = _pool(max_browsers=2, max_contexts=2, recycle_after=100)
+        await pool.warm(1)
+        contexts = [await pool.acquire() for _ in range(3)]
+        stats = pool.stats()
+        await pool.release(contexts[0])
+        return pool, contexts, stats
+    pool, contexts, stats = asyncio.run(run())
+    assert len(pool._pw.chromium.launched) == 2
+    assert stats["contexts"] == 3
+    assert contexts[0].closed and pool.stats()["contexts"] == 2
+def test_browser_recycled_after_n_uses():
+    async def run():
+        pool = _pool(max_browsers=1, max_contexts=4, recycle_after=2)
+        first = await pool.acquire()
+        second = await pool.acquire()
+        await pool.release(first)
+        await pool.release(second)
+        await pool.acquire()
+        return pool
+    pool = asyncio.run(run())
+    old, new = pool._pw.chromium.launched
+    assert not old.connected and new.connected
+    assert pool.stats()["browsers"] == 1
+def test_acquire_waits_for_release_when_saturated():
+    async def run():
+        pool = _pool(max_browsers=1, max_contexts=1, recycle_after=100)
+        held = await pool.acquire()
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        await pool.release(held)
+        return await asyncio.wait_for(waiter, 1)
+    assert asyncio.run(run()) is not None
+def test_disconnected_browser_is_replaced():
+    async def run():
+        pool = _pool(max_browsers=1, max_contexts=4, recycle_after=100)
+        await pool.warm(1)
+        pool._pw.chromium.launched[0].connected = False
+        await pool.acquire()
+        return pool
+    pool = asyncio.run(run())
+    assert len(pool._pw.chromium.launched) == 2
+def test_registry_evicts_lru_and_reaps_idle(monkeypatch):
+    from app.agents.dynamic_agent.tools import browser_tools
+    class FakePage:
+        pass
+    class PagedContext(FakeContext):
+        async def route(self, pattern, handler):
+            self.handler = handler
+        def on(self, event, callback):
+            pass
+        async def new_page(self):
+            return FakePage()
+    class PagedBrowser(FakeBrowser):
+        async def new_context(self, **options):
+            return PagedContext()
+    class PagedChromium(FakeChromium):
+        async def launch(self, **kwargs):
+            self.launched.append(PagedBrowser())
+            return self.launched[-1]
+    monkeypatch.setattr(browser_tools, "MAX_SESSIONS", 2)
+    monkeypatch.setattr(browser_tools, "_REGISTRY", {})
+    async def run():
+        pool = browser_tools.get_pool()
+        pool._pw = FakePlaywright()
+        pool._pw.chromium = PagedChromium()
+        contexts = []
+        for _ in range(3):
+            ctx = type("Ctx", (), {"state": {}})()
+            sess, meta = await browser_tools._get_or_create_session(ctx)
+            assert sess is not None, meta
+            contexts.append(sess.context)
+        first_evicted = contexts[0].closed
+        assert len(browser_tools._REGISTRY) == 2
+        for sess in browser_tools._REGISTRY.values():
+            sess.last_used -= browser_tools.SESSION_IDLE_TTL + 1
+        await browser_tools._reap_idle()
+        return first_evicted, contexts
+    before = dict(browser_tools._EVICTIONS)
+    first_evicted, contexts = asyncio.run(run())
+    assert first_evicted
+    assert all(c.closed for c in contexts)
+    assert browser_tools._REGISTRY == {}
+    assert browser_tools._EVICTIONS["lru"] == before.get("lru", 0) + 1
+    assert browser_tools._EVICTIONS["idle"] == before.get("idle", 0) + 2
+def test_routing_policy_blocks_heavy_and_tracker_requests():
+    from app.agents.dynamic_agent.tools.request_policy import RoutingPolicy
+    policy = RoutingPolicy(block_resources=frozenset({"image", "media", "font"}))
+    assert policy.block_reason("font", "https://shop.example/f.woff2") == "font"
+    assert policy.block_reason("script", "https://www.googletagmanager.com/gtm.js") == "tracker"
+    assert policy.block_reason("script", "https://shop.example/app.js") is None
+    assert policy.block_reason("document", "https://mc.yandex.ru.example.org/") is None
+    policy.allow_images = True
+    assert policy.block_reason("image", "https://shop.example/p.jpg") is None
+    assert RoutingPolicy(enabled=False).block_reason("media", "https://x/v.mp4") is None
+def test_lru_never_evicts_the_browser_of_a_running_scan(monkeypatch):
+    from app.agents.dynamic_agent import runner
+    from app.agents.dynamic_agent.tools import browser_tools
+    class Pool:
+        async def release(self, context):
+            context.closed = True
+    monkeypatch.setattr(browser_tools, "MAX_SESSIONS", 1)
+    monkeypatch.setattr(browser_tools, "_REGISTRY", {})
+    monkeypatch.setattr(runner, "_running", {"scan-1", "scan-2"})
+    async def run():
+        loop = asyncio.get_running_loop()
+        for sid, owner in (("busy-1", "scan-1"), ("busy-2", "scan-2"), ("done", "scan-3")):
+            browser_tools._REGISTRY[sid] = browser_tools._BrowserSession(
+                context=FakeContext(), page=None, pool=Pool(), loop=loop, owner=owner,
+            )
+        browser_tools._REGISTRY["done"].last_used += 60
+        await browser_tools._evict_lru()
+    asyncio.run(run())
+    assert set(browser_tools._REGISTRY) == {"busy-1", "busy-2"}
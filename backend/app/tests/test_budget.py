@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from google.adk.agents import BaseAgent, LoopAgent
+from google.adk.events import Event, EventActions
+from app.agents.dynamic_agent import registry
+from app.agents.dynamic_agent.runner import run_agent
+from app.agents.dynamic_agent.utils import budget
+from app.agents.dynamic_agent.utils.callbacks import _append
+from app.processing.models import Task
+from app.processing.tasks import detect_all_dark_patterns
+class SpendingAgent(BaseAgent):
+    async def _run_async_impl(self, ctx):
+        await asyncio.sleep(0)
+        budget._budgets[ctx.session.id].charge(tokens=100, actions=1)
+        steps = ctx.session.state.get("steps", 0) + 1
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            actions=EventActions(state_delta={"steps": steps, "parsed": {"extracted": {"prices": steps}}}),
+        )
+def test_loop_finishes_with_partial_data_when_budget_runs_out():
+    step = SpendingAgent(name="budget_step")
+    _append(step, "before_agent_callback", budget.before_agent_callback)
+    loop = LoopAgent(name="budget_loop", sub_agents=[step], max_iterations=50)
+    state = run_agent(loop, {"steps": 0}, budget=budget.Budget(budget.Limits(tokens=250)))
+    assert state["steps"] == 3
+    assert state["final_reason"] == "budget_exhausted: tokens"
+    assert state["final_data"]["budget_exhausted"] is True
+    assert state["final_data"]["prices"] == 3
+    assert state["final_data"]["budget_used"]["tokens"] == 300
+def test_child_budget_charges_and_checks_the_task_budget(monkeypatch):
+    monkeypatch.setattr(budget, "SOFT_RATIO", 0.8)
+    task = budget.Budget(budget.Limits(tokens=1000))
+    detector = task.child(budget.Limits(actions=10))
+    detector.charge(tokens=850, actions=2)
+    assert task.tokens == 850 and task.actions == 2
+    assert detector.nearly_exhausted() == "tokens"
+    assert detector.exhausted() is None
+    detector.charge(tokens=150)
+    assert detector.exhausted() == "tokens"
+def test_detector_overrides_and_cost_class_defaults(monkeypatch):
+    monkeypatch.setattr(budget, "DETECTOR_LIMITS", budget._parse_overrides("nagging=1000:60:5, broken"))
+    assert budget.limits_for("nagging") == budget.Limits(1000, 60, 5)
+    cost_class = registry.get_detector("drip_pricing").cost_class
+    assert budget.limits_for("drip_pricing") == budget.COST_CLASS_LIMITS[cost_class]
+@pytest.mark.django_db
+def test_full_scan_skips_remaining_detectors_once_task_budget_is_spent(monkeypatch):
+    monkeypatch.setattr(budget, "TASK_LIMITS", budget.Limits(tokens=100))
+    task = Task.objects.create(url='https://example.com', status=Task.Status.QUEUED)
+    def spend_everything(pattern_type, url, budget=None, **kwargs):
+        budget.charge(tokens=100)
+        return {'detected': False, 'budget_exhausted': True}
+    with patch('app.processing.tasks._run_detector', side_effect=spend_everything) as run_detector:
+        detect_all_dark_patterns(str(task.id), task.url)
+    assert run_detector.call_count == 1
+    task.refresh_from_db()
+    assert task.status == Task.Status.DONE
+    results = task.result_json['pattern_results']
+    skipped = [name for name, result in results.items() if result.get('skipped')]
+    assert len(skipped) == len(registry.detector_names()) - 1
+    assert all(results[name]['budget_exhausted'] for name in skipped)
+def test_escalated_call_is_charged_for_discarded_attempts():
+    from types import SimpleNamespace
+    from google.adk.models.llm_response import LlmResponse
+    from google.genai import types
+    from app.agents.dynamic_agent.utils import model_router
+    response = LlmResponse(
+        usage_metadata=types.GenerateContentResponseUsageMetadata(total_token_count=300),
+        custom_metadata={model_router.MODEL_KEY: "pro", model_router.DISCARDED_KEY: [
+            {"model": "lite", "usage": {"total_token_count": 100}, "seconds": 1.0},
+        ]},
+    )
+    spent = budget.Budget(budget.Limits())
+    budget.attach("escalated", spent)
+    try:
+        ctx = SimpleNamespace(_invocation_context=SimpleNamespace(session=SimpleNamespace(id="escalated")))
+        budget.after_model_callback(ctx, response)
+    finally:
+        budget.detach("escalated")
+    assert spent.tokens == 400
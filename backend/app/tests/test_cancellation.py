@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from google.adk.agents import BaseAgent, LoopAgent
+from google.adk.events import Event, EventActions
+from rest_framework.test import APIClient
+from app.agents.dynamic_agent.runner import run_agent
+from app.agents.dynamic_agent.utils import cancellation
+from app.agents.dynamic_agent.utils.callbacks import _append
+from app.processing.models import Task
+from app.processing.tasks import detect_dark_pattern
+class CountingAgent(BaseAgent):
+    async def _run_async_impl(self, ctx):
+        await asyncio.sleep(0.01)
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            actions=EventActions(state_delta={"steps": ctx.session.state.get("steps", 0) + 1}),
+        )
+@pytest.mark.django_db
+def test_cancel_endpoint_marks_task_and_revokes_job():
+    task = Task.objects.create(url='https://example.com', status=Task.Status.IN_PROGRESS, celery_task_id='abc')
+    client = APIClient()
+    with patch('app.celery.app.control.revoke') as revoke:
+        response = client.post(f'/api/v1/tasks/{task.id}/cancel/')
+    assert response.status_code == 200
+    assert response.data['status'] == 'cancelled'
+    revoke.assert_called_once_with('abc')
+    task.refresh_from_db()
+    assert task.status == Task.Status.CANCELLED
+    assert task.finished_at is not None
+    assert client.post(f'/api/v1/tasks/{task.id}/cancel/').status_code == 409
+@pytest.mark.django_db
+def test_cancelled_task_is_not_started():
+    task = Task.objects.create(url='https://example.com', status=Task.Status.CANCELLED)
+    with patch('app.processing.tasks._run_detector') as run_detector:
+        result = detect_dark_pattern(str(task.id), task.url, 'nagging')
+    assert result['status'] == 'cancelled'
+    run_detector.assert_not_called()
+def test_loop_stops_cooperatively(monkeypatch):
+    monkeypatch.setattr(cancellation, "CHECK_INTERVAL", 0)
+    step = CountingAgent(name="step")
+    _append(step, "before_agent_callback", cancellation.before_agent_callback)
+    loop = LoopAgent(name="cancel_loop", sub_agents=[step], max_iterations=50)
+    probes = []
+    def should_stop():
+        probes.append(1)
+        return len(probes) > 3
+    with pytest.raises(cancellation.ScanCancelled):
+        run_agent(loop, {"steps": 0}, should_stop=should_stop)
+    assert len(probes) < 10
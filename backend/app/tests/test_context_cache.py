@@ -0,0 +1,49 @@
+import asyncio
+from unittest.mock import patch
+from google.genai import types
+from app.agents import context_cache
+from app.agents.context_cache import ContextCacheRegistry
+from app.agents.dynamic_agent.utils.callbacks import split_static_instruction
+def _contents(text):
+    return [types.Content(role="user", parts=[types.Part(text=text)])]
+def test_split_static_instruction_moves_state_out_of_prefix():
+    static, dynamic = split_static_instruction("Plan: {plan?}\nPage: {last_page_text?}\nAgain {plan}\nJSON: { \"a\": 1 }")
+    assert static == "Plan: <plan>\nPage: <last_page_text>\nAgain <plan>\nJSON: { \"a\": 1 }"
+    assert dynamic.splitlines()[1:] == ["<plan>: {plan?}", "<last_page_text>: {last_page_text?}"]
+    assert split_static_instruction("No state here") == ("No state here", "")
+def test_instructions_are_split_only_for_opted_in_roles():
+    from google.adk.agents import LlmAgent
+    from app.agents.dynamic_agent.utils import callbacks
+    decider = LlmAgent(name="nagging_decider_agent", instruction="Plan: {plan?}")
+    parser = LlmAgent(name="nagging_parser_agent", instruction="Page: {last_page_text?}")
+    with patch.object(context_cache, "MODE", "provider"), patch.object(callbacks, "STATIC_INSTRUCTION_ROLES", frozenset({"decider"})):
+        callbacks.instrument(decider)
+        callbacks.instrument(parser)
+    assert decider.static_instruction == "Plan: <plan>"
+    assert parser.static_instruction is None and parser.instruction == "Page: {last_page_text?}"
+def test_local_cache_created_after_min_uses_and_inlined():
+    registry = ContextCacheRegistry(mode="local")
+    contract = _contents("x" * 8000)
+    async def run():
+        with patch.object(context_cache, "MIN_TOKENS", 100):
+            first = await registry.get_or_create(None, "gemini-2.5-pro", contents=contract, min_uses=2)
+            second = await registry.get_or_create(None, "gemini-2.5-pro", contents=contract, min_uses=2)
+            third = await registry.get_or_create(None, "gemini-2.5-pro", contents=contract, min_uses=2)
+            small = await registry.get_or_create(None, "gemini-2.5-pro", contents=_contents("short"), min_uses=1)
+        return first, second, third, small
+    first, second, third, small = asyncio.run(run())
+    assert first is None and small is None
+    assert second == third and second.startswith(context_cache.LOCAL_PREFIX)
+    assert registry.stats()["created"] == 1
+    merged = registry.contents_for(second, _contents("question"))
+    assert [c.parts[0].text for c in merged] == ["x" * 8000, "question"]
+    config = types.GenerateContentConfig(system_instruction="static")
+    assert registry.config_for(second, config) is config
+    asyncio.run(registry.release(None, second))
+    assert registry.stats()["live"] == 0
+def test_provider_config_drops_cached_parts():
+    registry = ContextCacheRegistry(mode="provider")
+    config = types.GenerateContentConfig(system_instruction="static", temperature=0.2)
+    cached = registry.config_for("cachedContents/abc", config)
+    assert cached.cached_content == "cachedContents/abc"
+    assert cached.system_instruction is None and cached.temperature == 0.2
@@ -0,0 +1,42 @@
+import asyncio
+from google.adk.agents import BaseAgent, LoopAgent
+from google.adk.events import Event, EventActions
+from app.agents.dynamic_agent.runner import run_agent
+from app.agents.dynamic_agent.utils import convergence
+from app.agents.dynamic_agent.utils.callbacks import instrument
+class StuckAgent(BaseAgent):
+    """Writes the same page text every iteration and counts its runs"""
+    async def _run_async_impl(self, ctx):
+        await asyncio.sleep(0)
+        key = f"{self.name}_runs"
+        delta = {key: ctx.session.state.get(key, 0) + 1}
+        if self.name.endswith("_navigator_agent"):
+            delta["last_page_text"] = "same page"
+            if ctx.session.state.get("fresh_pages", 0) > delta[key]:
+                delta["last_page_text"] = f"page {delta[key]}"
+        yield Event(author=self.name, invocation_id=ctx.invocation_id, actions=EventActions(state_delta=delta))
+def _loop(name, critic=True):
+    subs = [StuckAgent(name=f"{name}_decider_agent"), StuckAgent(name=f"{name}_navigator_agent")]
+    if critic:
+        subs.append(StuckAgent(name=f"{name}_critic_agent"))
+    return instrument(LoopAgent(name=f"{name}_loop", sub_agents=subs, max_iterations=30))
+def test_stalled_loop_forces_critic_then_stops(monkeypatch):
+    monkeypatch.setattr(convergence, "CONVERGENCE_PATIENCE", 2)
+    state = run_agent(_loop("stuck"), {"parsed": {"extracted": {"prices": [1]}}})
+    # Iterations 1-2 see new state, 3 stalls, 4 runs only the critic, 5 stops.
+    assert state["stuck_navigator_agent_runs"] == 3
+    assert state["stuck_critic_agent_runs"] == 4
+    assert state["stalled_iterations"] == 3
+    assert state["final_reason"] == "stalled: no progress in 3 iterations"
+    assert state["final_data"] == {"prices": [1], "stalled": True, "stalled_iterations": 3}
+def test_progress_resets_the_stall_counter(monkeypatch):
+    monkeypatch.setattr(convergence, "CONVERGENCE_PATIENCE", 2)
+    state = run_agent(_loop("moving", critic=False), {"fresh_pages": 10})
+    assert state["moving_navigator_agent_runs"] == 12
+    assert state["stalled_iterations"] == 2
+    assert state["final_reason"].startswith("stalled")
+def test_disabled_supervisor_leaves_loop_alone(monkeypatch):
+    monkeypatch.setattr(convergence, "CONVERGENCE_PATIENCE", 0)
+    state = run_agent(_loop("patient"), {})
+    assert state["patient_decider_agent_runs"] == 30
+    assert "stalled_iterations" not in state
@@ -0,0 +1,30 @@
+import pytest
+from unittest.mock import patch
+from rest_framework.test import APIClient
+from app.agents.dynamic_agent import registry
+from app.processing.models import Task
+def test_registry_lists_all_detectors_without_building_them():
+    assert len(registry.DETECTORS) == 12
+    assert registry.get_detector("nagging").attr == "nagging_root_agent"
+    with pytest.raises(ValueError):
+        registry.get_detector("unknown")
+def test_root_agent_is_built_once_per_process():
+    first = registry.root_agent("confirmshaming")
+    assert first is registry.root_agent("confirmshaming")
+    assert first.name == "confirmshaming_pipeline"
+    assert "confirmshaming" in registry.loaded()
+@pytest.mark.django_db
+def test_detect_pattern_endpoint_exposes_all_patterns():
+    client = APIClient()
+    listed = client.get('/api/v1/agents/detect-pattern/')
+    assert listed.status_code == 200
+    assert {d['pattern_type'] for d in listed.data} == set(registry.DETECTORS)
+    with patch('app.processing.tasks.detect_dark_pattern') as mock_task:
+        response = client.post(
+            '/api/v1/agents/detect-pattern/',
+            {'url': 'https://example.com', 'pattern_type': 'nagging'},
+            format='json'
+        )
+    assert response.status_code == 201
+    assert Task.objects.get(id=response.data['id']).status == Task.Status.QUEUED
+    mock_task.delay.assert_called_once_with(response.data['id'], 'https://example.com', 'nagging')
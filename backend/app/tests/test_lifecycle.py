@@ -0,0 +1,77 @@
+import pytest
+from app.agents.dynamic_agent.utils.cancellation import ScanCancelled
+from app.processing.lifecycle import TaskLifecycle
+from app.processing.models import Task
+from app.projects.models import Project
+@pytest.fixture
+def project(db):
+    from django.contrib.auth import get_user_model
+    owner = get_user_model().objects.create_user(username='owner', password='x')
+    return Project.objects.create(name='Shop', site_url='https://example.com', owner=owner)
+@pytest.mark.django_db
+def test_finish_updates_task_and_project_in_few_queries(project, django_assert_max_num_queries):
+    task = Task.objects.create(url='https://example.com', status=Task.Status.QUEUED, project=project)
+    # Claiming the row under a lock adds a savepoint and its release.
+    with django_assert_max_num_queries(8):
+        with TaskLifecycle(str(task.id)) as lc:
+            lc.finish({'ok': True}, trust_score=42.0)
+    assert lc.outcome == {'task_id': str(task.id), 'status': 'success'}
+    task.refresh_from_db()
+    project.refresh_from_db()
+    assert task.status == Task.Status.DONE
+    assert task.started_at and task.finished_at
+    assert project.trust_score == 42.0
+    assert project.status == Project.Status.UNDER_REVIEW
+@pytest.mark.django_db
+def test_failure_marks_task_failed_without_reloading():
+    task = Task.objects.create(url='https://example.com', status=Task.Status.QUEUED)
+    with pytest.raises(RuntimeError):
+        with TaskLifecycle(str(task.id)):
+            raise RuntimeError('boom')
+    task.refresh_from_db()
+    assert task.status == Task.Status.FAILED
+    assert task.error == 'boom'
+@pytest.mark.django_db
+def test_cancelled_scan_keeps_cancelled_status():
+    task = Task.objects.create(url='https://example.com', status=Task.Status.QUEUED)
+    with TaskLifecycle(str(task.id)) as lc:
+        Task.objects.filter(id=task.id).update(status=Task.Status.CANCELLED)
+        assert lc.cancelled()
+        raise ScanCancelled(str(task.id))
+    assert lc.outcome['status'] == 'cancelled'
+    task.refresh_from_db()
+    assert task.status == Task.Status.CANCELLED
+@pytest.mark.django_db
+def test_redelivered_task_is_skipped_while_it_runs_elsewhere():
+    from datetime import timedelta
+    from django.utils import timezone
+    now = timezone.now()
+    task = Task.objects.create(url='https://example.com', status=Task.Status.IN_PROGRESS, started_at=now, heartbeat_at=now)
+    with TaskLifecycle(str(task.id)) as lc:
+        assert lc.skipped
+    assert lc.outcome['status'] == 'duplicate'
+    Task.objects.filter(id=task.id).update(heartbeat_at=now - timedelta(hours=1))
+    with TaskLifecycle(str(task.id)) as lc:
+        assert not lc.skipped
+        lc.finish({'ok': True})
+    task.refresh_from_db()
+    assert task.status == Task.Status.DONE
+@pytest.mark.django_db
+def test_run_timeout_is_cut_to_the_scan_deadline():
+    import time
+    task = Task.objects.create(url='https://example.com', status=Task.Status.QUEUED)
+    with TaskLifecycle(str(task.id)) as lc:
+        lc.deadline = time.monotonic() + 5
+        assert 0 < lc.run_timeout() <= 5
+        lc.deadline = time.monotonic() - 1
+        assert lc.run_timeout() == 0
+        lc.finish({'ok': True})
+@pytest.mark.django_db
+def test_error_after_cancel_keeps_cancelled_status():
+    task = Task.objects.create(url='https://example.com', status=Task.Status.QUEUED)
+    with TaskLifecycle(str(task.id)) as lc:
+        Task.objects.filter(id=task.id).update(status=Task.Status.CANCELLED)
+        raise RuntimeError('Target page, context or browser has been closed')
+    assert lc.outcome['status'] == 'cancelled'
+    task.refresh_from_db()
+    assert task.status == Task.Status.CANCELLED
@@ -0,0 +1,48 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import patch
+from google.genai import types
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from app.agents.dynamic_agent.utils import llm_cache
+from app.agents.dynamic_agent.utils.roles import agent_role, agent_detector
+def _ctx(name):
+    return SimpleNamespace(agent_name=name, state={})
+def _request(text):
+    return LlmRequest(
+        model="gemini-2.5-pro",
+        contents=[types.Content(role="user", parts=[types.Part(text=text)])],
+        config=types.GenerateContentConfig(system_instruction="plan the scan"),
+    )
+@pytest.fixture
+def disk_store(tmp_path):
+    store = llm_cache._DiskStore(tmp_path, ttl=60, max_bytes=10_000)
+    with patch.object(llm_cache, "_store", store), \
+         patch.object(llm_cache, "CACHE_ROLES", frozenset({"ingest"})):
+        yield store
+def test_role_names():
+    assert agent_role("drip_pricing_form_filler_agent") == "form_filler"
+    assert agent_detector("drip_pricing_form_filler_agent") == "drip_pricing"
+    assert agent_role("decider_agent") == "decider"
+    assert agent_detector("decider_agent") == "browser"
+def test_cache_replays_identical_request(disk_store):
+    ctx = _ctx("drip_pricing_ingest_agent")
+    assert llm_cache.before_model_callback(ctx, _request("Test https://example.com")) is None
+    response = LlmResponse(content=types.Content(role="model", parts=[types.Part(text='{"browse_goal": "x"}')]))
+    llm_cache.after_model_callback(ctx, response)
+    hit = llm_cache.before_model_callback(_ctx("drip_pricing_ingest_agent"), _request("Test https://example.com"))
+    assert hit is not None
+    assert hit.content.parts[0].text == '{"browse_goal": "x"}'
+    assert hit.custom_metadata["llm_cache"] == "hit"
+    assert llm_cache.before_model_callback(_ctx("drip_pricing_ingest_agent"), _request("Test https://other.com")) is None
+def test_cache_skips_roles_not_enabled(disk_store):
+    ctx = _ctx("drip_pricing_navigator_agent")
+    assert llm_cache.before_model_callback(ctx, _request("snapshot")) is None
+    assert not ctx.state
+def test_disk_store_evicts_oldest_over_budget(tmp_path):
+    store = llm_cache._DiskStore(tmp_path, ttl=60, max_bytes=250)
+    for i in range(5):
+        store.set(f"{i:064x}", "x" * 100)
+    store._evict()
+    assert store.get(f"{0:064x}") is None
+    assert store.get(f"{4:064x}") is not None
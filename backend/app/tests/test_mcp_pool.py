@@ -0,0 +1,93 @@
+import asyncio
+from types import SimpleNamespace
+from app.agents.dynamic_agent.utils.mcp_pool import MCPToolsetPool, LocalBrowserToolset
+class FakeToolset:
+    def __init__(self, url, fail=False):
+        self.url = url
+        self.fail = fail
+        self.closed = False
+    async def get_tools(self, readonly_context=None):
+        if self.fail:
+            raise ConnectionError(self.url)
+        return [self.url]
+    async def close(self):
+        self.closed = True
+def _ctx(session_id):
+    return SimpleNamespace(session=SimpleNamespace(id=session_id), invocation_id=f"inv-{session_id}")
+def _pool(urls, failing=()):
+    made = []
+    def factory(url):
+        made.append(FakeToolset(url, fail=url in failing))
+        return made[-1]
+    pool = MCPToolsetPool(urls, toolset_factory=factory, capacity=4)
+    async def probe(endpoint):
+        return True
+    pool._probe = probe
+    return pool, made
+def test_scans_are_pinned_and_spread_over_endpoints():
+    pool, made = _pool(["http://a", "http://b"])
+    async def run():
+        first = await pool.get_tools(_ctx("s1"))
+        second = await pool.get_tools(_ctx("s2"))
+        again = await pool.get_tools(_ctx("s1"))
+        return first, second, again
+    first, second, again = asyncio.run(run())
+    assert first != second
+    assert again == first
+    assert len(made) == 2
+def test_failing_endpoint_is_marked_down_and_scan_rerouted():
+    pool, made = _pool(["http://a", "http://b"], failing={"http://a"})
+    async def run():
+        return await pool.get_tools(_ctx("s1")), await pool.get_tools(_ctx("s2"))
+    first, second = asyncio.run(run())
+    assert first == second == ["http://b"]
+    assert made[0].closed
+    stats = {e["url"]: e for e in pool.stats()["endpoints"]}
+    assert not stats["http://a"]["up"] and stats["http://b"]["active"] == 2
+def test_release_closes_scan_session():
+    pool, made = _pool(["http://a"])
+    async def run():
+        await pool.get_tools(_ctx("s1"))
+        await pool.release("s1")
+    asyncio.run(run())
+    assert made[0].closed and pool.stats()["leases"] == 0
+def test_local_endpoint_serves_in_process_tools():
+    names = [t.name for t in asyncio.run(LocalBrowserToolset().get_tools())]
+    assert "open_url" in names and "get_page_digest" in names
+def test_mcp_endpoints_get_a_page_digest_over_browser_evaluate():
+    import json
+    from app.agents.dynamic_agent.utils.mcp_pool import PageDigestTool
+    digest = {"url": "https://shop.example/", "title": "Shop", "texts": [{"tag": "p", "text": "Итого"}], "prices": []}
+    class Evaluate:
+        name = "browser_evaluate"
+        async def run_async(self, *, args, tool_context):
+            self.script = args["function"]
+            text = f"### Result\n{json.dumps(digest)}\n\n### Ran Playwright code\n```js\nawait page.evaluate('...');\n```"
+            return {"content": [{"type": "text", "text": text}], "isError": False}
+    class Toolset(FakeToolset):
+        async def get_tools(self, readonly_context=None):
+            return [evaluate]
+    evaluate = Evaluate()
+    pool = MCPToolsetPool(["http://a"], toolset_factory=Toolset, capacity=4)
+    async def probe(endpoint):
+        return True
+    pool._probe = probe
+    async def run():
+        tools = await pool.get_tools(_ctx("s1"))
+        tool = next(t for t in tools if t.name == "get_page_digest")
+        return tool, await tool.run_async(args={}, tool_context=None)
+    tool, result = asyncio.run(run())
+    assert isinstance(tool, PageDigestTool)
+    assert evaluate.script.startswith("() => (")
+    assert result["status"] == "ok" and result["texts"] == digest["texts"] and result["truncated"] is False
+def test_page_digest_reports_a_non_object_result_as_an_error():
+    from app.agents.dynamic_agent.utils.mcp_pool import PageDigestTool
+    class Evaluate:
+        name = "browser_evaluate"
+        def __init__(self, value):
+            self.value = value
+        async def run_async(self, *, args, tool_context):
+            return {"content": [{"type": "text", "text": f"### Result\n{self.value}\n"}], "isError": False}
+    for value in ("[1, 2]", "42", "null"):
+        result = asyncio.run(PageDigestTool(Evaluate(value)).run_async(args={}, tool_context=None))
+        assert result["status"] == "error", value
@@ -0,0 +1,49 @@
+import asyncio
+from unittest.mock import patch
+from google.genai import types
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from app.agents.dynamic_agent.utils import model_router
+from app.agents.dynamic_agent.utils.llmproxy import GeminiLLM
+from app.agents.dynamic_agent.utils.model_router import RoutedGeminiLLM, escalation_reason, extract_json
+def _response(text):
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+def _run(llm, answers):
+    calls = []
+    async def fake(self, llm_request, stream=False):
+        calls.append(llm_request.model)
+        yield _response(answers[llm_request.model])
+    async def collect():
+        request = LlmRequest(model=llm.model, contents=[types.Content(role="user", parts=[types.Part(text="go")])])
+        return [r async for r in llm.generate_content_async(request)]
+    with patch.object(GeminiLLM, "generate_content_async", fake):
+        return calls, asyncio.run(collect())
+def test_extract_json_tolerates_fences_and_prose():
+    assert extract_json('```json\n{"next_step": "parse"}\n```') == {"next_step": "parse"}
+    assert extract_json('Итог: {"done": false} — продолжаем') == {"done": False}
+    assert extract_json("не JSON") is None
+def test_escalation_reasons():
+    assert escalation_reason("decider", _response('{"next_step": "act"}')) is None
+    assert escalation_reason("decider", _response("сначала откроем корзину")) == "unparseable JSON"
+    assert escalation_reason("result", _response('{"confidence": 0.2}')).startswith("low confidence")
+    assert escalation_reason("navigator", _response("done clicking")) is None
+    call = LlmResponse(content=types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(name="finish", args={}))]))
+    assert escalation_reason("critic", call) is None
+def test_bad_json_escalates_to_next_tier():
+    llm = RoutedGeminiLLM(model="lite", role="decider", escalation=["flash", "pro"])
+    calls, responses = _run(llm, {"lite": "hmm", "flash": '{"next_step": "finish"}', "pro": "{}"})
+    assert calls == ["lite", "flash"]
+    assert [r.content.parts[0].text for r in responses] == ['{"next_step": "finish"}']
+def test_last_tier_answer_is_returned_as_is():
+    llm = RoutedGeminiLLM(model="lite", role="parser", escalation=["pro"])
+    calls, responses = _run(llm, {"lite": "oops", "pro": "still oops"})
+    assert calls == ["lite", "pro"]
+    assert responses[0].content.parts[0].text == "still oops"
+def test_model_for_uses_role_tiers():
+    with patch.dict(model_router.TIER_MODELS, {"pro": "p", "flash": "f", "lite": "l"}):
+        decider = model_router.model_for("decider")
+        navigator = model_router.model_for("navigator")
+        result = model_router.model_for("result")
+    assert (decider.model, decider.escalation) == ("l", ["f", "p"])
+    assert (navigator.model, navigator.escalation) == ("f", [])
+    assert (result.model, result.escalation) == ("p", [])
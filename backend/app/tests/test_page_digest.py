@@ -0,0 +1,26 @@
+import json
+from app.agents.dynamic_agent.tools.page_digest import fit_to_budget
+def _digest(n):
+    return {
+        "url": "https://shop.example/cart",
+        "title": "Корзина",
+        "texts": [{"tag": "p", "text": f"Строка описания товара номер {i}" * 3} for i in range(n)],
+        "interactive": [{"tag": "button", "text": f"Купить {i}", "selector": f"#buy-{i}"} for i in range(n)],
+        "fields": [{"type": "checkbox", "label": "Страховка", "selector": "#ins", "checked": True}],
+        "prices": [{"value": "1 990 ₽", "context": "Итого: 1 990 ₽"}],
+        "overlays": [],
+    }
+def test_small_digest_is_untouched():
+    digest = fit_to_budget(_digest(3), 20_000)
+    assert digest["truncated"] is False
+    assert len(digest["texts"]) == 3 and "dropped" not in digest
+def test_digest_is_cut_to_budget_from_largest_sections():
+    digest = fit_to_budget(_digest(400), 8_000)
+    assert digest["truncated"] is True
+    assert len(json.dumps({k: v for k, v in digest.items() if k != "bytes"}, ensure_ascii=False).encode()) <= 8_000
+    assert digest["fields"][0]["checked"] is True
+    assert digest["prices"] and digest["dropped"]["texts"] > 0
+def test_budget_counts_the_service_fields():
+    for max_bytes in (1_500, 3_000, 8_000):
+        digest = fit_to_budget(_digest(400), max_bytes)
+        assert digest["bytes"] == len(json.dumps(digest, ensure_ascii=False).encode()) <= max_bytes
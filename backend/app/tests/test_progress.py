@@ -0,0 +1,64 @@
+import asyncio
+import pytest
+from google.adk.agents import BaseAgent, LoopAgent
+from google.adk.events import Event, EventActions
+from rest_framework.test import APIClient
+from django.utils import timezone
+from app.agents.dynamic_agent.runner import run_agent
+from app.agents.dynamic_agent.utils.callbacks import instrument
+from app.agents.dynamic_agent.utils.progress import ProgressChannel
+from app.processing.lifecycle import TaskLifecycle
+from app.processing.models import Task
+class StepAgent(BaseAgent):
+    async def _run_async_impl(self, ctx):
+        await asyncio.sleep(0)
+        steps = ctx.session.state.get("steps", 0) + 1
+        yield Event(
+            author=self.name,
+            invocation_id=ctx.invocation_id,
+            actions=EventActions(state_delta={"steps": steps}, escalate=steps >= 3),
+        )
+def test_loop_iterations_are_reported():
+    loop = instrument(LoopAgent(name="progress_loop", sub_agents=[StepAgent(name="progress_step")], max_iterations=10))
+    writes = []
+    channel = ProgressChannel(lambda fraction, detail: writes.append((fraction, detail)), interval=0, stages=2)
+    channel.set_stage(1)
+    run_agent(loop, {"steps": 0}, progress_channel=channel)
+    assert [d["iteration"] for _, d in writes] == [1, 2, 3]
+    assert writes[-1][1]["max_iterations"] == 10
+    assert writes[0][0] == 0.5
+    assert writes[-1][0] == pytest.approx((1 + 0.2) / 2)
+def test_channel_throttles_writes():
+    writes = []
+    channel = ProgressChannel(lambda fraction, detail: writes.append(fraction), interval=60)
+    async def iterate():
+        for _ in range(5):
+            await channel.iteration("loop", 5)
+    asyncio.run(iterate())
+    assert len(writes) == 1
+@pytest.mark.django_db
+def test_progress_is_persisted_as_heartbeat_and_eta():
+    task = Task.objects.create(url='https://example.com', status=Task.Status.QUEUED)
+    with TaskLifecycle(str(task.id)) as lc:
+        lc.task.started_at = timezone.now() - timezone.timedelta(seconds=100)
+        lc.task.save(update_fields=['started_at'])
+        lc.report_progress(0.25)
+        data = APIClient().get(f'/api/v1/tasks/{task.id}/status/').data
+        assert data['progress'] == 0.25
+        assert data['heartbeat_at'] is not None
+        assert 290 <= data['eta_seconds'] <= 310
+        lc.finish({'ok': True})
+    task.refresh_from_db()
+    assert task.progress == 1.0
+@pytest.mark.django_db
+def test_progress_detail_is_shown_in_task_status():
+    task = Task.objects.create(url='https://example.com', status=Task.Status.QUEUED)
+    with TaskLifecycle(str(task.id)) as lc:
+        channel = lc.progress_channel(stages=3)
+        channel.set_stage(1)
+        channel.iterations['nagging_loop'] = 4
+        channel.max_iterations['nagging_loop'] = 10
+        lc.report_progress(channel.fraction, channel.detail())
+        data = APIClient().get(f'/api/v1/tasks/{task.id}/status/').data
+        lc.finish({'ok': True})
+    assert data['progress_detail'] == {'stage': 1, 'stages': 3, 'loop': 'nagging_loop', 'iteration': 4, 'max_iterations': 10}
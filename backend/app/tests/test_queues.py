@@ -0,0 +1,22 @@
+import pytest
+from app.celery import app as celery_app
+from app.processing import queues
+from app.processing.models import Task
+@pytest.mark.django_db
+def test_scans_go_to_browser_queue_with_task_priority():
+    task = Task.objects.create(url="https://example.com", priority=Task.Priority.HIGH)
+    route = queues.route_task("app.processing.tasks.detect_all_dark_patterns", [str(task.id), task.url], {}, {})
+    assert route == {"queue": "browser", "priority": 0}
+    route = queues.route_task("app.processing.tasks.detect_dark_pattern", [str(task.id), task.url, "nagging"], {}, {})
+    assert route["queue"] == "browser"
+def test_short_jobs_have_their_own_queues():
+    assert queues.route_task("app.processing.tasks.requeue_stale_tasks", [], {}, {}) == {"queue": "maintenance"}
+    assert queues.queue_for("app.processing.tasks.analyze_document_with_legal_llm") == "llm"
+    assert queues.route_task("some.other.task", [], {}, {}) is None
+    assert queues.broker_priority(None) == 5
+    assert queues.broker_priority("low") == 9
+def test_queue_options_are_applied_to_tasks():
+    from app.processing import tasks
+    assert tasks.detect_all_dark_patterns.acks_late is True
+    assert tasks.requeue_stale_tasks.time_limit == queues.QUEUE_OPTIONS["maintenance"]["time_limit"]
+    assert celery_app.amqp.router.route({}, "app.processing.tasks.requeue_stale_tasks", ())["queue"].name == "maintenance"
@@ -0,0 +1,64 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+from app.agents import rate_limiter
+from app.agents.rate_limiter import (
+    LLMRateLimiter, ModelQuota, RateLimitTimeout, llm_priority, current_priority,
+    PRIORITY_HIGH, PRIORITY_LOW,
+)
+QUOTAS = {"test-model": ModelQuota(rpm=10, tpm=10_000, concurrency=2)}
+@pytest.fixture(autouse=True)
+def quotas():
+    with patch.object(rate_limiter, "QUOTAS", QUOTAS), patch.object(rate_limiter, "HEADROOM", 1.0):
+        yield
+def test_low_lane_cannot_drain_reserved_share():
+    limiter = LLMRateLimiter()
+    async def scenario():
+        for _ in range(6):
+            lease = await limiter.acquire("test-model", 100, PRIORITY_LOW)
+            await limiter.release(lease)
+        with patch.object(rate_limiter, "MAX_WAIT_SECONDS", 0.01):
+            with pytest.raises(RateLimitTimeout):
+                await limiter.acquire("test-model", 100, PRIORITY_LOW)
+        lease = await limiter.acquire("test-model", 100, PRIORITY_HIGH)
+        await limiter.release(lease)
+    asyncio.run(scenario())
+def test_token_bucket_blocks_on_tpm():
+    limiter = LLMRateLimiter()
+    async def scenario():
+        lease = await limiter.acquire("test-model", 9_000, PRIORITY_HIGH)
+        await limiter.release(lease)
+        with patch.object(rate_limiter, "MAX_WAIT_SECONDS", 0.01):
+            with pytest.raises(RateLimitTimeout):
+                await limiter.acquire("test-model", 5_000, PRIORITY_HIGH)
+    asyncio.run(scenario())
+def test_release_refunds_unused_tokens():
+    limiter = LLMRateLimiter()
+    async def scenario():
+        lease = await limiter.acquire("test-model", 9_000, PRIORITY_HIGH)
+        lease.used_tokens = 1_000
+        await limiter.release(lease)
+        lease = await limiter.acquire("test-model", 5_000, PRIORITY_HIGH)
+        await limiter.release(lease)
+    asyncio.run(scenario())
+def test_concurrency_slots_are_bounded():
+    limiter = LLMRateLimiter()
+    async def scenario():
+        first = await limiter.acquire("test-model", 10, PRIORITY_HIGH)
+        second = await limiter.acquire("test-model", 10, PRIORITY_HIGH)
+        with patch.object(rate_limiter, "MAX_WAIT_SECONDS", 0.01):
+            with pytest.raises(RateLimitTimeout):
+                await limiter.acquire("test-model", 10, PRIORITY_HIGH)
+        await limiter.release(first)
+        third = await limiter.acquire("test-model", 10, PRIORITY_HIGH)
+        await limiter.release(second)
+        await limiter.release(third)
+    asyncio.run(scenario())
+def test_priority_propagates_into_gathered_calls():
+    async def probe():
+        return current_priority()
+    async def scenario():
+        return await asyncio.gather(probe(), probe())
+    with llm_priority(PRIORITY_HIGH):
+        assert asyncio.run(scenario()) == [PRIORITY_HIGH, PRIORITY_HIGH]
+    assert current_priority() == "normal"
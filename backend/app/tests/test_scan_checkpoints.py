@@ -0,0 +1,56 @@
+import pytest
+from unittest.mock import patch
+from app.agents.dynamic_agent import registry
+from app.processing.models import DetectorRun, Task
+from app.processing.tasks import detect_all_dark_patterns, detect_dark_pattern
+def _fake_detector(pattern_type, url, **kwargs):
+    return {'detected': pattern_type == 'confirmshaming', 'severity': 'low', 'metrics': {}, 'summary': pattern_type}
+@pytest.mark.django_db
+def test_full_scan_checkpoints_every_detector():
+    task = Task.objects.create(url='https://example.com', status=Task.Status.QUEUED)
+    with patch('app.processing.tasks._run_detector', side_effect=_fake_detector):
+        detect_all_dark_patterns(str(task.id), task.url)
+    runs = DetectorRun.objects.filter(task=task)
+    assert runs.count() == len(registry.DETECTORS)
+    assert set(runs.values_list('status', flat=True)) == {DetectorRun.Status.DONE}
+    task.refresh_from_db()
+    assert task.result_json['patterns_detected'] == ['confirmshaming']
+@pytest.mark.django_db
+def test_retried_scan_resumes_after_finished_detectors():
+    task = Task.objects.create(url='https://example.com', status=Task.Status.QUEUED)
+    DetectorRun.objects.create(
+        task=task, pattern_type='roach_motel', status=DetectorRun.Status.DONE, attempts=1,
+        result_json={'detected': True, 'severity': 'high', 'metrics': {}, 'summary': 'from checkpoint'},
+    )
+    DetectorRun.objects.create(task=task, pattern_type='fake_urgency', status=DetectorRun.Status.RUNNING, attempts=1)
+    DetectorRun.objects.create(task=task, pattern_type='nagging', status=DetectorRun.Status.RUNNING, attempts=2)
+    with patch('app.processing.tasks._run_detector', side_effect=_fake_detector) as run_detector:
+        detect_all_dark_patterns(str(task.id), task.url)
+    ran = [c.args[0] for c in run_detector.call_args_list]
+    assert 'roach_motel' not in ran and 'nagging' not in ran
+    assert 'fake_urgency' in ran
+    assert DetectorRun.objects.get(task=task, pattern_type='fake_urgency').attempts == 2
+    nagging = DetectorRun.objects.get(task=task, pattern_type='nagging')
+    assert nagging.status == DetectorRun.Status.FAILED
+    task.refresh_from_db()
+    assert task.status == Task.Status.DONE
+    assert task.retry_count == 0
+    assert task.result_json['pattern_results']['roach_motel']['summary'] == 'from checkpoint'
+    assert 'roach_motel' in task.result_json['patterns_detected']
+@pytest.mark.django_db
+def test_scan_past_its_deadline_skips_the_remaining_detectors():
+    task = Task.objects.create(url='https://example.com', status=Task.Status.QUEUED)
+    with patch('app.processing.lifecycle.SCAN_DEADLINE', 0), \
+            patch('app.processing.tasks._run_detector', side_effect=_fake_detector) as run_detector:
+        detect_all_dark_patterns(str(task.id), task.url)
+    run_detector.assert_not_called()
+    task.refresh_from_db()
+    assert task.status == Task.Status.DONE
+    assert all(r.get('deadline_exceeded') for r in task.result_json['pattern_results'].values())
+@pytest.mark.django_db
+def test_single_detector_run_keeps_to_the_scan_deadline():
+    task = Task.objects.create(url='https://example.com', status=Task.Status.QUEUED)
+    with patch('app.processing.lifecycle.SCAN_DEADLINE', 5), \
+            patch('app.processing.tasks._run_detector', side_effect=_fake_detector) as run_detector:
+        detect_dark_pattern(str(task.id), task.url, 'nagging')
+    assert 0 < run_detector.call_args.kwargs['timeout'] <= 5
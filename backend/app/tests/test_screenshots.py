@@ -0,0 +1,56 @@
+import io
+import pytest
+Image = pytest.importorskip("PIL.Image")
+from app.agents.dynamic_agent.tools.screenshots import encode, is_near_duplicate
+def _png(color, size=(1920, 1080), box=None):
+    image = Image.new("RGB", size, color)
+    if box:
+        image.paste((0, 0, 0), box)
+    out = io.BytesIO()
+    image.save(out, format="PNG")
+    return out.getvalue()
+def test_encode_downscales_and_reencodes():
+    raw = _png((250, 250, 250), box=(0, 0, 960, 1080))
+    frame = encode(raw, "webp", max_dim=800)
+    assert frame.mime_type == "image/webp" and frame.extension == "webp"
+    assert (frame.width, frame.height) == (800, 450)
+    assert len(frame.data) < len(raw)
+def test_near_identical_frames_are_detected():
+    first = encode(_png((250, 250, 250), box=(0, 0, 960, 1080)), "jpeg")
+    same = encode(_png((250, 250, 250), box=(0, 0, 962, 1080)), "jpeg")
+    other = encode(_png((250, 250, 250), box=(0, 0, 1920, 300)), "jpeg")
+    assert is_near_duplicate(first.fingerprint, same.fingerprint)
+    assert not is_near_duplicate(first.fingerprint, other.fingerprint)
+    assert not is_near_duplicate(None, first.fingerprint)
+def _screenshot(monkeypatch, policy):
+    import asyncio
+    from app.agents.dynamic_agent.tools import browser_tools
+    class Page:
+        reloaded = False
+        async def reload(self, **kwargs):
+            self.reloaded = True
+        async def screenshot(self, **kwargs):
+            return _png((250, 250, 250))
+    class Context:
+        state = {"__browser_sid__": "s1"}
+        async def save_artifact(self, name, part):
+            return 0
+    async def run():
+        page = Page()
+        monkeypatch.setattr(browser_tools, "_REGISTRY", {
+            "s1": browser_tools._BrowserSession(context=None, page=page, pool=None, loop=asyncio.get_running_loop(), policy=policy),
+        })
+        return page, await browser_tools.take_screenshot(tool_context=Context())
+    return asyncio.run(run())
+def test_screenshot_under_the_default_policy_has_images(monkeypatch):
+    from app.agents.dynamic_agent.tools.request_policy import policy_for
+    policy = policy_for("nagging")
+    page, result = _screenshot(monkeypatch, policy)
+    assert policy.enabled and policy.block_reason("image", "https://shop.example/p.jpg") is None
+    assert result["status"] == "ok" and "images_blocked" not in result
+    assert not page.reloaded
+def test_screenshot_keeps_the_page_as_is_when_images_are_blocked(monkeypatch):
+    from app.agents.dynamic_agent.tools.request_policy import RoutingPolicy
+    page, result = _screenshot(monkeypatch, RoutingPolicy(block_resources=frozenset({"image", "media"})))
+    assert result["status"] == "ok" and result["images_blocked"] is True
+    assert not page.reloaded
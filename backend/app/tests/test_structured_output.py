@@ -0,0 +1,21 @@
+from types import SimpleNamespace
+from app.agents.dynamic_agent.utils import structured_output
+from app.agents.dynamic_agent.utils.structured_output import validate_output
+def _ctx(name, state):
+    return SimpleNamespace(agent_name=name, state=state)
+def test_validate_output_outcomes():
+    assert validate_output("decider", {"next_step": "parse"}) == ("valid", {"next_step": "parse", "action_instructions": ""})
+    outcome, value = validate_output("parser", '```json\n{"extracted": {"price": 10}}\n```')
+    assert outcome == "repaired" and value == {"extracted": {"price": 10}, "notes": ""}
+    assert validate_output("decider", '{"next_step": "jump"}') == ("invalid", None)
+    assert validate_output("critic", "") == ("empty", None)
+    assert validate_output("ingest", '{"browse_goal": "x"}') == ("repaired", {"browse_goal": "x"})
+def test_invalid_parser_output_keeps_previous_value():
+    state = {"parsed": {"extracted": {"price": 10}, "notes": ""}}
+    ctx = _ctx("drip_pricing_parser_agent", state)
+    before = structured_output.validation_stats.snapshot().get("parser", {}).get("invalid", 0)
+    structured_output.before_agent_callback(ctx)
+    state["parsed"] = "Не удалось разобрать страницу"
+    structured_output.after_agent_callback(ctx)
+    assert state["parsed"] == {"extracted": {"price": 10}, "notes": ""}
+    assert structured_output.validation_stats.snapshot()["parser"]["invalid"] == before + 1
@@ -0,0 +1,60 @@
+import pytest
+from unittest.mock import patch
+from app.agents.dynamic_agent import registry
+from app.processing import triage
+from app.processing.models import DetectorRun, Task
+from app.processing.tasks import detect_all_dark_patterns
+FILLER = "<p>" + "We build bridges and roads across the region since 1998. " * 10 + "</p>"
+BROCHURE = f"""<html><head><title>Acme Engineering</title><script>var cart = 1;</script></head><body>
+<nav><a href="/about">About us</a><a href="/projects">Projects</a><a href="/contacts">Contacts</a></nav>
+{FILLER}</body></html>"""
+SHOP = f"""<html><body><a href="/cart">Корзина</a><a href="/catalog/shoes">Обувь</a>
+<a href="https://other.example/cart">Partner</a><a href="/about">О компании</a>
+<div class="price">1 990 ₽</div><button>В корзину</button>{FILLER}</body></html>"""
+SITE = {
+    "https://acme.example/": BROCHURE,
+    "https://shop.example/": SHOP,
+    "https://shop.example/cart": f"<html><body>Оформить заказ {FILLER}</body></html>",
+    "https://shop.example/catalog/shoes": f"<html><body>Осталось 2 шт. До конца акции 03:12 {FILLER}</body></html>",
+    "https://spa.example/": '<html><body><div id="root"></div><script src="/app.js"></script></body></html>',
+}
+def _fetch(url):
+    return triage.parse(url, SITE[url]) if url in SITE else None
+@pytest.fixture
+def triage_on(settings):
+    settings.SCAN_TRIAGE = True
+    with patch.object(triage, "fetch", side_effect=_fetch) as fetch:
+        yield fetch
+def test_brochure_site_runs_only_generic_detectors(triage_on):
+    plan = triage.plan_scan("https://acme.example/", registry.detector_names())
+    assert plan.run == ["nagging", "navigation_obstacles"]
+    assert "drip_pricing" in plan.skip
+    assert plan.pages == ["https://acme.example/"]
+def test_shop_links_are_followed_on_the_same_site(triage_on):
+    plan = triage.plan_scan("https://shop.example/", registry.detector_names())
+    fetched = [c.args[0] for c in triage_on.call_args_list]
+    assert fetched == ["https://shop.example/", "https://shop.example/cart", "https://shop.example/catalog/shoes"]
+    assert {"cart", "pricing", "timer", "scarcity"} <= set(plan.signals)
+    assert {"drip_pricing", "sneak_into_basket", "fake_urgency", "fake_scarcity"} <= set(plan.run)
+    assert "roach_motel" in plan.skip
+def test_unreachable_or_script_only_site_runs_everything(triage_on):
+    for url in ("https://down.example/", "https://spa.example/"):
+        plan = triage.plan_scan(url, registry.detector_names())
+        assert plan.run == registry.detector_names()
+        assert plan.note.startswith("triage unavailable")
+@pytest.mark.django_db
+def test_full_scan_reports_skipped_detectors_as_not_applicable(triage_on):
+    task = Task.objects.create(url='https://acme.example/', status=Task.Status.QUEUED)
+    with patch('app.processing.tasks._run_detector', return_value={'detected': False}) as run_detector:
+        detect_all_dark_patterns(str(task.id), task.url)
+    assert [c.args[0] for c in run_detector.call_args_list] == ["nagging", "navigation_obstacles"]
+    assert DetectorRun.objects.filter(task=task).count() == 2
+    task.refresh_from_db()
+    results = task.result_json
+    assert results['pattern_results']['drip_pricing']['status'] == 'not_applicable'
+    assert len(results['patterns_not_applicable']) == len(registry.DETECTORS) - 2
+    assert results['total_patterns_tested'] == 2
+    assert results['transparency_score'] == 100
+def test_rouble_prices_count_as_pricing():
+    for html in ("<p>Цена 1990 ₽</p>", "<p>Итого 1990 ₽ за всё</p>", "<p>1990₽</p>", "<p>от 500 руб.</p>"):
+        assert "pricing" in triage.signals_of(triage.parse("https://shop.example/", html)), html
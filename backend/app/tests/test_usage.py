@@ -0,0 +1,87 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from django.contrib.auth import get_user_model
+from google.genai import types
+from rest_framework.test import APIClient
+from app.agents import usage
+from app.agents.dynamic_agent.utils import metering
+from app.processing.lifecycle import TaskLifecycle
+from app.processing.models import Task, TaskUsage
+def _meta(prompt, output, cached=0):
+    return types.GenerateContentResponseUsageMetadata(
+        prompt_token_count=prompt, candidates_token_count=output,
+        cached_content_token_count=cached, total_token_count=prompt + output,
+    )
+def test_cost_uses_model_prices_and_cache_discount():
+    used = usage.usage_from("gemini-2.5-pro", _meta(1_000_000, 100_000, cached=400_000), latency=1.5)
+    assert used.total_tokens == 1_100_000
+    assert used.latency_ms == 1500
+    assert used.cost_usd == pytest.approx(0.6 * 1.25 + 0.4 * 1.25 * usage.CACHED_INPUT_DISCOUNT + 0.1 * 10)
+    assert usage.price_for("gemini-2.5-flash-preview-05-20") == usage.PRICES["gemini-2.5-flash"]
+def test_model_callbacks_attribute_usage_to_detector_and_role():
+    ctx = SimpleNamespace(invocation_id="inv", agent_name="nagging_decider_agent", state={})
+    with usage.metering() as meter:
+        metering.before_model_callback(ctx, SimpleNamespace(model="gemini-2.5-flash"))
+        metering.after_model_callback(ctx, SimpleNamespace(partial=False, usage_metadata=_meta(100, 20), model_version=None))
+        # Served from the LLM cache: no before-callback timing, nothing recorded.
+        metering.after_model_callback(ctx, SimpleNamespace(partial=False, usage_metadata=_meta(100, 20), model_version=None))
+    assert list(meter.rows) == [("nagging", "decider", "gemini-2.5-flash")]
+    assert meter.totals().calls == 1
+    assert all(key.startswith("temp:") for key in ctx.state)
+def _escalated_response():
+    from unittest.mock import patch
+    from google.adk.models.llm_request import LlmRequest
+    from google.adk.models.llm_response import LlmResponse
+    from app.agents.dynamic_agent.utils.llmproxy import GeminiLLM
+    from app.agents.dynamic_agent.utils.model_router import RoutedGeminiLLM
+    answers = {"gemini-2.5-flash-lite": ("hmm", _meta(100, 10)), "gemini-2.5-pro": ('{"next_step": "act"}', _meta(300, 30))}
+    async def fake(self, llm_request, stream=False):
+        text, used = answers[llm_request.model]
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]), usage_metadata=used)
+    async def collect():
+        llm = RoutedGeminiLLM(model="gemini-2.5-flash-lite", role="decider", escalation=["gemini-2.5-pro"])
+        request = LlmRequest(model=llm.model, contents=[types.Content(role="user", parts=[types.Part(text="go")])])
+        return [r async for r in llm.generate_content_async(request)]
+    with patch.object(GeminiLLM, "generate_content_async", fake):
+        return asyncio.run(collect())[-1]
+def test_escalated_call_is_recorded_per_attempt_and_model():
+    response = _escalated_response()
+    ctx = SimpleNamespace(invocation_id="inv", agent_name="nagging_decider_agent", state={})
+    with usage.metering() as meter:
+        metering.before_model_callback(ctx, SimpleNamespace(model="gemini-2.5-flash-lite"))
+        metering.after_model_callback(ctx, response)
+    assert {key[2]: row.total_tokens for key, row in meter.rows.items()} == {"gemini-2.5-flash-lite": 110, "gemini-2.5-pro": 330}
+    assert meter.totals().cost_usd == pytest.approx(usage.usage_from("gemini-2.5-pro", _meta(300, 30)).cost_usd + usage.usage_from("gemini-2.5-flash-lite", _meta(100, 10)).cost_usd)
+def test_meter_follows_context_into_event_loops():
+    async def call():
+        usage.record("group", "gemini-2.5-pro", _meta(10, 5), detector="legal")
+    with usage.metering() as meter:
+        asyncio.run(call())
+    assert meter.totals().total_tokens == 15
+@pytest.mark.django_db
+def test_task_usage_is_rolled_up_across_attempts():
+    task = Task.objects.create(url='https://example.com', status=Task.Status.QUEUED)
+    for _ in range(2):
+        with TaskLifecycle(str(task.id)):
+            usage.record("decider", "gemini-2.5-pro", _meta(100, 10), detector="nagging")
+        # The attempt's worker died: no heartbeat since, so the redelivery runs.
+        Task.objects.filter(id=task.id).update(heartbeat_at=None, started_at=None)
+    row = TaskUsage.objects.get(task=task)
+    assert (row.calls, row.total_tokens) == (2, 220)
+    data = APIClient().get(f'/api/v1/tasks/{task.id}/usage/').data
+    assert data['totals']['total_tokens'] == 220
+@pytest.mark.django_db
+def test_regulator_usage_rollup():
+    task = Task.objects.create(url='https://example.com')
+    TaskUsage.objects.create(task=task, detector='nagging', role='decider', model='m', calls=3, total_tokens=300, cost_usd=0.5)
+    TaskUsage.objects.create(task=task, detector='nagging', role='parser', model='m', calls=1, total_tokens=50, cost_usd=0.1)
+    User = get_user_model()
+    client = APIClient()
+    client.force_authenticate(User.objects.create_user(username='reg', password='x', role=User.Role.REGULATOR))
+    response = client.get('/api/v1/regulator/usage/', {'group_by': 'detector'})
+    assert response.status_code == 200
+    assert response.data['rows'] == [{
+        'detector': 'nagging', 'tasks': 1, 'calls': 4, 'prompt_tokens': 0, 'cached_tokens': 0,
+        'output_tokens': 0, 'total_tokens': 350, 'latency_ms': 0, 'cost_usd': pytest.approx(0.6),
+    }]
@@ -0,0 +1,32 @@
+from unittest.mock import patch
+from app.processing import warmup
+def test_stages_follow_worker_queues():
+    assert warmup.stages_for(["llm"]) == ["llm"]
+    assert warmup.stages_for(["maintenance"]) == []
+    assert warmup.stages_for(["llm", "browser"]) == ["llm", "registry", "mcp", "browser"]
+def test_explicit_setting_wins():
+    assert warmup.stages_for(["browser"], "off") == []
+    assert warmup.stages_for(["maintenance"], "registry, mcp") == ["registry", "mcp"]
+def test_warm_up_reports_timings_and_survives_failures():
+    async def ok():
+        return {"browsers": 1}
+    def broken():
+        raise RuntimeError("no chromium")
+    with patch.dict(warmup._STAGES, {"browser": ok, "registry": broken}):
+        report = warmup.warm_up(["registry", "browser", "unknown"])
+    assert set(report["stages"]) == {"registry", "browser"}
+    assert report["results"]["browser"] == {"browsers": 1}
+    assert "error" in report["results"]["registry"]
+    assert report["total_seconds"] >= 0
+def test_warm_up_runs_once_per_pool_kind():
+    from types import SimpleNamespace
+    from celery.concurrency.thread import TaskPool as ThreadPool
+    from app import celery_app
+    with patch("app.processing.warmup.warm_up") as warm_up:
+        celery_app.warm_up_threaded_worker(sender=SimpleNamespace(pool_cls="prefork"))
+        warm_up.assert_not_called()
+        celery_app.warm_up_worker()
+        assert warm_up.call_count == 1
+        celery_app.warm_up_threaded_worker(sender=SimpleNamespace(pool_cls=ThreadPool))
+        celery_app.warm_up_threaded_worker(sender=SimpleNamespace(pool_cls="solo"))
+        assert warm_up.call_count == 3
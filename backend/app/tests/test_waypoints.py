@@ -0,0 +1,73 @@
+import pytest
+from datetime import timedelta
+from types import SimpleNamespace
+from django.utils import timezone
+from google.adk.models import LlmRequest
+from app.agents.dynamic_agent.utils import waypoints as trail
+from app.processing import waypoints
+from app.processing.models import SiteWaypoint
+URL = "https://www.shop.example/"
+def _mcp_result(page_url, error=False):
+    return {"content": [{"type": "text", "text": f"### Ran Playwright code\n- Page URL: {page_url}\n- Page Title: Shop"}], "isError": error}
+def _act(state, tool, args, result):
+    trail.after_tool_callback(SimpleNamespace(name=tool), args, SimpleNamespace(state=state), result)
+def _cart_run(state):
+    state["decider_json"] = {"next_step": "navigate", "current_phase": "cart"}
+    _act(state, "browser_snapshot", {}, _mcp_result("https://shop.example/"))
+    _act(state, "browser_click", {"element": "Корзина", "ref": "e12"}, _mcp_result("https://shop.example/cart#top"))
+    state["decider_json"] = {"next_step": "act", "current_phase": "checkout"}
+    _act(state, "browser_type", {"element": "Email", "ref": "e3", "text": "test@example.com"}, _mcp_result("https://shop.example/checkout"))
+    _act(state, "click_css", {"selector": "#pay"}, {"status": "not_found", "selector": "#pay"})
+    state["final_summary"] = "done"
+    return state
+def test_actions_are_recorded_per_phase_without_typed_text():
+    state = _cart_run({})
+    steps = state[trail.TRAIL_KEY]
+    assert [s["tool"] for s in steps] == ["browser_click", "browser_type", "click_css"]
+    assert steps[0] == {"phase": "cart", "tool": "browser_click", "target": "Корзина", "url": "https://shop.example/cart#top", "ok": True}
+    assert "test@example.com" not in str(steps)
+    assert steps[2]["ok"] is False
+    _act(state, "type_css", {"selector": "#phone", "text": "+79990000000"}, {"status": "ok", "url": "https://shop.example/checkout"})
+    assert state[trail.TRAIL_KEY][-1]["target"] == "#phone"
+    assert "+79990000000" not in str(state[trail.TRAIL_KEY])
+def test_hints_are_added_for_planner_and_decider():
+    request = LlmRequest()
+    hints = [{"phase": "cart", "url": "https://shop.example/cart", "actions": ["browser_click Корзина"]}]
+    trail.before_model_callback(SimpleNamespace(state={trail.HINTS_KEY: hints}), request)
+    text = request.contents[-1].parts[0].text
+    assert "фаза cart: https://shop.example/cart (путь: browser_click Корзина)" in text
+@pytest.mark.django_db
+def test_run_trail_becomes_hints_for_the_next_scan():
+    waypoints.learn("drip_pricing", URL, _cart_run({}))
+    hints = waypoints.hints_for("drip_pricing", "https://shop.example/catalog")
+    assert {h["phase"]: h["url"] for h in hints} == {"cart": "https://shop.example/cart", "checkout": "https://shop.example/checkout"}
+    checkout = next(h for h in hints if h["phase"] == "checkout")
+    assert checkout["actions"] == ["browser_click Корзина", "browser_type Email"]
+    assert waypoints.hints_for("nagging", URL) == []
+@pytest.mark.django_db
+def test_failed_hint_is_invalidated():
+    waypoints.learn("drip_pricing", URL, _cart_run({}))
+    state = {trail.HINTS_KEY: waypoints.hints_for("drip_pricing", URL), "decider_json": {"current_phase": "cart"}}
+    _act(state, "browser_navigate", {"url": "https://shop.example/checkout"}, _mcp_result("about:blank", error=True))
+    waypoints.learn("drip_pricing", URL, state)
+    assert set(SiteWaypoint.objects.values_list("phase", flat=True)) == {"cart"}
+@pytest.mark.django_db
+def test_hint_is_invalidated_by_an_action_failing_on_its_page():
+    waypoints.learn("drip_pricing", URL, _cart_run({}))
+    state = {trail.HINTS_KEY: waypoints.hints_for("drip_pricing", URL), "decider_json": {"current_phase": "checkout"}}
+    _act(state, "open_url", {"url": "https://shop.example/checkout"}, {"status": "ok", "url": "https://shop.example/checkout"})
+    _act(state, "click_text", {"text": "Оплатить"}, {"status": "not_found"})
+    waypoints.learn("drip_pricing", URL, state)
+    assert set(SiteWaypoint.objects.values_list("phase", flat=True)) == {"cart"}
+@pytest.mark.django_db
+def test_unreached_hint_expires_after_repeated_unfinished_runs():
+    waypoints.learn("drip_pricing", URL, _cart_run({}))
+    for expected in (1, 0):
+        state = {trail.HINTS_KEY: waypoints.hints_for("drip_pricing", URL)}
+        waypoints.learn("drip_pricing", URL, state)
+        assert SiteWaypoint.objects.filter(phase="cart").count() == expected
+@pytest.mark.django_db
+def test_stale_waypoints_are_not_hinted():
+    waypoints.learn("drip_pricing", URL, _cart_run({}))
+    SiteWaypoint.objects.update(verified_at=timezone.now() - timedelta(days=waypoints.WAYPOINT_TTL_DAYS + 1))
+    assert waypoints.hints_for("drip_pricing", URL) == []